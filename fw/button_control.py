@@ -1,25 +1,30 @@
 import os
+import sys
 import time
 from gpiozero import Button
 
+# The mixer service lives with the main software in ../sw
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sw"))
+from mixer_service import get_mixer
+
+mixer = get_mixer()
+
 # Volume control functions
 def set_volume(level):
-    """Set volume level (0-100%)"""
-    os.system(f"amixer -D pulse sset Master {level}%")
+    """Set volume level (0-90%)"""
+    mixer.set_volume(level)
 
 def increase_volume(step=5):
     """Increase volume by a step"""
-    os.system(f"amixer -D pulse sset Master {step}%+")
+    mixer.increase_volume(step)
 
 def decrease_volume(step=5):
     """Decrease volume by a step"""
-    os.system(f"amixer -D pulse sset Master {step}%-")
+    mixer.decrease_volume(step)
 
 def get_volume():
     """Get current volume level"""
-    result = os.popen("amixer -D pulse get Master").read()
-    volume = int(result.split('[')[1].split('%')[0])
-    return volume
+    return mixer.get_volume()
 
 # GPIO pin setup using gpiozero
 PIN_1 = 4
@@ -55,5 +60,6 @@ try:
     while True:
         time.sleep(1)  # Keep the script running
 except KeyboardInterrupt:
+    mixer.stop()
     print("Program exited")
 
@@ -1,24 +1,28 @@
 import os
+import sys
 import time
 
+# The mixer service lives with the main software in ../sw
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sw"))
+from mixer_service import get_mixer, MAX_VOLUME
+
+mixer = get_mixer()
+
 def set_volume(level):
-    """Set volume level (0-100%)"""
-    os.system(f"amixer -D pulse sset Master {level}%")
+    """Set volume level (0-90%)"""
+    mixer.set_volume(level)
 
 def increase_volume(step=5):
     """Increase volume by a step"""
-    os.system(f"amixer -D pulse sset Master {step}%+")
+    mixer.increase_volume(step)
 
 def decrease_volume(step=5):
     """Decrease volume by a step"""
-    os.system(f"amixer -D pulse sset Master {step}%-")
+    mixer.decrease_volume(step)
 
 def get_volume():
     """Get current volume level"""
-    result = os.popen("amixer -D pulse get Master").read()
-    # Extract the volume percentage from the output
-    volume = int(result.split('[')[1].split('%')[0])
-    return volume
+    return mixer.get_volume()
 
 def adjust_volume():
     """Decrease volume until 0, then increase"""
@@ -27,9 +31,9 @@ def adjust_volume():
         current_volume = get_volume()
         
         if increasing:
-            if current_volume < 100:
+            if current_volume < MAX_VOLUME:
                 increase_volume(5)
-            if current_volume == 100:
+            if current_volume == MAX_VOLUME:
                 increasing = False
         else:
             if current_volume > 0:
@@ -1,31 +1,71 @@
 import sys
-import subprocess
+import threading
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QTabWidget, QFrame,
                              QPushButton, QComboBox, QLineEdit, QMessageBox, QHBoxLayout, QTextEdit, QSizePolicy, QProgressBar)
 from PyQt5.QtGui import QFont, QImage, QPixmap
-from PyQt5.QtCore import QTimer, Qt, QFileSystemWatcher, QTime
+from PyQt5.QtCore import QTimer, Qt, QTime, pyqtSignal
 from virtual_keyboard import VirtualKeyboard
-import re
+import hal
+from mixer_service import get_mixer, MAX_VOLUME
+from transcript_bus import get_bus, TRANSCRIPT, TRANSLATION, STATUS, CLEAR
+from shared import state
+import metrics
+import tracing
 import cv2
-import os
-from translator_device import TranslatorDevice  # Assuming the device code is in translator_device.py
+import time
+import collections
 
-def get_volume():
-    result = os.popen("amixer -D pulse get Master").read()
-    volume = int(result.split('[')[1].split('%')[0])
-    return volume
+FRAME_PAINT_SECONDS = metrics.histogram("plt_ui_frame_seconds", "Camera frame conversion and repaint time")
+CAPTION_DELAY_SECONDS = metrics.histogram("plt_caption_delay_seconds", "Delay from transcript/translation to caption")
+UI_STATE_DELAY_SECONDS = metrics.histogram("plt_ui_state_delay_seconds", "Delay from state change to UI update")
 
 class MainWindow(QMainWindow):
-    def __init__(self, filepath, translator_device):
+    volume_changed = pyqtSignal(int)
+    transcript_event = pyqtSignal(object)
+    state_changed = pyqtSignal(object, float)
+    frame_ready = pyqtSignal()
+
+    def __init__(self, translator_device, bus=None):
         super().__init__()
 
-        self.file_path = filepath
         self.translator_device = translator_device
+        self.profiles = None  # Performance profile manager, see attach_profiles()
+        self.enroll = None  # Custom sign enrollment callback, see attach_enrollment()
+        self.bus = bus if bus is not None else get_bus()
+        self.caption_delays = collections.deque(maxlen=100)  # seconds, result -> widget
+        self.mode_switch_delays = collections.deque(maxlen=100)  # seconds, state change -> widget
+        self.frame_interval_ms = 30  # Minimum time between camera repaints
+        self.frame_pending = False
+        self.last_frame_paint = 0.0
 
         self.setWindowTitle("PyQt Tab Example")
         self.setGeometry(100, 100, 800, 500)
         
         self.initUI()
+
+    def set_frame_interval(self, interval_ms):
+        """Minimum time between camera repaints (set by the workload governor)."""
+        self.frame_interval_ms = interval_ms
+
+    def attach_translator_device(self, translator_device):
+        """Called by the startup thread once the speech subsystem is ready."""
+        self.translator_device = translator_device
+
+    def attach_profiles(self, profiles):
+        """List the performance profiles (profiles.ProfileManager) in the Settings tab."""
+        self.profiles = profiles
+        self.profile_combo.blockSignals(True)
+        self.profile_combo.clear()
+        self.profile_combo.addItems(profiles.names())
+        self.profile_combo.setCurrentText(profiles.active)
+        self.profile_combo.blockSignals(False)
+        self.profile_combo.setEnabled(True)
+
+    def attach_enrollment(self, enroll):
+        """Enable custom sign enrollment; enroll(word) starts recording examples."""
+        self.enroll = enroll
+        self.sign_input.setEnabled(True)
+        self.enroll_button.setEnabled(True)
     
     def initUI(self):
         self.tabs = QTabWidget()
@@ -81,30 +121,42 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(self.text_edit)
         self.tab1.setLayout(main_layout)
 
-        # Set up timers
-        self.camera_timer = QTimer()
-        self.camera_timer.timeout.connect(self.update_camera)
-        self.camera_timer.start(30)  # Update every 30ms
-
-        self.mode_timer = QTimer()
-        self.mode_timer.timeout.connect(self.update_ui_mode)
-        self.mode_timer.start(500)  # Check UI mode every 500ms
+        # Mode and UI changes are pushed from the state store; queued signals
+        # carry them from the worker threads onto the GUI thread
+        self.state_changed.connect(self.on_state_changed, Qt.QueuedConnection)
+        state.subscribe(self.state_changed.emit, fields=("mode", "ui_mode"))
+        self.frame_ready.connect(self.update_camera, Qt.QueuedConnection)
+        state.subscribe(self.on_new_frame, fields=("latest_frame",))
 
-        self.file_watcher = QFileSystemWatcher()
-        self.file_watcher.addPath(self.file_path)
-        self.file_watcher.fileChanged.connect(self.load_text)
+        # Captions arrive on worker threads; the queued signal delivers them here
+        self.transcript_event.connect(self.on_transcript_event, Qt.QueuedConnection)
+        self.bus.subscribe(self.transcript_event.emit)
 
         self.text_edit.setStyleSheet("font-size: 50pt;")
-        self.load_text()
 
-        # Set up a timer to update the status label periodically
-        self.status_timer = QTimer()
-        self.status_timer.timeout.connect(self.update_status)
-        self.status_timer.start(1000)  # Update every 1000ms (1 second)
+        self.update_status()
+        self.update_ui_mode()
+
+    def on_state_changed(self, changes, timestamp):
+        """Apply a pushed mode/ui_mode change and record how long delivery took."""
+        if "mode" in changes:
+            self.update_status()
+        if "ui_mode" in changes:
+            self.update_ui_mode()
+        delay = time.monotonic() - timestamp
+        self.mode_switch_delays.append(delay)
+        UI_STATE_DELAY_SECONDS.observe(delay)
+        tracing.instant("ui_state_applied", "ui", args={"delay_ms": delay * 1000, "fields": sorted(changes)})
+
+    def on_new_frame(self, changes, timestamp):
+        # Runs on the ASL thread; only queue a repaint if one is not already pending
+        if not self.frame_pending:
+            self.frame_pending = True
+            self.frame_ready.emit()
 
     def update_status(self):
         # This function updates the status label's text
-        from shared import mode
+        mode = state.get("mode")
         self.status_label.setText("mode: " + mode)
         if mode == "SPEECH":
             self.status_label.setStyleSheet("""
@@ -165,12 +217,24 @@ class MainWindow(QMainWindow):
         
         layout.addLayout(buttonLayout)
         
+        self.wifiStatus = QLabel("Scanning for networks...")
+        self.wifiStatus.setStyleSheet("color: black;")
+        layout.addWidget(self.wifiStatus)
+
         self.keyboard = VirtualKeyboard(self.passwordInput)
         layout.addWidget(self.keyboard)
         
         self.tab2.setStyleSheet("background-color: #fff;")
         self.tab2.setLayout(layout)
-        self.scan_networks()
+
+        # Scanning and connecting run in QProcess so the window is never blocked
+        self.wifi = hal.wifi_manager(self)
+        self.wifi.scan_finished.connect(self.on_networks_scanned)
+        self.wifi.scan_failed.connect(self.on_scan_failed)
+        self.wifi.connect_progress.connect(self.wifiStatus.setText)
+        self.wifi.connected.connect(self.on_network_connected)
+        self.wifi.connect_failed.connect(self.on_connect_failed)
+        self.wifi.start()
 
     def setupTab3(self):
         layout = QVBoxLayout()
@@ -179,8 +243,7 @@ class MainWindow(QMainWindow):
 
         # Volume progress bar
         self.volume_bar = QProgressBar(self)
-        self.volume_bar.setRange(0, 90)  # Volume range 0-90%
-        self.volume_bar.setValue(get_volume())  # Initial volume level
+        self.volume_bar.setRange(0, MAX_VOLUME)  # Volume range 0-90%
         layout.addWidget(self.volume_bar)
 
         # Container for centering
@@ -214,6 +277,33 @@ class MainWindow(QMainWindow):
         grid_layout.addWidget(self.gender_label)
         grid_layout.addWidget(self.gender_combo)
 
+        # Performance profile, applied as soon as it is picked
+        profile_layout = QHBoxLayout()
+        profile_layout.setAlignment(Qt.AlignCenter)
+        self.profile_label = QLabel("Profile:")
+        self.profile_label.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.profile_combo = QComboBox(self)
+        self.profile_combo.setFixedWidth(140)
+        self.profile_combo.setEnabled(False)  # Until attach_profiles()
+        self.profile_combo.activated[str].connect(self.select_profile)
+        profile_layout.addWidget(self.profile_label)
+        profile_layout.addWidget(self.profile_combo)
+
+        # Custom sign enrollment: the examples are recorded from the camera in ASL mode
+        enroll_layout = QHBoxLayout()
+        enroll_layout.setAlignment(Qt.AlignCenter)
+        self.sign_label = QLabel("New sign:")
+        self.sign_label.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.sign_input = QLineEdit(self)
+        self.sign_input.setFixedWidth(140)
+        self.sign_input.setEnabled(False)  # Until attach_enrollment()
+        self.enroll_button = QPushButton("Enroll")
+        self.enroll_button.setEnabled(False)
+        self.enroll_button.clicked.connect(self.enroll_sign)
+        enroll_layout.addWidget(self.sign_label)
+        enroll_layout.addWidget(self.sign_input)
+        enroll_layout.addWidget(self.enroll_button)
+
         # Apply button
         self.apply_button = QPushButton("Apply")
         self.apply_button.setFixedSize(100, 40)  # Bigger button
@@ -222,6 +312,8 @@ class MainWindow(QMainWindow):
 
         # Reduce spacing between dropdowns and button
         container_layout.addLayout(grid_layout)
+        container_layout.addLayout(profile_layout)
+        container_layout.addLayout(enroll_layout)
         container_layout.addSpacing(20)  # Small spacing
         container_layout.addWidget(self.apply_button, alignment=Qt.AlignCenter)
 
@@ -233,46 +325,35 @@ class MainWindow(QMainWindow):
         self.tab3.setStyleSheet("background-color: #fff;")
         self.tab3.setLayout(layout)
 
-        # Timer to periodically update the volume level bar
-        self.volume_timer = QTimer(self)
-        self.volume_timer.timeout.connect(self.update_volume_bar)
-        self.volume_timer.start(100)  # Update every second
+        # Volume changes are pushed by the mixer service (from its own thread),
+        # so hop onto the GUI thread through a queued signal
+        self.mixer = get_mixer()
+        self.volume_changed.connect(self.update_volume_bar, Qt.QueuedConnection)
+        self.mixer.add_listener(self.volume_changed.emit)
 
 
 
     def scan_networks(self):
+        self.refreshButton.setEnabled(False)
+        self.wifiStatus.setText("Scanning for networks...")
+        self.wifi.scan(rescan=True)
+
+    def on_networks_scanned(self, networks):
+        self.refreshButton.setEnabled(True)
+        current = self.networksBox.currentText()
         self.networksBox.clear()
-        networks = self.get_available_networks()
+        self.networksBox.addItems([network["ssid"] for network in networks])
+        if current:
+            self.networksBox.setCurrentText(current)  # Keep the user's selection across refreshes
         if networks:
-            self.networksBox.addItems(networks)
+            self.wifiStatus.setText(f"{len(networks)} networks found at {time.strftime('%H:%M:%S')}")
         else:
-            QMessageBox.warning(self, "Error", "No networks found.")
-    
-    def get_available_networks(self):
-        try:
-            if sys.platform == "win32":
-                result = subprocess.check_output(["netsh", "wlan", "show", "network"], encoding="utf-8", errors="ignore")
-                print("Raw netsh output:\n", result)  # Debugging
-
-                networks = []
-                for line in result.split('\n'):
-                    if "SSID" in line and ":" in line:
-                        ssid = line.split(':', 1)[1].strip()
-                        ssid = ssid.replace("?T", "'")  # Fix apostrophe
-                        networks.append(ssid)
-
-                return list(set(networks))
-            else:
-                result = subprocess.check_output(["nmcli", "dev", "wifi", "list"], encoding="utf-8", errors="ignore")
-                print("Raw nmcli output:\n", result)  # Debugging
-                matches = re.findall(r'(?:[0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}\s+(.+?)\s+Infra', result)
-                networks = set(ssid.strip() for ssid in matches)
-
-            return list(set(networks))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to scan networks: {e}")
-            return []
- 
+            self.wifiStatus.setText("No networks found.")
+
+    def on_scan_failed(self, error):
+        self.refreshButton.setEnabled(True)
+        self.wifiStatus.setText(f"Failed to scan networks: {error}")
+
     def connect_to_network(self):
         ssid = self.networksBox.currentText()  # Fetch the selected SSID from the ComboBox
         password = self.passwordInput.text().strip()
@@ -281,31 +362,37 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Error", "Please select a network.")
             return
 
-        try:
-            if sys.platform == "win32":  # If Windows
-                # Use netsh command to connect to the network
-                cmd = f'netsh wlan connect name="{ssid}"'
-                print("Executing (Windows):", cmd)  # Debugging
-                subprocess.run(cmd, shell=True, check=True)
-
-            elif sys.platform != "win32":  # If Raspberry Pi (Linux)
-                # Use nmcli command to connect to the selected network with the password
-                cmd = f'nmcli dev wifi connect "{ssid}" password "{password}"'
-                print("Executing (Linux):", cmd)  # Debugging
-                subprocess.run(cmd, shell=True, check=True)
-
-            else:
-                print("This script is only for Windows or Linux (Raspberry Pi).")
-                return
+        self.connectButton.setEnabled(False)
+        self.wifi.connect_to(ssid, password)
 
-            print(f"Successfully connected to {ssid}.")
-            QMessageBox.information(self, "Success", f"Successfully connected to {ssid}.")
+    def on_network_connected(self, ssid):
+        self.connectButton.setEnabled(True)
+        print(f"Successfully connected to {ssid}.")
+        self.wifiStatus.setText(f"Connected to {ssid}.")
+        # The cloud clients hold connections from the old network; rebuild them off the GUI thread
+        if self.translator_device is not None:
+            threading.Thread(target=self.translator_device.restart, daemon=True).start()
+        QMessageBox.information(self, "Success", f"Successfully connected to {ssid}.")
 
-        except subprocess.CalledProcessError as e:
-            QMessageBox.critical(self, "Error", f"Failed to connect: {e}")
+    def on_connect_failed(self, ssid, error):
+        self.connectButton.setEnabled(True)
+        self.wifiStatus.setText(f"Failed to connect to {ssid}.")
+        QMessageBox.critical(self, "Error", f"Failed to connect: {error}")
 
     def update_camera(self):
-        from shared import latest_frame, ui_mode
+        # Limit repaints to one per frame_interval_ms; later frames replace earlier ones
+        elapsed_ms = (time.monotonic() - self.last_frame_paint) * 1000
+        if elapsed_ms < self.frame_interval_ms:
+            QTimer.singleShot(int(self.frame_interval_ms - elapsed_ms), self.update_camera)
+            return
+        self.frame_pending = False
+        self.last_frame_paint = time.monotonic()
+        with FRAME_PAINT_SECONDS.time(), tracing.span("paint_frame", "ui"):
+            self.paint_frame()
+
+    def paint_frame(self):
+        latest_frame = state.get("latest_frame")
+        ui_mode = state.get("ui_mode")
         if ui_mode == "CAMERA" and latest_frame is not None:
             frame = latest_frame
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -323,8 +410,8 @@ class MainWindow(QMainWindow):
             self.video_label.clear()
 
     def update_ui_mode(self):
-        """Switch between camera view and text view based on the shared ui_mode variable."""
-        from shared import ui_mode
+        """Switch between camera view and text view based on the shared ui_mode state."""
+        ui_mode = state.get("ui_mode")
         if ui_mode == "CAMERA":
             self.video_label.show()
             self.text_edit.hide()
@@ -332,22 +419,37 @@ class MainWindow(QMainWindow):
             self.video_label.hide()
             self.text_edit.show()
 
-    def load_text(self):
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, "r", encoding="utf-8") as file:
-                    content = file.read()
-                    self.text_edit.setText(content)
-            except Exception as e:
-                self.text_edit.setText(f"Error loading file: {e}")
-        else:
-            self.text_edit.setText("File not found.")
-
-    def update_volume_bar(self):
-        # Update the volume progress bar with the current volume level
-        volume = get_volume()
+    def on_transcript_event(self, event):
+        """Show the caption carried by a bus event and record its delivery delay."""
+        mode = state.get("mode")
+        if event.kind == CLEAR:
+            self.text_edit.clear()
+            return
+        if event.kind == STATUS:
+            self.statusBar().showMessage(event.text, 3000)
+            return
+        # Speech mode captions the translation; ASL mode captions the reply transcript
+        if event.kind == TRANSLATION or (event.kind == TRANSCRIPT and mode == "ASL"):
+            self.text_edit.setText(event.text)
+            delay = time.monotonic() - event.timestamp
+            self.caption_delays.append(delay)
+            CAPTION_DELAY_SECONDS.observe(delay)
+            tracing.instant("caption_shown", "ui", args={"kind": event.kind, "delay_ms": delay * 1000})
+
+    def update_volume_bar(self, volume):
+        # Update the volume progress bar with the latest mixer level
         self.volume_bar.setValue(volume)  # Update the progress bar
     
+    def select_profile(self, name):
+        """Switch the performance profile at runtime."""
+        if self.profiles is not None:
+            self.profiles.select(name)
+
+    def enroll_sign(self):
+        """Start recording examples of the sign named in the text field."""
+        if self.enroll is not None and self.enroll(self.sign_input.text()):
+            self.sign_input.clear()
+
     def apply_settings(self):
         """Apply the selected settings to the translator device."""
         selected_language = self.language_combo.currentText()
@@ -369,16 +471,16 @@ class MainWindow(QMainWindow):
         gender = gender_mapping.get(selected_gender, "MALE")
 
         # Update the settings of the translator device
+        if self.translator_device is None:
+            QMessageBox.warning(self, "Please wait", "Speech translation is still starting up.")
+            return
         self.translator_device.set_settings(base_language, gender)
         print(f"Settings updated: Language - {base_language}, Gender - {gender}")
 
 if __name__ == "__main__":
-    file_path = "als_speech_audio_transcription.txt"  # This file is updated by the ASL processing thread
-    with open(file_path, 'w') as file:
-        pass  # clear the file contents
-
+    from translator_device import TranslatorDevice
     translator_device = TranslatorDevice()
     app = QApplication(sys.argv)
-    window = MainWindow(file_path, translator_device)
+    window = MainWindow(translator_device)
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,211 @@
+# asl_engine.py
+
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from startup import load_tflite_interpreter
+
+actions = np.array(["hello", "thank you", "nothing", "help", "yes", "bathroom"])
+
+# The model ships next to this file; PLT_MODEL_PATH overrides it on the device
+MODEL_PATH = os.environ.get("PLT_MODEL_PATH",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.tflite"))
+
+
+def mediapipe_detection(image, model):
+    """Runs MediaPipe Holistic on a frame and returns the drawn image and results."""
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    image_rgb.flags.writeable = False
+    results = model.process(image_rgb)
+    image_rgb.flags.writeable = True
+    drawn_frame = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+    return drawn_frame, results
+
+
+def extract_keypoints(results):
+    """Extract keypoints from MediaPipe Holistic results."""
+    # Extract pose landmarks (33 landmarks * 4 values (x,y,z,visibility))
+    pose = np.array([[res.x, res.y, res.z, res.visibility] for res in results.pose_landmarks.landmark]).flatten() if results.pose_landmarks else np.zeros(132)
+
+    # Extract left hand landmarks (21 landmarks * 3 values (x,y,z))
+    lh = np.array([[res.x, res.y, res.z] for res in results.left_hand_landmarks.landmark]).flatten() if results.left_hand_landmarks else np.zeros(63)
+
+    # Extract right hand landmarks (21 landmarks * 3 values (x,y,z))
+    rh = np.array([[res.x, res.y, res.z] for res in results.right_hand_landmarks.landmark]).flatten() if results.right_hand_landmarks else np.zeros(63)
+
+    return np.concatenate([pose, lh, rh])
+
+
+class AslEngine:
+    """TFLite gesture model plus MediaPipe Holistic, loaded on first use.
+
+    Neither TensorFlow/tflite_runtime nor MediaPipe is imported until load() is
+    called, so speech-only sessions never pay for them.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, profile=None,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5, model_complexity=1):
+        self.model_path = model_path
+        self.profile = profile
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.model_complexity = model_complexity
+        self.rebuild_holistic = False
+
+        self.interpreter = None
+        self.input_details = None
+        self.output_details = None
+        self.holistic = None
+        self.mp_holistic = None
+        self.mp_drawing = None
+        self.load_lock = threading.Lock()
+        self.loaded = threading.Event()
+
+    def load(self):
+        """Load the model and MediaPipe once. Safe to call from several threads."""
+        with self.load_lock:
+            if self.loaded.is_set():
+                return
+            print("Loading ASL models...")
+            self._measure("asl_model", self._load_model)
+            self._measure("mediapipe", self._load_mediapipe)
+            self.loaded.set()
+            print("ASL models loaded.")
+
+    def _measure(self, subsystem, function):
+        if self.profile is None:
+            function()
+        else:
+            with self.profile.measure(subsystem, "init"):
+                function()
+
+    def _load_model(self):
+        self.interpreter = load_tflite_interpreter(self.model_path, profile=self.profile)
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+
+    def _load_mediapipe(self):
+        if self.profile is not None:
+            mp = self.profile.timed_import("mediapipe", "mediapipe")
+        else:
+            import mediapipe as mp
+        self.mp_holistic = mp.solutions.holistic
+        self.mp_drawing = mp.solutions.drawing_utils
+        self.holistic = self._create_holistic()
+
+    def _create_holistic(self):
+        return self.mp_holistic.Holistic(
+            model_complexity=self.model_complexity,
+            min_detection_confidence=self.min_detection_confidence,
+            min_tracking_confidence=self.min_tracking_confidence)
+
+    def set_model_complexity(self, model_complexity):
+        """Change the Holistic model; it is rebuilt on the next detect() call."""
+        if model_complexity != self.model_complexity:
+            self.model_complexity = model_complexity
+            self.rebuild_holistic = True
+
+    def set_confidence(self, min_detection_confidence, min_tracking_confidence):
+        """Change the Holistic confidences; it is rebuilt on the next detect() call."""
+        if (min_detection_confidence, min_tracking_confidence) != \
+                (self.min_detection_confidence, self.min_tracking_confidence):
+            self.min_detection_confidence = min_detection_confidence
+            self.min_tracking_confidence = min_tracking_confidence
+            self.rebuild_holistic = True
+
+    def predict(self, sequence):
+        """Run TFLite inference on a given input sequence."""
+        sequence = np.expand_dims(sequence, axis=0).astype(np.float32)
+        self.interpreter.set_tensor(self.input_details[0]['index'], sequence)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_details[0]['index'])[0]
+
+    def detect(self, image):
+        """Run MediaPipe Holistic on a BGR frame."""
+        if self.rebuild_holistic:
+            # Rebuilt on the detecting thread so a frame is never processed mid-swap
+            self.rebuild_holistic = False
+            self.holistic.close()
+            self.holistic = self._create_holistic()
+        return mediapipe_detection(image, self.holistic)
+
+    def draw_styled_landmarks(self, image, results):
+        """Draw landmarks and connections for pose and hands."""
+        mp_drawing = self.mp_drawing
+        mp_holistic = self.mp_holistic
+        # Draw pose connections
+        mp_drawing.draw_landmarks(
+            image, results.pose_landmarks, mp_holistic.POSE_CONNECTIONS,
+            mp_drawing.DrawingSpec(color=(80,22,10), thickness=2, circle_radius=4),
+            mp_drawing.DrawingSpec(color=(80,44,121), thickness=2, circle_radius=2)
+        )
+        # Draw left hand connections
+        mp_drawing.draw_landmarks(
+            image, results.left_hand_landmarks, mp_holistic.HAND_CONNECTIONS,
+            mp_drawing.DrawingSpec(color=(121,22,76), thickness=2, circle_radius=4),
+            mp_drawing.DrawingSpec(color=(121,44,250), thickness=2, circle_radius=2)
+        )
+        # Draw right hand connections
+        mp_drawing.draw_landmarks(
+            image, results.right_hand_landmarks, mp_holistic.HAND_CONNECTIONS,
+            mp_drawing.DrawingSpec(color=(245,117,66), thickness=2, circle_radius=4),
+            mp_drawing.DrawingSpec(color=(245,66,230), thickness=2, circle_radius=2)
+        )
+
+
+class SentenceBuilder:
+    """Commit logic of the ASL loop: turns LSTM predictions into words.
+
+    A word is committed when its confidence is above `threshold` and at least
+    `min_consistent` of the last `history_length` predictions agree. Two
+    confident "nothing" predictions finish the sentence (see ready()).
+    """
+
+    def __init__(self, threshold=0.9, history_length=4, min_consistent=3, min_interval=0):
+        self.threshold = threshold
+        self.history_length = history_length
+        self.min_consistent = min_consistent
+        self.min_interval = min_interval
+        self.words = []
+        self.history = []
+        self.nothing_count = 0
+        self.last_prediction_time = 0
+
+    def reset(self):
+        self.words.clear()
+        self.history.clear()
+        self.nothing_count = 0
+
+    def add(self, action_name, confidence, now=None):
+        """Feed one prediction. Returns "commit", "nothing" or "rejected"."""
+        now = time.time() if now is None else now
+        self.history.append(action_name)
+        self.history = self.history[-self.history_length:]
+        if confidence <= self.threshold:
+            return "rejected"
+        if self.words and self.words[-1] == "thank you" and action_name == "yes":
+            # Skip this prediction, do not update last_prediction_time or clear history.
+            return "rejected"
+        if action_name == "nothing":
+            self.nothing_count += 1
+            self.last_prediction_time = now
+            return "nothing"
+        if (now - self.last_prediction_time >= self.min_interval
+                and self.history.count(action_name) >= self.min_consistent):
+            self.nothing_count = 0
+            if not self.words or action_name != self.words[-1]:
+                self.words.append(action_name)
+                self.last_prediction_time = now
+                self.history.clear()
+                return "commit"
+        return "rejected"
+
+    def ready(self):
+        """True once the sentence is finished and should be spoken."""
+        return self.nothing_count >= 2 and any(word != "nothing" for word in self.words)
+
+    @property
+    def text(self):
+        return ' '.join(self.words)
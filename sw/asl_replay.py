@@ -0,0 +1,277 @@
+# asl_replay.py
+
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+from asl_engine import AslEngine, SentenceBuilder, actions, extract_keypoints
+
+SEQUENCE_LENGTH = 30  # Frames per LSTM window, as in the ASL loop
+
+
+def sidecar_path(video_path):
+    """Frame times and ground-truth gestures live next to the video."""
+    return os.path.splitext(video_path)[0] + ".json"
+
+
+def record(path, seconds=60.0, camera_index=0, width=640, height=400, fps=30, fourcc="mp4v", preview=True):
+    """Record a camera session to `path` plus a JSON sidecar with the capture
+    time of every frame and the ground-truth gestures.
+
+    With the preview window, press 1-6 when a gesture starts (the number is its
+    index in asl_engine.actions), space when it ends and q to stop. Without a
+    preview the gestures can be added to the sidecar by hand afterwards.
+    """
+    cap = cv2.VideoCapture(camera_index)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open camera {camera_index}")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+    frames, gestures = [], []
+    current = None
+    start = time.monotonic()
+    try:
+        while time.monotonic() - start < seconds:
+            ret, frame = cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            now = time.monotonic() - start
+            if frame.shape[1] != width or frame.shape[0] != height:
+                frame = cv2.resize(frame, (width, height))
+            writer.write(frame)
+            frames.append(round(now, 4))
+            if not preview:
+                continue
+            shown = frame.copy()
+            label = f"{current['word']} since {current['start_s']:.1f} s" if current else "1-6: gesture, space: end, q: stop"
+            cv2.putText(shown, label, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            cv2.imshow("asl_replay record", shown)
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord("q"):
+                break
+            if current is not None and (key == ord(" ") or ord("1") <= key < ord("1") + len(actions)):
+                current["end_s"] = round(now, 3)
+                gestures.append(current)
+                current = None
+            if ord("1") <= key < ord("1") + len(actions):
+                current = {"word": str(actions[key - ord("1")]), "start_s": round(now, 3)}
+    finally:
+        if current is not None:
+            current["end_s"] = frames[-1] if frames else 0.0
+            gestures.append(current)
+        cap.release()
+        writer.release()
+        if preview:
+            cv2.destroyAllWindows()
+    session = {"video": os.path.basename(path), "fps": fps, "width": width, "height": height,
+               "frames": frames, "gestures": gestures}
+    with open(sidecar_path(path), "w", encoding="utf-8") as f:
+        json.dump(session, f, indent=1)
+    print(f"Recorded {len(frames)} frames ({frames[-1] if frames else 0:.1f} s) and {len(gestures)} gestures to {path}")
+    return session
+
+
+def load_session(video_path):
+    with open(sidecar_path(video_path), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def word_errors(reference, hypothesis):
+    """Levenshtein distance between two word lists."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref in enumerate(reference, 1):
+        current = [i]
+        for j, hyp in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref != hyp)))
+        previous = current
+    return previous[-1]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Replay:
+    """Drives recorded sessions through the ASL pipeline without a camera,
+    GPIO or UI: Holistic detection, keypoint extraction, LSTM inference every
+    `inference_stride` frames and the SentenceBuilder commit logic.
+
+    realtime=True plays frames at their recorded times like a live camera:
+    frames that arrive while the pipeline is still busy are dropped.
+    realtime=False processes every frame as fast as possible. `settings` is a
+    performance profile (profiles.py); its camera size, Holistic, threshold,
+    history and stride settings are applied.
+    """
+
+    def __init__(self, settings, realtime=False, tolerance_s=2.0, engine=None):
+        self.settings = settings
+        self.realtime = realtime
+        self.tolerance_s = tolerance_s
+        self.engine = engine or AslEngine(min_detection_confidence=settings["detection_confidence"],
+                                          min_tracking_confidence=settings["tracking_confidence"],
+                                          model_complexity=settings["model_complexity"])
+        self.engine.load()
+        self.stages = {"decode": [], "mediapipe": [], "keypoints": [], "tflite": []}
+        self.latencies = []  # Frame arrival -> word committed, wall clock
+        self.gesture_latencies = []  # Labelled gesture end -> word committed, session time
+        self.frames = self.dropped = 0
+        self.wall_s = self.session_s = 0.0
+        self.reference_words = self.hit = self.false_commits = self.errors = 0
+
+    def _frames(self, video_path, times):
+        """Yields (session time, arrival wall time, frame)."""
+        cap = cv2.VideoCapture(video_path)
+        start = time.perf_counter()
+        size = (self.settings["camera_width"], self.settings["camera_height"])
+        try:
+            for index, at in enumerate(times):
+                if self.realtime:
+                    wait = start + at - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                    elif index + 1 < len(times) and start + times[index + 1] <= time.perf_counter():
+                        # The next frame is already there: a live camera would have replaced this one
+                        cap.grab()
+                        self.dropped += 1
+                        continue
+                arrived = start + at if self.realtime else time.perf_counter()
+                began = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if (frame.shape[1], frame.shape[0]) != size:
+                    frame = cv2.resize(frame, size)
+                self.stages["decode"].append(time.perf_counter() - began)
+                yield at, arrived, frame
+        finally:
+            cap.release()
+
+    def _timed(self, stage, function, *args):
+        began = time.perf_counter()
+        result = function(*args)
+        self.stages[stage].append(time.perf_counter() - began)
+        return result
+
+    def run(self, video_path):
+        """Replay one session; returns the committed words as (word, commit time)."""
+        session = load_session(video_path)
+        builder = SentenceBuilder(threshold=self.settings["threshold"],
+                                  history_length=self.settings["history_length"])
+        stride = self.settings["inference_stride"]
+        sequence = []
+        commits = []
+        start = time.perf_counter()
+        for count, (at, arrived, frame) in enumerate(self._frames(video_path, session["frames"]), 1):
+            self.frames += 1
+            _, results = self._timed("mediapipe", self.engine.detect, frame)
+            sequence.append(self._timed("keypoints", extract_keypoints, results))
+            sequence = sequence[-SEQUENCE_LENGTH:]
+            if len(sequence) < SEQUENCE_LENGTH or count % stride:
+                continue
+            res = self._timed("tflite", self.engine.predict, np.array(sequence))
+            predicted = int(np.argmax(res))
+            if builder.add(str(actions[predicted]), res[predicted], now=at) == "commit":
+                latency = time.perf_counter() - arrived
+                self.latencies.append(latency)
+                commits.append((builder.words[-1], at + latency))
+            if builder.ready():
+                # The loop speaks the sentence here and starts over
+                builder.reset()
+                sequence.clear()
+        self.wall_s += time.perf_counter() - start
+        self.session_s += session["frames"][-1] if session["frames"] else 0.0
+        self._score(session["gestures"], commits)
+        return commits
+
+    def _score(self, gestures, commits):
+        """Match each labelled gesture to the first unused commit of the same
+        word between its start and `tolerance_s` after its end."""
+        used = set()
+        for gesture in gestures:
+            for index, (word, at) in enumerate(commits):
+                if (index not in used and word == gesture["word"]
+                        and gesture["start_s"] <= at <= gesture["end_s"] + self.tolerance_s):
+                    used.add(index)
+                    self.hit += 1
+                    self.gesture_latencies.append(at - gesture["end_s"])
+                    break
+        self.reference_words += len(gestures)
+        self.false_commits += len(commits) - len(used)
+        self.errors += word_errors([gesture["word"] for gesture in gestures], [word for word, _ in commits])
+
+    def report(self):
+        """Prints and returns the stage rates, commit latencies and accuracy."""
+        summary = {
+            "frames": self.frames, "dropped": self.dropped, "session_s": round(self.session_s, 2),
+            "loop_fps": round(self.frames / self.wall_s, 1) if self.wall_s else 0.0,
+            "stages": {}, "gestures": self.reference_words, "recognized": self.hit,
+            "false_commits": self.false_commits,
+            "word_error_rate": round(self.errors / self.reference_words, 3) if self.reference_words else None,
+            "commit_latency_ms": {q: round(percentile(self.latencies, p) * 1000, 1)
+                                  for q, p in (("p50", 0.5), ("p95", 0.95))},
+            "gesture_latency_ms": {q: round(percentile(self.gesture_latencies, p) * 1000, 1)
+                                   for q, p in (("p50", 0.5), ("p95", 0.95))},
+        }
+        mode = "real time" if self.realtime else "as fast as possible"
+        print(f"{self.frames} frames of {self.session_s:.1f} s replayed {mode}: {summary['loop_fps']} fps, "
+              f"{self.dropped} dropped")
+        for stage, times in self.stages.items():
+            if times:
+                mean = sum(times) / len(times)
+                summary["stages"][stage] = {"calls": len(times), "mean_ms": round(mean * 1000, 2),
+                                            "p95_ms": round(percentile(times, 0.95) * 1000, 2),
+                                            "fps": round(1.0 / mean, 1) if mean else None}
+                print(f"  {stage:<10}{len(times):>6} calls  mean {mean * 1000:7.2f} ms  "
+                      f"p95 {percentile(times, 0.95) * 1000:7.2f} ms  {summary['stages'][stage]['fps']} /s")
+        print(f"frame -> word p50 {summary['commit_latency_ms']['p50']} ms, "
+              f"p95 {summary['commit_latency_ms']['p95']} ms; gesture end -> word "
+              f"p50 {summary['gesture_latency_ms']['p50']} ms, p95 {summary['gesture_latency_ms']['p95']} ms")
+        if self.reference_words:
+            print(f"recognized {self.hit}/{self.reference_words} gestures, {self.false_commits} false commits, "
+                  f"word error rate {summary['word_error_rate']:.1%}")
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record ASL sessions and replay them through the ASL pipeline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rec = commands.add_parser("record", help="Record a camera session with ground-truth gestures")
+    rec.add_argument("video", help="Output video, e.g. sessions/hello.mp4")
+    rec.add_argument("--seconds", type=float, default=60.0)
+    rec.add_argument("--camera", type=int, default=0)
+    rec.add_argument("--size", default="640x400")
+    rec.add_argument("--fps", type=int, default=30)
+    rec.add_argument("--fourcc", default="mp4v", help="Video codec, e.g. mp4v or MJPG")
+    rec.add_argument("--no-preview", action="store_true", help="Record without a window (label the sidecar by hand)")
+    play = commands.add_parser("replay", help="Replay sessions and report fps, latency and accuracy")
+    play.add_argument("videos", nargs="+")
+    play.add_argument("--realtime", action="store_true", help="Pace frames like a live camera (drop when late)")
+    play.add_argument("--profile", default="balanced", help="Performance profile to apply (see profiles.py)")
+    play.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        width, height = (int(value) for value in args.size.split("x"))
+        record(args.video, args.seconds, args.camera, width, height, args.fps, args.fourcc, not args.no_preview)
+        return
+    from profiles import ProfileManager
+    replay = Replay(ProfileManager(active=args.profile).settings, realtime=args.realtime)
+    for video in args.videos:
+        replay.run(video)
+    summary = replay.report()
+    summary["profile"] = args.profile
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# asl_reply.py
+
+import os
+import threading
+import time
+import metrics
+import tracing
+from deadlines import Cancelled
+from transcript_bus import CLEAR
+
+# PLT_REPLY_TIMEOUT: seconds to wait for the hearing party to start replying;
+# PLT_REPLY_HOLD: seconds the reply stays on screen
+REPLY_TIMEOUT_S = float(os.environ.get("PLT_REPLY_TIMEOUT", "8"))
+REPLY_HOLD_S = float(os.environ.get("PLT_REPLY_HOLD", "3"))
+
+COMMIT_TO_SPEECH_SECONDS = metrics.histogram("plt_asl_commit_to_speech_seconds",
+                                             "ASL sentence committed -> first audio of its speech")
+REPLY_TO_CAPTION_SECONDS = metrics.histogram("plt_asl_reply_caption_seconds",
+                                             "End of the spoken reply -> reply caption published")
+OUTCOMES = ("replied", "no_reply", "cancelled", "error")
+REPLIES = {outcome: metrics.counter("plt_asl_replies_total", "ASL reply cycles by outcome",
+                                    labels={"outcome": outcome})
+           for outcome in OUTCOMES}
+
+# What the cycle is doing, drawn on the camera feed
+IDLE = ""
+SPEAKING = "Speaking..."
+LISTENING = "Listening for a reply..."
+
+
+class ReplyCycle:
+    """Speaks a committed ASL sentence and captures the hearing party's reply
+    on a background thread, so the camera loop keeps capturing, detecting and
+    committing gestures meanwhile.
+
+    A cycle synthesizes and plays the sentence, listens for a reply for up to
+    `reply_timeout_s` (a reply already under way is finished), publishes the
+    recognized reply on the bus and keeps it on screen for `hold_s`. Starting
+    a new sentence, or cancel(), cuts the running cycle short: playback
+    stops, listening ends and its recognition is dropped.
+    """
+
+    def __init__(self, device, bus, reply_timeout_s=REPLY_TIMEOUT_S, hold_s=REPLY_HOLD_S):
+        self.device = device
+        self.bus = bus
+        self.reply_timeout_s = reply_timeout_s
+        self.hold_s = hold_s
+        self.status = IDLE
+        self.reply = ""
+        self.thread = None
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, text, committed_at=None, trace_id=None):
+        """Speak `text` and wait for a reply in the background. committed_at
+        (time.perf_counter()) is when the sentence was committed. A cycle still
+        running is cancelled first."""
+        committed_at = time.perf_counter() if committed_at is None else committed_at
+        with self.lock:
+            previous = self.thread
+            if previous is not None and previous.is_alive():
+                self._cancel("new_sentence")
+            self.cancel_event = threading.Event()
+            # The token current now; a cancel() from here on cancels it
+            token = self.device.cancel_token
+            self.thread = threading.Thread(target=self._run,
+                                           args=(text, committed_at, trace_id, previous, self.cancel_event, token),
+                                           name="asl_reply", daemon=True)
+            self.thread.start()
+
+    def cancel(self, reason="cancelled", wait=False):
+        """Stop the running cycle. With wait, return once it has cleaned up
+        (e.g. before speech mode takes over the microphone)."""
+        with self.lock:
+            thread = self.thread
+            if thread is None or not thread.is_alive():
+                return
+            self._cancel(reason)
+        if wait:
+            thread.join(timeout=2.0)
+
+    def _cancel(self, reason):
+        self.cancel_event.set()
+        self.device.cancel_inflight(reason)
+
+    def _run(self, text, committed_at, trace_id, previous, cancelled, token):
+        if previous is not None:
+            previous.join()  # Its playback and microphone must be released first
+        if cancelled.is_set():  # Cancelled while waiting for the previous cycle
+            REPLIES["cancelled"].inc()
+            return
+        cycle_id = tracing.new_id()
+        tracing.async_begin("reply_cycle", cycle_id, "asl", {"words": len(text.split())})
+        outcome = "error"
+        try:
+            outcome = self._cycle(text, committed_at, trace_id, cancelled, token)
+        except Cancelled:
+            outcome = "cancelled"
+        except Exception as e:
+            print(f"Error in the ASL reply cycle: {e}")
+        finally:
+            if cancelled.is_set() and outcome != "replied":
+                outcome = "cancelled"
+            REPLIES[outcome].inc()
+            tracing.async_end("reply_cycle", cycle_id, "asl", {"outcome": outcome})
+            if self.cancel_event is cancelled:  # Not replaced by a newer cycle
+                self.status = IDLE
+                self.reply = ""
+
+    def _cycle(self, text, committed_at, trace_id, cancelled, token):
+        device = self.device
+        self.status, self.reply = SPEAKING, ""
+        self.bus.publish(CLEAR)
+        speak_start = time.perf_counter()
+        timing = device.synthesize_speech(text, device.base_language, trace_id=trace_id, token=token)
+        if cancelled.is_set():
+            return "cancelled"
+        if timing is None:
+            return "error"
+        if timing.first_audio is not None:
+            delay = speak_start - committed_at + timing.first_audio
+            COMMIT_TO_SPEECH_SECONDS.observe(delay)
+            print(f"ASL sentence -> speech: {delay:.2f} s")
+
+        self.status = LISTENING
+        device.vad_active = True
+        try:
+            transcript = device.listen_and_save_transcription(timeout_s=self.reply_timeout_s,
+                                                              stop=cancelled.is_set)
+        finally:
+            device.vad_active = False
+        if cancelled.is_set():
+            return "cancelled"
+        if not transcript:
+            print("No reply.")
+            return "no_reply"
+        if device.last_speech_end is not None:
+            delay = time.monotonic() - device.last_speech_end
+            REPLY_TO_CAPTION_SECONDS.observe(delay)
+            print(f"Reply -> caption: {delay:.2f} s")
+        self.status, self.reply = IDLE, transcript
+        # Keep the reply up for a while, unless the signer moves on
+        if not cancelled.wait(self.hold_s):
+            self.bus.publish(CLEAR)
+        return "replied"
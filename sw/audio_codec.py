@@ -0,0 +1,162 @@
+# audio_codec.py
+
+import io
+import queue
+import threading
+import time
+import numpy as np
+import metrics
+
+# soundfile (libsndfile) is optional; without it audio is sent as LINEAR16
+try:
+    import soundfile as sf
+except (ImportError, OSError):
+    sf = None
+
+# Cloud encoding name -> (libsndfile format, subtype)
+CODECS = {
+    "FLAC": ("FLAC", "PCM_16"),
+    "OGG_OPUS": ("OGG", "OPUS"),
+}
+
+ENCODE_SECONDS = metrics.histogram("plt_encode_seconds", "Time to finish encoding a segment after it ended")
+UPLOAD_BYTES = metrics.counter("plt_upload_bytes_total", "Audio bytes uploaded for recognition")
+RAW_BYTES = metrics.counter("plt_upload_raw_bytes_total", "LINEAR16 size of the audio uploaded for recognition")
+
+
+def available(codec):
+    """True if `codec` can be encoded and decoded here (LINEAR16 always can)."""
+    if codec == "LINEAR16":
+        return True
+    if sf is None or codec not in CODECS:
+        return False
+    file_format, subtype = CODECS[codec]
+    return subtype in sf.available_subtypes(file_format)
+
+
+def choose_codec(codec):
+    """Return `codec` if it is available, otherwise LINEAR16 (with a message)."""
+    if available(codec):
+        return codec
+    print(f"Audio codec {codec} is not available (needs soundfile with libsndfile support); using LINEAR16.")
+    return "LINEAR16"
+
+
+def encode(pcm, sample_rate, codec):
+    """Encode 16-bit mono PCM bytes in one go."""
+    if codec == "LINEAR16":
+        return bytes(pcm)
+    file_format, subtype = CODECS[codec]
+    buffer = io.BytesIO()
+    with sf.SoundFile(buffer, "w", samplerate=sample_rate, channels=1, format=file_format, subtype=subtype) as f:
+        f.write(np.frombuffer(pcm, dtype=np.int16))
+    return buffer.getvalue()
+
+
+def decode(data):
+    """Decode a compressed or WAV file in memory into (int16 samples, sample rate).
+
+    The samples are returned as a numpy array that can be written to the
+    output stream as is."""
+    samples, rate = sf.read(io.BytesIO(data), dtype="int16")
+    if samples.ndim > 1:
+        samples = samples[:, 0]
+    return samples, rate
+
+
+class EncodingSession:
+    """Encodes one speech segment on a worker thread while it is being captured.
+
+    feed() only queues the frame, so the capture thread never waits for the
+    encoder; finish() returns the encoded segment shortly after the last frame.
+    """
+
+    def __init__(self, codec, sample_rate):
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self.frames = queue.Queue()
+        self.raw_bytes = 0
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="audio_encoder", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def feed(self, pcm):
+        self.raw_bytes += len(pcm)
+        self.frames.put(pcm)
+
+    def _run(self):
+        file_format, subtype = CODECS[self.codec]
+        buffer = io.BytesIO()
+        try:
+            with sf.SoundFile(buffer, "w", samplerate=self.sample_rate, channels=1,
+                              format=file_format, subtype=subtype) as f:
+                while True:
+                    pcm = self.frames.get()
+                    if pcm is None:
+                        break
+                    f.write(np.frombuffer(pcm, dtype=np.int16))
+            self.result = buffer.getvalue()
+        except Exception as e:
+            self.error = e
+
+    def finish(self, timeout=2.0):
+        """End the segment and return the encoded bytes, or None on failure."""
+        start = time.perf_counter()
+        self.frames.put(None)
+        self.thread.join(timeout)
+        ENCODE_SECONDS.observe(time.perf_counter() - start)
+        if self.thread.is_alive() or self.error is not None:
+            print(f"Audio encoding failed: {self.error or 'timed out'}")
+            return None
+        UPLOAD_BYTES.inc(len(self.result))
+        RAW_BYTES.inc(self.raw_bytes)
+        return self.result
+
+    def abort(self):
+        self.frames.put(None)
+
+
+def _test_signal(sample_rate, seconds):
+    """Speech-like test audio: a gliding harmonic tone with noise, in syllable-sized bursts."""
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    noise = np.random.default_rng(0).normal(0, 0.05, len(t))
+    return (6000 * (voice * envelope + noise)).astype(np.int16)
+
+
+def benchmark(path=None, seconds=10.0, sample_rate=16000):
+    """Print encode/decode CPU time per second of audio against bytes saved."""
+    if path:
+        samples, sample_rate = decode(open(path, "rb").read())
+    else:
+        samples = _test_signal(sample_rate, seconds)
+    pcm = samples.tobytes()
+    duration = len(samples) / sample_rate
+    raw = len(pcm)
+    print(f"{duration:.1f} s of audio at {sample_rate} Hz, LINEAR16 {raw} bytes")
+    print(f"{'codec':<10}{'bytes':>10}{'saved':>8}{'encode ms/s':>13}{'decode ms/s':>13}")
+    for codec in ["LINEAR16"] + list(CODECS):
+        if not available(codec):
+            print(f"{codec:<10} not available")
+            continue
+        start = time.process_time()
+        data = encode(pcm, sample_rate, codec)
+        encode_cpu = time.process_time() - start
+        decode_cpu = 0.0
+        if codec != "LINEAR16":
+            start = time.process_time()
+            decode(data)
+            decode_cpu = time.process_time() - start
+        print(f"{codec:<10}{len(data):>10}{1 - len(data) / raw:>8.0%}"
+              f"{encode_cpu * 1000 / duration:>13.2f}{decode_cpu * 1000 / duration:>13.2f}")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,166 @@
+# backends.py
+
+import collections
+import json
+import time
+from deadlines import call_timeout
+
+# Timeout of cloud requests made outside a StagePolicy, and of a whole streaming
+# recognition (the segment is captured while it runs)
+REQUEST_TIMEOUT_S = 10.0
+STREAM_TIMEOUT_S = 30.0
+
+# One recognition result. segments is a list of (text, stability) pairs in
+# order; interim results from the cloud usually have a stable first segment
+# followed by an unstable tail. Final results have a single segment with
+# stability 1.0.
+Partial = collections.namedtuple("Partial", "segments is_final language")
+
+
+def partial_text(partial):
+    return "".join(text for text, _ in partial.segments).strip()
+
+
+def stable_text(partial, threshold):
+    """The leading segments whose stability is at least `threshold`."""
+    stable = []
+    for text, stability in partial.segments:
+        if stability < threshold:
+            break
+        stable.append(text)
+    return "".join(stable).strip()
+
+
+class CloudRecognizer:
+    """Google Cloud Speech-to-Text, batch and streaming."""
+
+    def __init__(self, client, stream_timeout=STREAM_TIMEOUT_S):
+        self.client = client
+        self.stream_timeout = stream_timeout
+
+    def _config(self, sample_rate, language_code, alternative_language_codes, encoding="LINEAR16"):
+        from google.cloud import speech
+        return speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding[encoding],
+            language_code=language_code,
+            sample_rate_hertz=sample_rate,
+            alternative_language_codes=list(alternative_language_codes))
+
+    def recognize(self, audio_bytes, sample_rate, language_code, alternative_language_codes=(), encoding="LINEAR16"):
+        """Transcribe a complete segment, LINEAR16 or compressed (FLAC, OGG_OPUS; see
+        audio_codec.py). Returns the transcript ("" if nothing was recognized)."""
+        from google.cloud import speech
+        audio = speech.RecognitionAudio(content=audio_bytes)
+        config = self._config(sample_rate, language_code, alternative_language_codes, encoding)
+        response = self.client.recognize(config=config, audio=audio, timeout=call_timeout(REQUEST_TIMEOUT_S))
+        return " ".join(result.alternatives[0].transcript.strip() for result in response.results).strip()
+
+    def stream(self, chunks, sample_rate, language_code, alternative_language_codes=()):
+        """Transcribe audio while it is captured. `chunks` yields LINEAR16 bytes and
+        ends with the segment; yields Partial results, interim ones included."""
+        from google.cloud import speech
+        streaming_config = speech.StreamingRecognitionConfig(
+            config=self._config(sample_rate, language_code, alternative_language_codes),
+            interim_results=True)
+        requests = (speech.StreamingRecognizeRequest(audio_content=chunk) for chunk in chunks)
+        for response in self.client.streaming_recognize(config=streaming_config, requests=requests,
+                                                        timeout=self.stream_timeout):
+            if not response.results:
+                continue
+            if response.results[0].is_final:
+                result = response.results[0]
+                yield Partial([(result.alternatives[0].transcript, 1.0)], True, result.language_code)
+            else:
+                segments = [(result.alternatives[0].transcript, result.stability) for result in response.results]
+                yield Partial(segments, False, response.results[0].language_code)
+
+
+class ScriptedRecognizer:
+    """Stand-in recognizer that replays scripted results, for trying out the
+    speculative path without the cloud.
+
+    Each utterance in the script is a dict with "partials" (a list of interim
+    results, each a list of [text, stability] pairs), "final" (the transcript)
+    and optionally "language". Utterances are used in order, one per stream()
+    or recognize() call. stream() emits the next interim result after every
+    `chunks_per_partial` audio chunks and the final once the audio ends.
+    """
+
+    def __init__(self, utterances, chunks_per_partial=10, delay=0.0):
+        self.utterances = collections.deque(utterances)
+        self.chunks_per_partial = chunks_per_partial
+        self.delay = delay  # Simulated recognition latency after the audio ends
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, "r") as f:
+            return cls(json.load(f), **kwargs)
+
+    def _next(self):
+        if not self.utterances:
+            return {"partials": [], "final": ""}
+        return self.utterances.popleft()
+
+    def recognize(self, audio_bytes, sample_rate, language_code, alternative_language_codes=(), encoding="LINEAR16"):
+        time.sleep(self.delay)
+        return self._next()["final"]
+
+    def stream(self, chunks, sample_rate, language_code, alternative_language_codes=()):
+        utterance = self._next()
+        language = utterance.get("language", language_code.lower())
+        partials = collections.deque(utterance["partials"])
+        for count, _ in enumerate(chunks, 1):
+            if partials and count % self.chunks_per_partial == 0:
+                yield Partial([tuple(segment) for segment in partials.popleft()], False, language)
+        time.sleep(self.delay)
+        yield Partial([(utterance["final"], 1.0)], True, language)
+
+
+class PlaceholderRecognizer:
+    """Local stand-in recognizer: describes the segment instead of transcribing
+    it, after a simulated request latency. For running the pipeline end to end
+    without the cloud or on-device models."""
+
+    def __init__(self, latency=0.4, latency_per_second=0.05):
+        self.latency = latency
+        self.latency_per_second = latency_per_second
+
+    def recognize(self, audio_bytes, sample_rate, language_code, alternative_language_codes=(), encoding="LINEAR16"):
+        seconds = len(audio_bytes) / 2 / sample_rate
+        time.sleep(self.latency + self.latency_per_second * seconds)
+        return f"{seconds:.1f} seconds of speech"
+
+
+def translate_client():
+    """Cloud Translation (v2) client whose requests time out with the stage
+    attempt that makes them. The v2 client takes no per-call timeout, so it is
+    applied by its HTTP session."""
+    import google.auth
+    from google.auth.transport.requests import AuthorizedSession
+    from google.cloud import translate_v2 as translate
+
+    class DeadlineSession(AuthorizedSession):
+        def request(self, method, url, data=None, headers=None, timeout=REQUEST_TIMEOUT_S, **kwargs):
+            timeout = call_timeout(timeout)
+            return super().request(method, url, data=data, headers=headers, timeout=timeout, **kwargs)
+
+    credentials, _ = google.auth.default(scopes=translate.Client.SCOPE)
+    return translate.Client(_http=DeadlineSession(credentials))
+
+
+class StandInTranslateClient:
+    """Local stand-in for the Cloud Translation client: marks the text with the
+    target language and detects every text as `language`, after a simulated
+    request latency."""
+
+    def __init__(self, language="en", latency=0.2):
+        self.language = language
+        self.latency = latency
+
+    def translate(self, text, target_language, source_language=None):
+        time.sleep(self.latency)
+        return {"translatedText": f"[{target_language}] {text}"}
+
+    def detect_language(self, text):
+        time.sleep(self.latency / 2)
+        return {"language": self.language, "confidence": 1.0}
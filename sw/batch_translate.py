@@ -0,0 +1,306 @@
+# batch_translate.py
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import endpointing
+
+
+class RateLimiter:
+    """Token bucket: on average at most `rate` calls per second, with bursts of
+    up to `burst` calls."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+class Stage:
+    """One kind of backend call (recognize, translate, synthesize) with its own
+    concurrency and rate limits. The blocking call runs on a worker thread."""
+
+    def __init__(self, name, concurrency, rate):
+        self.name = name
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = RateLimiter(rate, burst=concurrency)
+        self.calls = 0
+        self.busy = 0.0
+
+    async def call(self, function, *args):
+        """Returns (result, seconds the call took)."""
+        async with self.semaphore:
+            await self.limiter.acquire()
+            start = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(None, function, *args)
+            elapsed = time.perf_counter() - start
+            self.calls += 1
+            self.busy += elapsed
+            return result, elapsed
+
+
+def find_wav_files(paths):
+    """WAV files among `paths`, searching directories recursively."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.lower().endswith(".wav"))
+        else:
+            files.append(path)
+    return files
+
+
+def output_names(files):
+    """Output directory name of each file: its path relative to the common
+    directory of all files, without the extension, so that a/x.wav and b/x.wav
+    do not share one."""
+    if not files:
+        return []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+    return [os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0] for path in files]
+
+
+def ends_with_newline(path):
+    """Whether a non-empty file ends with a newline, reading only its last byte."""
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def write_wav(path, pcm, rate):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(bytes(pcm))
+
+
+class BatchTranslator:
+    """Runs recorded sessions through recognize -> translate -> synthesize.
+
+    Files are cut into segments with the same Endpointer as live capture, and
+    the segments of up to `files` files at a time go through the backends
+    concurrently, each stage limited to `concurrency` calls in flight and
+    `rate` calls per second. A file's audio is held in memory only until its
+    segments are written. Results for <name>.wav go to <output>/<name>/, <name> being the
+    path relative to the common directory of the inputs: segments.jsonl (one
+    line per finished segment, written as soon as it finishes), transcript.tsv
+    (in order, once the file is complete) and, with a synthesizer,
+    NNNN.wav per segment. A rerun skips segments already in segments.jsonl.
+
+    recognize(pcm, rate, language, alternatives) -> text,
+    translate(text, target, source) -> text and
+    synthesizer.synthesize(text, language) -> (pcm, rate) are the backends.
+    """
+
+    def __init__(self, recognize, translate, synthesizer=None, source_language="en-US", target_language="es-US",
+                 alternative_languages=(), concurrency=4, rate=5.0, files=2, endpointer_settings=None):
+        self.recognize = recognize
+        self.translate = translate
+        self.synthesizer = synthesizer
+        self.source_language = source_language
+        self.target_language = target_language
+        self.alternative_languages = list(alternative_languages)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.files = files
+        self.endpointer_settings = endpointer_settings or {}
+
+    def segment_file(self, path):
+        """Returns (segments as (start_s, end_s, pcm), sample rate, duration_s)."""
+        pcm, rate = endpointing.read_wav(path)
+        results = endpointing.run_session(pcm, rate, **self.endpointer_settings)
+        segments = [(start, end, data.pcm) for start, end, event, data in results if event == endpointing.SEGMENT]
+        return segments, rate, len(pcm) / 2 / rate
+
+    def _load_done(self, jsonl_path):
+        done = {}
+        if os.path.exists(jsonl_path):
+            with open(jsonl_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Line cut short by an interrupted run
+                    done[record["index"]] = record
+        return done
+
+    async def _segment(self, index, start, end, pcm, rate, out_dir, log, stats):
+        record = {"index": index, "start_s": round(start, 3), "end_s": round(end, 3)}
+        try:
+            transcript, record["recognize_s"] = await self.stages["recognize"].call(
+                self.recognize, pcm, rate, self.source_language, self.alternative_languages)
+            record["transcript"] = transcript
+            record["translation"] = ""
+            if transcript:
+                record["translation"], record["translate_s"] = await self.stages["translate"].call(
+                    self.translate, transcript, self.target_language[:2], self.source_language[:2])
+            if self.synthesizer is not None and record["translation"]:
+                (audio, audio_rate), record["synthesize_s"] = await self.stages["synthesize"].call(
+                    self.synthesizer.synthesize, record["translation"], self.target_language)
+                record["audio"] = f"{index:04d}.wav"
+                write_wav(os.path.join(out_dir, record["audio"]), audio, audio_rate)
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"Segment {index} of {out_dir} failed: {e}")
+            return None
+        log.write(json.dumps(record, ensure_ascii=False) + "\n")
+        log.flush()
+        stats["segments"] += 1
+        return record
+
+    async def _file(self, path, name, output, stats):
+        out_dir = os.path.join(output, name)
+        os.makedirs(out_dir, exist_ok=True)
+        jsonl_path = os.path.join(out_dir, "segments.jsonl")
+        done = self._load_done(jsonl_path)
+        loop = asyncio.get_running_loop()
+        try:
+            segments, rate, duration = await loop.run_in_executor(None, self.segment_file, path)
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"Could not read {path}: {e}")
+            return
+        stats["files"] += 1
+        skipped = sum(1 for index in range(len(segments)) if index in done)
+        stats["skipped"] += skipped
+        count = len(segments)
+        if skipped < count:
+            stats["audio_s"] += duration  # Throughput counts the recording, pauses included
+        with open(jsonl_path, "a", encoding="utf-8") as log:
+            if log.tell() and done and not ends_with_newline(jsonl_path):
+                log.write("\n")  # Do not glue the next record onto a line cut short
+            jobs = [self._segment(index, start, end, pcm, rate, out_dir, log, stats)
+                    for index, (start, end, pcm) in enumerate(segments) if index not in done]
+            del segments  # Each segment's PCM is released once the segment is written
+            results = await asyncio.gather(*jobs)
+        for record in results:
+            if record is not None:
+                done[record["index"]] = record
+        if len(done) >= count:
+            with open(os.path.join(out_dir, "transcript.tsv"), "w", encoding="utf-8") as f:
+                for index in sorted(done):
+                    record = done[index]
+                    f.write(f"{record['start_s']:.2f}\t{record['end_s']:.2f}\t{record['transcript']}\t"
+                            f"{record['translation']}\n")
+        print(f"{path}: {duration / 60:.1f} min, {count} segments, {len(done)} done")
+
+    async def run(self, paths, output):
+        """Process WAV files and directories. Returns the run statistics."""
+        self.stages = {name: Stage(name, self.concurrency, self.rate)
+                       for name in ("recognize", "translate", "synthesize")}
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=3 * self.concurrency + 1,
+                                                     thread_name_prefix="batch"))
+        stats = {"files": 0, "segments": 0, "skipped": 0, "failed": 0, "audio_s": 0.0}
+        start = time.perf_counter()
+        files = find_wav_files(paths)
+        in_flight = asyncio.Semaphore(self.files)
+
+        async def one_file(path, name):
+            async with in_flight:
+                await self._file(path, name, output, stats)
+
+        await asyncio.gather(*(one_file(path, name) for path, name in zip(files, output_names(files))))
+        stats["wall_s"] = time.perf_counter() - start
+        return stats
+
+
+def report(stats, stages):
+    print(f"{stats['files']} files, {stats['segments']} segments translated, {stats['skipped']} already done, "
+          f"{stats['failed']} failed")
+    if stats["audio_s"] > 0:
+        print(f"{stats['audio_s'] / 60:.1f} audio-minutes in {stats['wall_s'] / 60:.1f} wall-minutes: "
+              f"{stats['audio_s'] / stats['wall_s']:.1f} audio-minutes per wall-minute")
+    for stage in stages.values():
+        if stage.calls:
+            print(f"  {stage.name:<11}{stage.calls:>5} calls, mean {stage.busy / stage.calls:.2f} s")
+
+
+def stand_in_translate(text, target, source):
+    time.sleep(0.2)
+    return f"[{target}] {text}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Translate recorded sessions (16-bit mono WAV).")
+    parser.add_argument("inputs", nargs="+", help="WAV files or directories")
+    parser.add_argument("-o", "--output", default="batch_output")
+    parser.add_argument("--source", default="en-US", help="Language spoken in the recordings")
+    parser.add_argument("--target", default="es-US", help="Language to translate into")
+    parser.add_argument("--audio", action="store_true", help="Also synthesize the translations")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight per stage")
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests per second per stage")
+    parser.add_argument("--files", type=int, default=2,
+                        help="Recordings decoded and in flight at once (each is held in memory)")
+    parser.add_argument("--recognition", choices=("cloud", "local"), default="cloud")
+    parser.add_argument("--translation", choices=("cloud", "local"), default="cloud")
+    parser.add_argument("--stand-in", action="store_true",
+                        help="Use local stand-in backends (no cloud, no models) to try the pipeline")
+    args = parser.parse_args(argv)
+
+    if args.stand_in:
+        from backends import PlaceholderRecognizer
+        from tts_streaming import ToneSynthesizer
+        recognizer = PlaceholderRecognizer()
+        recognize = lambda pcm, rate, language, alternatives: recognizer.recognize(pcm, rate, language, alternatives)
+        translate = stand_in_translate
+        synthesizer = ToneSynthesizer()
+    else:
+        if args.recognition == "local":
+            from local_recognition import VoskRecognizer
+            recognizer = VoskRecognizer()
+            recognize = lambda pcm, rate, language, alternatives: recognizer.recognize_language(
+                pcm, rate, [language] + alternatives)[0]
+        else:
+            from google.cloud import speech
+            from backends import CloudRecognizer
+            recognizer = CloudRecognizer(speech.SpeechClient())
+            recognize = recognizer.recognize
+        if args.translation == "local":
+            from local_translation import LocalTranslator
+            local = LocalTranslator()
+            def translate(text, target, source):
+                result = local.translate(text, source, target)
+                if result is None:
+                    raise RuntimeError(f"No local translation engine for {source}-{target}")
+                return result[0]
+        else:
+            import html
+            from google.cloud import translate_v2
+            client = translate_v2.Client()
+            translate = lambda text, target, source: html.unescape(
+                client.translate(text, target_language=target, source_language=source)["translatedText"])
+        synthesizer = None
+        if args.audio:
+            from google.cloud import texttospeech
+            from tts_streaming import CloudSynthesizer
+            synthesizer = CloudSynthesizer(texttospeech.TextToSpeechClient(),
+                                           lambda language_code: f"{language_code}-Standard-A")
+    if not args.audio:
+        synthesizer = None
+
+    batch = BatchTranslator(recognize, translate, synthesizer, args.source, args.target,
+                            concurrency=args.concurrency, rate=args.rate, files=args.files)
+    stats = asyncio.run(batch.run(args.inputs, args.output))
+    report(stats, batch.stages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# deadlines.py
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import metrics
+
+# Default time budget per pipeline stage in seconds; PLT_BUDGET_<STAGE> overrides
+# (e.g. PLT_BUDGET_RECOGNIZE=4)
+STAGE_BUDGETS = {
+    "recognize": 6.0,
+    "detect_language": 2.0,
+    "translate": 3.0,
+    "synthesize": 4.0,
+}
+
+OUTCOMES = ("ok", "retried", "hedged", "deadline", "cancelled", "error")
+
+# Deadline of the StagePolicy attempt running on the current worker thread
+_attempt = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """The stage ran out of its time budget."""
+
+
+class Cancelled(Exception):
+    """The work was cancelled (mode or language change)."""
+
+
+class Deadline:
+    """A point in time by which work must be done."""
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+
+def call_timeout(default=None):
+    """Seconds left for the request made by the StagePolicy attempt running on
+    this thread, to pass as the `timeout` of a cloud call so that an abandoned
+    attempt really ends; `default` outside a stage."""
+    deadline = getattr(_attempt, "deadline", None)
+    return default if deadline is None else deadline.remaining()
+
+
+class CancellationToken:
+    """Shared by all work for the utterances captured under one mode and
+    language. cancel() marks them stale; callbacks registered with on_cancel()
+    run once, e.g. to stop playback."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self, reason=""):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.reason = reason
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancellation callback failed: {e}")
+
+    def on_cancel(self, callback):
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        if self.event.is_set():
+            raise Cancelled(self.reason)
+
+
+class StagePolicy:
+    """Runs the calls of one stage with a deadline, retries and hedging.
+
+    Each call gets `budget` seconds. A failed attempt is retried after a
+    jittered exponential backoff (0 to backoff * 2^attempt seconds) if the
+    budget still has room for the backoff plus a typical attempt. When
+    `hedge` is on and an attempt is still running after the stage's p95
+    attempt latency, a second identical request is started and the first
+    answer wins. Waiting stops early when the cancellation token is
+    cancelled. Each attempt gives its cloud request the time left to the
+    deadline (see call_timeout()), so attempts that are abandoned end by the
+    deadline instead of holding a worker; their result is discarded.
+
+    The calls must be idempotent (recognition, translation and synthesis are).
+    """
+
+    def __init__(self, name, budget=None, retries=2, backoff=0.25, hedge=True, min_samples=20, executor=None):
+        self.name = name
+        self.budget = budget if budget is not None else float(
+            os.environ.get(f"PLT_BUDGET_{name.upper()}", STAGE_BUDGETS.get(name, 5.0)))
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.min_samples = min_samples
+        self.executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix=name)
+        self.verbose = True
+        self.attempt_seconds = metrics.histogram("plt_stage_attempt_seconds", "Latency of single cloud call attempts",
+                                                 labels={"stage": name})
+        self.outcomes = {outcome: metrics.counter("plt_stage_calls_total", "Stage calls by outcome",
+                                                  labels={"stage": name, "outcome": outcome})
+                         for outcome in OUTCOMES}
+
+    def _hedge_after(self):
+        """p95 attempt latency, or None until there are enough samples."""
+        if not self.hedge or self.attempt_seconds.count < self.min_samples:
+            return None
+        return self.attempt_seconds.quantile(0.95)
+
+    def _attempt(self, function, args, kwargs, deadline):
+        if deadline.expired():
+            raise DeadlineExceeded(f"{self.name} attempt was not started before the deadline")
+        _attempt.deadline = deadline
+        try:
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.attempt_seconds.observe(time.perf_counter() - start)
+            return result
+        finally:
+            _attempt.deadline = None
+
+    def _wait(self, futures, timeout, token):
+        """Wait for the first future to finish, in short slices so cancellation is noticed."""
+        end = time.monotonic() + timeout
+        while True:
+            if token is not None:
+                token.check()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return set()
+            done, _ = wait(futures, timeout=min(remaining, 0.05), return_when=FIRST_COMPLETED)
+            if done:
+                return done
+
+    def call(self, function, *args, token=None, deadline=None, **kwargs):
+        """Run function(*args, **kwargs) within the stage budget (or `deadline`
+        if given). Raises DeadlineExceeded, Cancelled or the last error."""
+        deadline = deadline or Deadline(self.budget)
+        attempt = 0
+        hedged = False
+        error = None
+        try:
+            while True:
+                futures = {self.executor.submit(self._attempt, function, args, kwargs, deadline)}
+                hedge_after = self._hedge_after()
+                while futures:
+                    remaining = deadline.remaining()
+                    if remaining <= 0:
+                        raise DeadlineExceeded(f"{self.name} exceeded its {self.budget:.1f} s budget")
+                    timeout = remaining
+                    if hedge_after is not None and len(futures) == 1 and not hedged:
+                        timeout = min(remaining, hedge_after)
+                    done = self._wait(futures, timeout, token)
+                    if not done:
+                        if hedge_after is not None and not hedged and deadline.remaining() > 0:
+                            # Slower than 95% of attempts: race a second request
+                            hedged = True
+                            futures.add(self.executor.submit(self._attempt, function, args, kwargs, deadline))
+                        continue
+                    for future in done:
+                        futures.discard(future)
+                        if future.exception() is None:
+                            self.outcomes["hedged" if hedged else "retried" if attempt else "ok"].inc()
+                            return future.result()
+                        error = future.exception()
+                # Every attempt failed: back off and retry if the budget allows
+                attempt += 1
+                delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+                typical = self.attempt_seconds.quantile(0.5) or 0.0
+                if attempt > self.retries or deadline.remaining() < delay + typical:
+                    raise error
+                if self.verbose:
+                    print(f"{self.name} failed ({error}); retrying in {delay:.2f} s")
+                end = time.monotonic() + delay
+                while time.monotonic() < end:
+                    if token is not None:
+                        token.check()
+                    time.sleep(min(0.05, max(0.0, end - time.monotonic())))
+        except DeadlineExceeded:
+            self.outcomes["deadline"].inc()
+            raise
+        except Cancelled:
+            self.outcomes["cancelled"].inc()
+            raise
+        except Exception:
+            self.outcomes["error"].inc()
+            raise
+
+
+def stage_policies(names=tuple(STAGE_BUDGETS), **kwargs):
+    """A StagePolicy per stage name, sharing one worker pool."""
+    executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="cloud")
+    return {name: StagePolicy(name, executor=executor, **kwargs) for name in names}
+
+
+def simulate(calls=300, p_slow=0.03, slow=4.0, fast=0.3, p_fail=0.03, budget=3.0, hedge=True):
+    """Tail latency and failures of a flaky service without a deadline, with a
+    deadline and retries, and with hedging added: most
+    calls take `fast` seconds (jittered), `p_slow` of them `slow` seconds and
+    `p_fail` fail outright. Time is scaled down 10x."""
+    rng = random.Random(0)
+    scale = 0.1
+
+    def flaky():
+        roll = rng.random()
+        if roll < p_fail:
+            time.sleep(fast * scale)
+            raise ConnectionError("connection reset")
+        time.sleep((slow if roll < p_fail + p_slow else fast * rng.uniform(0.7, 1.3)) * scale)
+        return "ok"
+
+    for label, policy_kwargs in (("no deadline", dict(budget=60.0 * scale, retries=0, hedge=False)),
+                                 ("deadline", dict(budget=budget * scale, retries=2, hedge=False)),
+                                 ("hedged", dict(budget=budget * scale, retries=2, hedge=hedge))):
+        policy = StagePolicy(f"simulated_{label.replace(' ', '_')}", backoff=0.25 * scale, min_samples=20,
+                             executor=ThreadPoolExecutor(max_workers=16), **policy_kwargs)
+        policy.verbose = False
+        latencies, failures = [], 0
+        for _ in range(calls):
+            start = time.perf_counter()
+            try:
+                policy.call(flaky)
+            except Exception:
+                failures += 1
+                continue
+            latencies.append((time.perf_counter() - start) / scale)
+        latencies.sort()
+        pick = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+        print(f"{label:<12} p50 {pick(0.5):.2f} s  p95 {pick(0.95):.2f} s  p99 {pick(0.99):.2f} s  "
+              f"failed {failures}/{calls}")
+        policy.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    simulate()
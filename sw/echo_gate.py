@@ -0,0 +1,207 @@
+# echo_gate.py
+
+import collections
+import math
+import threading
+import time
+import numpy as np
+import metrics
+
+ECHO_FRAMES = metrics.counter("plt_echo_gated_frames_total", "Microphone frames suppressed as playback echo")
+BARGE_INS = metrics.counter("plt_barge_ins_total", "Playbacks cut off because the other party started speaking")
+
+
+def frame_powers(pcm, samples_per_frame):
+    """Mean square of each whole frame of 16-bit PCM."""
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    count = len(samples) // samples_per_frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:count * samples_per_frame].astype(np.float32).reshape(count, samples_per_frame)
+    return np.einsum("ij,ij->i", frames, frames) / samples_per_frame
+
+
+class EchoGate:
+    """Tells the echo of our own playback apart from someone speaking, so the
+    microphone can stay open while the device talks.
+
+    The player reports every block it hands to the output (played()); that
+    reference is kept as a timeline of frame powers. A microphone frame is
+    echo when it is no louder than the loudest reference frame that could be
+    reaching the microphone at that moment (within `max_delay_ms` plus a
+    `tail_ms` reverberation tail) times the acoustic coupling plus
+    `margin_db`. The coupling starts at 0 dB (echo as loud as the output) and
+    is learned from frames that were echo, so barge-in gets more sensitive
+    after a few seconds of playback.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, margin_db=6.0, max_delay_ms=300, tail_ms=250,
+                 coupling_db=0.0, min_coupling_db=-40.0):
+        self.sample_rate = sample_rate
+        self.frame_s = frame_ms / 1000.0
+        self.window_s = (max_delay_ms + tail_ms) / 1000.0
+        self.margin = 10 ** (margin_db / 10.0)
+        self.log_coupling = coupling_db / 10.0 * math.log(10)
+        self.min_log_coupling = min_coupling_db / 10.0 * math.log(10)
+        self.reference = collections.deque()  # (time the frame plays, power)
+        self.playing_until = 0.0
+        self.lock = threading.Lock()
+
+    def played(self, pcm, rate, now=None):
+        """Record a block of output audio (16-bit mono PCM at `rate`) as it is
+        handed to the output. Blocks are assumed to play back to back."""
+        now = time.monotonic() if now is None else now
+        powers = frame_powers(pcm, max(1, int(rate * self.frame_s)))
+        with self.lock:
+            start = max(now, self.playing_until)
+            for index, power in enumerate(powers):
+                self.reference.append((start + index * self.frame_s, float(power)))
+            self.playing_until = start + len(pcm) / 2 / rate
+            while self.reference and self.reference[0][0] < now - 2 * self.window_s:
+                self.reference.popleft()
+
+    def interrupt(self, now=None):
+        """Playback was cut off: the rest of the reference will not be played."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            while self.reference and self.reference[-1][0] > now:
+                self.reference.pop()
+            self.playing_until = min(self.playing_until, now)
+
+    def playing(self, now=None):
+        """True while our output (or its reverberation) can reach the microphone."""
+        now = time.monotonic() if now is None else now
+        return now < self.playing_until + self.window_s
+
+    def _reference_power(self, when):
+        with self.lock:
+            return max((power for start, power in self.reference
+                        if when - self.window_s <= start <= when + self.frame_s), default=0.0)
+
+    def is_echo(self, frame, when=None):
+        """True if a microphone frame (bytes or an int16 array) captured at
+        `when` (time.monotonic()) can be explained by our own playback."""
+        when = time.monotonic() - self.frame_s if when is None else when
+        if not self.playing(when):
+            return False
+        reference = self._reference_power(when)
+        if reference <= 0.0:
+            return False
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        power = float(np.dot(samples, samples)) / max(len(samples), 1)
+        if power > reference * math.exp(self.log_coupling) * self.margin:
+            return False
+        # Learn the coupling from loud reference frames only
+        if reference > 1e4 and power > 0.0:
+            self.log_coupling += 0.05 * (max(math.log(power / reference), self.min_log_coupling) - self.log_coupling)
+        ECHO_FRAMES.inc()
+        return True
+
+    @property
+    def coupling_db(self):
+        return 10.0 * self.log_coupling / math.log(10)
+
+
+def simulate(speech, playback, sample_rate=16000, frame_ms=30, speech_at=None, delay_ms=60, coupling_db=-12.0,
+             noise=30.0, method="gate", vad=None, seed=0):
+    """Play `playback` (int16 array) into a simulated room and run the capture
+    path on the microphone signal: the playback's echo (delayed and attenuated),
+    room noise and optionally `speech` starting `speech_at` seconds after the
+    playback starts.
+
+    method is "gate" (open microphone with EchoGate), "open" (open microphone,
+    no gate) or "mute" (microphone ignored during playback, as before).
+    Returns (endpointer events as (time, event, data), barge-in time or None).
+    """
+    from endpointing import Endpointer, START
+    rng = np.random.default_rng(seed)
+    samples_per_frame = int(sample_rate * frame_ms / 1000)
+    playback_s = len(playback) / sample_rate
+    length = len(playback) + sample_rate
+    if speech_at is not None:
+        length = max(length, int(speech_at * sample_rate) + len(speech) + sample_rate)
+    room = rng.normal(0.0, noise, length)
+    if speech_at is not None:
+        offset = int(speech_at * sample_rate)
+        room[offset:offset + len(speech)] += speech
+    echo = np.zeros(length)
+    delay = int(delay_ms * sample_rate / 1000)
+    echo[delay:delay + len(playback)] = playback * 10 ** (coupling_db / 20.0)
+
+    gate = EchoGate(sample_rate, frame_ms)
+    endpointer = Endpointer(sample_rate, frame_ms, vad=vad)
+    block = int(sample_rate * 0.1)  # The player hands over 100 ms at a time
+    written = 0
+    stopped_at = None
+    events = []
+    for index in range(length // samples_per_frame):
+        now = index * frame_ms / 1000.0
+        # Keep the reference one block ahead of the microphone, like an output buffer
+        while stopped_at is None and written < len(playback) and written / sample_rate <= now + 0.1:
+            gate.played(playback[written:written + block].tobytes(), sample_rate, now=written / sample_rate)
+            written += block
+        span = slice(index * samples_per_frame, (index + 1) * samples_per_frame)
+        frame = room[span]
+        if stopped_at is None or now < stopped_at + delay_ms / 1000.0:
+            frame = frame + echo[span]  # After a barge-in the output is cut and the echo stops
+        frame = np.clip(frame, -32768, 32767).astype(np.int16)
+        playing = stopped_at is None and now < playback_s + delay_ms / 1000.0
+        if method == "mute" and playing:
+            continue
+        suppress = method == "gate" and gate.is_echo(frame, now)
+        done = now + frame_ms / 1000.0  # Events happen once the whole frame has been captured
+        for event, data in endpointer.process(frame, suppress=suppress):
+            if event == START and playing and method == "gate":
+                stopped_at = done
+                gate.interrupt(done)
+            events.append((done, event, data))
+    return events, stopped_at
+
+
+def evaluate(speech, playback, sample_rate=16000, couplings=(-20.0, -12.0, -6.0), vad=None):
+    """Print the false-trigger rate, time-to-listen after playback and barge-in
+    latency of the open-microphone gate against muting the microphone during
+    playback and an ungated open microphone."""
+    from endpointing import START, SEGMENT
+    playback_s = len(playback) / sample_rate
+    print(f"playback {playback_s:.1f} s, speech {len(speech) / sample_rate:.1f} s, "
+          f"echo coupling {', '.join(f'{c:.0f}' for c in couplings)} dB")
+    print(f"{'method':<7}{'false/min':>10}{'listen ms':>11}{'barge-in ms':>13}{'barge-ins':>11}")
+    for method in ("mute", "open", "gate"):
+        false = listen = barge = 0.0
+        barge_ins = 0
+        for coupling in couplings:
+            # Playback alone: every segment is a false trigger
+            events, _ = simulate(speech, playback, sample_rate, coupling_db=coupling, method=method, vad=vad)
+            false += sum(1 for _, event, _ in events if event == SEGMENT)
+            # Reply right after playback ends: time until the onset is picked up
+            onset = playback_s + 0.06
+            events, _ = simulate(speech, playback, sample_rate, speech_at=onset, coupling_db=coupling,
+                                 method=method, vad=vad)
+            starts = [t for t, event, _ in events if event == START and t >= onset - 0.3]
+            listen += ((starts[0] - onset) if starts else 1.0) * 1000
+            # Interruption half way through the playback
+            onset = playback_s / 2
+            _, stopped_at = simulate(speech, playback, sample_rate, speech_at=onset, coupling_db=coupling,
+                                     method=method, vad=vad)
+            if stopped_at is not None and stopped_at >= onset:
+                barge_ins += 1
+                barge += (stopped_at - onset) * 1000
+        runs = len(couplings)
+        minutes = runs * (playback_s + 1.0) / 60.0
+        barge_text = f"{barge / barge_ins:.0f}" if barge_ins else "-"
+        print(f"{method:<7}{false / minutes:>10.1f}{listen / runs:>11.0f}{barge_text:>13}{barge_ins:>8}/{runs}")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 4 and sys.argv[1] == "eval":
+        # eval <speech.wav> <playback.wav>: 16-bit mono recordings at the same rate
+        from endpointing import read_wav
+        speech_pcm, rate = read_wav(sys.argv[2])
+        playback_pcm, playback_rate = read_wav(sys.argv[3])
+        if rate != playback_rate:
+            sys.exit("The speech and playback recordings must have the same sample rate")
+        evaluate(np.frombuffer(speech_pcm, dtype=np.int16), np.frombuffer(playback_pcm, dtype=np.int16), rate)
+    else:
+        print("usage: echo_gate.py eval <speech.wav> <playback.wav>")
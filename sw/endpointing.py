@@ -0,0 +1,319 @@
+# endpointing.py
+
+import collections
+import itertools
+import math
+import wave
+import numpy as np
+
+# Endpointer.process() events
+START = "start"  # A segment began; followed by its pre-roll frames as AUDIO events
+AUDIO = "audio"  # A frame that belongs to the current segment (bytes)
+SEGMENT = "segment"  # The segment is complete (a Segment)
+DROP = "drop"  # The segment was too short to be speech and is discarded (a Segment)
+
+# Why a segment ended: the speaker paused for the hangover time, or it reached
+# the maximum length (cut at the quietest point available)
+PAUSE = "pause"
+MAX_LENGTH = "max_length"
+
+# A finished segment. pcm is LINEAR16 bytes including the pre-roll; speech_s is
+# the voiced audio in it and trailing_s the silence waited for before release.
+Segment = collections.namedtuple("Segment", "pcm reason duration_s speech_s trailing_s")
+
+
+def frame_energy_db(frame):
+    """RMS level of a 16-bit frame in dB (0 dB is one LSB)."""
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    return 20.0 * math.log10(math.sqrt(float(np.dot(samples, samples)) / max(len(samples), 1)) + 1.0)
+
+
+class Endpointer:
+    """Turns a stream of fixed-size frames into speech segments.
+
+    A frame counts as speech when the VAD says so and it is at least
+    `margin_db` above the noise floor, which follows the level of non-speech
+    frames (falling quickly, rising slowly). A segment starts after
+    `start_frames` consecutive speech frames and includes up to `pre_roll_ms`
+    of audio before them, so soft onsets are not clipped.
+
+    A segment ends when the speaker has been silent for the hangover time. The
+    hangover follows the speaker: it is `hangover_factor` times the running
+    average of the pauses inside segments, kept between `min_hangover_ms` and
+    `max_hangover_ms`. Segments with less than `min_speech_ms` of speech are
+    dropped. Once a segment is `max_segment_ms - cut_window_ms` long it is cut
+    at the next quiet frame, and at `max_segment_ms` regardless; speech carries
+    on into a new segment without a gap.
+
+    preprocess(frame) -> frame, if given, cleans up what the VAD sees (e.g.
+    quality_gate.SpectralSubtractor); levels and segment audio stay original.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, vad=None, vad_mode=3, pre_roll_ms=300,
+                 hangover_ms=300, min_hangover_ms=210, max_hangover_ms=900, hangover_factor=1.5,
+                 start_frames=2, min_speech_ms=150, max_segment_ms=10000, cut_window_ms=2000,
+                 margin_db=6.0, preprocess=None):
+        if vad is None:
+            import webrtcvad
+            vad = webrtcvad.Vad(vad_mode)
+        self.vad = vad
+        self.preprocess = preprocess
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.initial_hangover_ms = hangover_ms
+        self.min_hangover_ms = min_hangover_ms
+        self.max_hangover_ms = max_hangover_ms
+        self.hangover_factor = hangover_factor
+        self.start_frames = start_frames
+        self.min_speech_frames = max(1, int(min_speech_ms / frame_ms))
+        self.set_max_segment(max_segment_ms, cut_window_ms)
+        self.margin_db = margin_db
+        self.pre_roll = collections.deque(maxlen=max(int(pre_roll_ms / frame_ms), start_frames))
+        self.noise_floor = None
+        self.pause_ms = None  # Running average of pauses inside segments
+        self.reset()
+
+    def reset(self):
+        """Forget the segment in progress (the noise floor and speaking rate are kept)."""
+        self.pre_roll.clear()
+        self.triggered = False
+        self.run = 0  # Consecutive speech frames while not triggered
+        self.frames = []
+        self.silence = []  # Trailing non-speech frames, kept only if speech resumes
+        self.speech_frames = 0
+
+    def set_max_segment(self, max_segment_ms, cut_window_ms=2000):
+        """Segments are cut at a pause after max_segment_ms - cut_window_ms and at max_segment_ms."""
+        self.max_segment_frames = int(max_segment_ms / self.frame_ms)
+        self.soft_max_frames = max(1, self.max_segment_frames - int(cut_window_ms / self.frame_ms))
+
+    @property
+    def hangover_ms(self):
+        if self.pause_ms is None:
+            return self.initial_hangover_ms
+        return min(max(self.hangover_factor * self.pause_ms, self.min_hangover_ms), self.max_hangover_ms)
+
+    def _is_speech(self, frame, suppress):
+        # The preprocessor keeps its state only if it sees every frame
+        cleaned = self.preprocess(frame) if self.preprocess is not None else frame
+        if suppress:
+            return False
+        energy = frame_energy_db(frame)
+        if self.noise_floor is None:
+            self.noise_floor = energy
+        speech = self.vad.is_speech(cleaned, self.sample_rate) and energy >= self.noise_floor + self.margin_db
+        if not speech:
+            rate = 0.2 if energy < self.noise_floor else 0.02
+            self.noise_floor += rate * (energy - self.noise_floor)
+        return speech
+
+    def _finish(self, reason):
+        frames = self.frames
+        segment = Segment(b"".join(frames), reason, len(frames) * self.frame_ms / 1000.0,
+                          self.speech_frames * self.frame_ms / 1000.0, len(self.silence) * self.frame_ms / 1000.0)
+        self.frames = []
+        self.silence = []
+        self.speech_frames = 0
+        if reason == PAUSE and segment.speech_s * 1000.0 < self.min_speech_frames * self.frame_ms:
+            return DROP, segment
+        return SEGMENT, segment
+
+    def process(self, frame, suppress=False):
+        """Feed one frame (bytes or an int16 array). Returns a list of (event, data).
+
+        suppress=True marks a frame as non-speech without looking at it (e.g.
+        the echo of our own playback, see echo_gate.py); it does not move the
+        noise floor."""
+        if not isinstance(frame, bytes):
+            frame = frame.tobytes()
+        speech = self._is_speech(frame, suppress)
+        events = []
+
+        if not self.triggered:
+            self.pre_roll.append(frame)
+            self.run = self.run + 1 if speech else 0
+            if self.run >= self.start_frames:
+                self.triggered = True
+                self.run = 0
+                self.speech_frames = self.start_frames
+                events.append((START, None))
+                for buffered in self.pre_roll:
+                    self.frames.append(buffered)
+                    events.append((AUDIO, buffered))
+                self.pre_roll.clear()
+            return events
+
+        if speech:
+            if self.silence:
+                # A pause inside the segment: its length tracks the speaking rate
+                pause = len(self.silence) * self.frame_ms
+                self.pause_ms = pause if self.pause_ms is None else 0.8 * self.pause_ms + 0.2 * pause
+                for buffered in self.silence:
+                    self.frames.append(buffered)
+                    events.append((AUDIO, buffered))
+                self.silence = []
+            self.frames.append(frame)
+            self.speech_frames += 1
+            events.append((AUDIO, frame))
+        else:
+            self.silence.append(frame)
+            if len(self.silence) * self.frame_ms >= self.hangover_ms:
+                silence = self.silence
+                events.append(self._finish(PAUSE))
+                self.triggered = False
+                self.pre_roll.extend(silence[-self.pre_roll.maxlen:])
+                return events
+
+        length = len(self.frames) + len(self.silence)
+        if length >= self.max_segment_frames or (length >= self.soft_max_frames and not speech):
+            # Long speech: release what we have so recognition can start, and
+            # carry on in a new segment straight away
+            for buffered in self.silence:
+                self.frames.append(buffered)
+                events.append((AUDIO, buffered))
+            self.silence = []
+            events.append(self._finish(MAX_LENGTH))
+            events.append((START, None))
+        return events
+
+
+def read_wav(path):
+    """LINEAR16 mono PCM and sample rate of a WAV file."""
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit mono audio")
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+def read_labels(path):
+    """(start, end) seconds of each utterance from a label file with one
+    "start<TAB>end[<TAB>text]" line per utterance (Audacity label format)."""
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.split("\t")
+            if len(fields) >= 2 and not line.startswith("#"):
+                labels.append((float(fields[0]), float(fields[1])))
+    return labels
+
+
+def run_session(pcm, sample_rate, frame_ms=30, **settings):
+    """Run an Endpointer over a recording. Returns a list of (start_s, end_s, event, Segment)."""
+    endpointer = Endpointer(sample_rate, frame_ms, **settings)
+    frame_bytes = int(sample_rate * frame_ms / 1000) * 2
+    results = []
+    start_frame = None
+    for index in range(len(pcm) // frame_bytes):
+        for event, data in endpointer.process(pcm[index * frame_bytes:(index + 1) * frame_bytes]):
+            if event == START:
+                start_frame = None
+            elif event == AUDIO and start_frame is None:
+                start_frame = index - len(endpointer.frames) + 1
+            elif event in (SEGMENT, DROP):
+                start = (start_frame if start_frame is not None else index) * frame_ms / 1000.0
+                # The segment is released after the hangover; its audio ends before it
+                end = start + data.duration_s
+                results.append((start, end, event, data))
+                start_frame = None
+    return results
+
+
+def score_session(results, labels):
+    """Compare segments with labelled utterances.
+
+    onset_clip_ms: mean speech cut from the start of utterances
+    endpoint_ms: mean time from the end of an utterance to the segment release
+    false: segments that overlap no utterance; missed: utterances with no segment
+    split: extra segments inside an utterance that are not max-length cuts
+    """
+    segments = [(start, end, data) for start, end, event, data in results if event == SEGMENT]
+    clips, delays, split, missed = [], [], 0, 0
+    for label_start, label_end in labels:
+        overlapping = [s for s in segments if s[0] < label_end and s[1] > label_start]
+        if not overlapping:
+            missed += 1
+            continue
+        clips.append(max(overlapping[0][0] - label_start, 0.0) * 1000)
+        last = overlapping[-1]
+        delays.append((last[1] + last[2].trailing_s - label_end) * 1000)
+        split += sum(1 for s in overlapping[:-1] if s[2].reason == PAUSE)
+    false = sum(1 for s in segments if not any(s[0] < end and s[1] > start for start, end in labels))
+    return {
+        "segments": len(segments),
+        "dropped": sum(1 for r in results if r[2] == DROP),
+        "onset_clip_ms": sum(clips) / len(clips) if clips else 0.0,
+        "endpoint_ms": sum(delays) / len(delays) if delays else 0.0,
+        "false": false,
+        "missed": missed,
+        "split": split,
+    }
+
+
+# Settings tried by tune(); the first entry is the old fixed collector
+TUNING_GRID = {
+    "pre_roll_ms": (0, 150, 300),
+    "hangover_factor": (1.5, 2.0),
+    "margin_db": (0.0, 6.0, 10.0),
+    "vad_mode": (2, 3),
+}
+LEGACY = dict(pre_roll_ms=0, hangover_ms=300, min_hangover_ms=300, max_hangover_ms=300, start_frames=1,
+              min_speech_ms=30, max_segment_ms=10 ** 9, margin_db=-100.0, vad_mode=3)
+
+
+def tune(sessions, grid=TUNING_GRID, frame_ms=30):
+    """Evaluate endpointing settings on recorded sessions and print them best first.
+
+    `sessions` is a list of WAV paths; a session with a label file next to it
+    (same name, .txt) is scored against its labels, otherwise only segment
+    counts and lengths are reported. Settings are ranked by missed and split
+    utterances, false segments, onset clipping and endpoint delay.
+    """
+    import os
+    recordings = []
+    for path in sessions:
+        pcm, rate = read_wav(path)
+        label_path = os.path.splitext(path)[0] + ".txt"
+        recordings.append((pcm, rate, read_labels(label_path) if os.path.exists(label_path) else None))
+
+    candidates = [("legacy", LEGACY)]
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        settings = dict(zip(names, values))
+        candidates.append((" ".join(f"{name}={value}" for name, value in settings.items()), settings))
+
+    rows = []
+    for label, settings in candidates:
+        totals = collections.Counter()
+        clip = delay = lengths = 0.0
+        labelled = 0
+        for pcm, rate, labels in recordings:
+            results = run_session(pcm, rate, frame_ms, **settings)
+            lengths += sum(r[3].duration_s for r in results if r[2] == SEGMENT)
+            totals["segments"] += sum(1 for r in results if r[2] == SEGMENT)
+            totals["dropped"] += sum(1 for r in results if r[2] == DROP)
+            totals["cuts"] += sum(1 for r in results if r[2] == SEGMENT and r[3].reason == MAX_LENGTH)
+            if labels is not None:
+                score = score_session(results, labels)
+                for key in ("false", "missed", "split"):
+                    totals[key] += score[key]
+                clip += score["onset_clip_ms"]
+                delay += score["endpoint_ms"]
+                labelled += 1
+        rank = (totals["missed"] + totals["split"], totals["false"], clip, delay)
+        rows.append((rank, label, totals, clip / max(labelled, 1), delay / max(labelled, 1),
+                     lengths / max(totals["segments"], 1)))
+
+    rows.sort(key=lambda row: row[0])
+    print(f"{'segments':>9}{'dropped':>8}{'cuts':>6}{'mean s':>8}{'missed':>7}{'split':>6}{'false':>6}"
+          f"{'clip ms':>8}{'end ms':>8}  settings")
+    for _, label, totals, clip, delay, mean_length in rows:
+        print(f"{totals['segments']:>9}{totals['dropped']:>8}{totals['cuts']:>6}{mean_length:>8.1f}"
+              f"{totals['missed']:>7}{totals['split']:>6}{totals['false']:>6}{clip:>8.0f}{delay:>8.0f}  {label}")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 3 and sys.argv[1] == "tune":
+        tune(sys.argv[2:])
+    else:
+        print("usage: endpointing.py tune <session.wav> [...]")
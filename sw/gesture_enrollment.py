@@ -0,0 +1,384 @@
+# gesture_enrollment.py
+
+import collections
+import os
+import time
+import numpy as np
+import metrics
+
+# Enrolled signs live next to this file; PLT_GESTURE_STORE overrides it
+STORE_PATH = os.environ.get(
+    "PLT_GESTURE_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "custom_gestures.npz"))
+
+MATCH_SECONDS = metrics.histogram("plt_gesture_match_seconds", "Custom sign lookup time per window")
+ENROLLED_SIGNS = metrics.gauge("plt_enrolled_signs", "Custom signs in the gesture index")
+
+# Keypoint layout of asl_engine.extract_keypoints
+POSE, LEFT_HAND, RIGHT_HAND = slice(0, 132), slice(132, 195), slice(195, 258)
+SHOULDERS = (11, 12)
+ELBOWS = (13, 14)
+
+# One lookup. accepted is False when the nearest sign is further than its threshold
+Match = collections.namedtuple("Match", "word distance threshold accepted candidates computed")
+
+
+def frame_features(keypoints):
+    """Per-frame features of (frames, 258) keypoints, independent of where the
+    signer stands and how far from the camera: x/y of each hand's landmarks
+    relative to its wrist, and of the wrists and elbows relative to the
+    shoulder centre, all in shoulder widths. Missing hands are zeros."""
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    pose = keypoints[:, POSE].reshape(-1, 33, 4)[:, :, :2]
+    centre = pose[:, SHOULDERS].mean(axis=1)
+    width = np.linalg.norm(pose[:, SHOULDERS[0]] - pose[:, SHOULDERS[1]], axis=1)
+    width = np.where(width > 1e-3, width, np.median(width) if np.any(width > 1e-3) else 1.0)[:, None]
+    parts = [(pose[:, ELBOWS] - centre[:, None]).reshape(len(keypoints), -1) / width]
+    for hand in (LEFT_HAND, RIGHT_HAND):
+        points = keypoints[:, hand].reshape(-1, 21, 3)[:, :, :2]
+        present = np.any(points != 0, axis=(1, 2))[:, None]
+        wrist = points[:, 0]
+        parts.append(np.where(present, (wrist - centre) / width, 0.0))
+        parts.append(np.where(present, (points[:, 1:] - wrist[:, None]).reshape(len(keypoints), -1) / width, 0.0))
+    return np.concatenate(parts, axis=1).astype(np.float32)
+
+
+def hand_coverage(keypoints):
+    """Fraction of frames with at least one hand detected."""
+    keypoints = np.asarray(keypoints)
+    hands = np.concatenate((keypoints[:, LEFT_HAND], keypoints[:, RIGHT_HAND]), axis=1)
+    return float(np.mean(np.any(hands != 0, axis=1))) if len(keypoints) else 0.0
+
+
+def resample(features, length):
+    """Linear interpolation of a (frames, dims) sequence to `length` frames."""
+    positions = np.linspace(0, len(features) - 1, length)
+    low = np.floor(positions).astype(int)
+    high = np.minimum(low + 1, len(features) - 1)
+    weight = (positions - low)[:, None].astype(np.float32)
+    return features[low] * (1 - weight) + features[high] * weight
+
+
+def envelopes(templates, window):
+    """Upper and lower LB_Keogh envelopes of (count, length, dims) templates:
+    the running max/min over +-window frames."""
+    upper, lower = templates.copy(), templates.copy()
+    for shift in range(1, window + 1):
+        upper[:, shift:] = np.maximum(upper[:, shift:], templates[:, :-shift])
+        upper[:, :-shift] = np.maximum(upper[:, :-shift], templates[:, shift:])
+        lower[:, shift:] = np.minimum(lower[:, shift:], templates[:, :-shift])
+        lower[:, :-shift] = np.minimum(lower[:, :-shift], templates[:, shift:])
+    return upper, lower
+
+
+def lb_keogh(query, upper, lower):
+    """LB_Keogh of one (length, dims) query against all envelopes at once.
+    Every query frame is matched to some template frame within the window,
+    so its squared distance to the envelope never exceeds the DTW cost."""
+    excess = query - np.clip(query, lower, upper)
+    return np.einsum("nld,nld->n", excess, excess)
+
+
+def dtw(query, templates, window, cutoff=np.inf, norms=None):
+    """Banded DTW (squared Euclidean frame cost) of one query against a batch
+    of templates, vectorized over the batch (the batch is the last axis, so
+    every step works on contiguous rows). Templates whose best partial path
+    already exceeds `cutoff` are abandoned (inf). `norms` are the templates'
+    squared frame norms, if precomputed."""
+    count, length, _ = templates.shape
+    if norms is None:
+        norms = np.einsum("nld,nld->nl", templates, templates)
+    # Frame costs from |q|^2 + |t|^2 - 2 q.t, one matrix product for the whole batch
+    cross = np.matmul(templates, query.T).transpose(2, 1, 0)
+    cost = np.einsum("ld,ld->l", query, query)[:, None, None] + norms.T[None, :, :] - 2 * cross
+    np.maximum(cost, 0, out=cost)
+    total = np.full((length + 1, length + 1, count), np.inf, dtype=np.float32)
+    total[0, 0] = 0
+    alive = np.ones(count, dtype=bool)
+    for i in range(1, length + 1):
+        for j in range(max(1, i - window), min(length, i + window) + 1):
+            best = np.minimum(np.minimum(total[i - 1, j], total[i, j - 1]), total[i - 1, j - 1])
+            np.add(cost[i - 1, j - 1], best, out=total[i, j])
+        alive &= total[i].min(axis=0) <= cutoff
+        if not alive.any():
+            break
+    return np.where(alive, total[length, length], np.inf)
+
+
+class SequenceIndex:
+    """Nearest-neighbour index of enrolled sign examples.
+
+    Keypoint windows are turned into frame_features, resampled to `length`
+    frames and compared with banded DTW (+-`window` frames). A lookup first
+    computes LB_Keogh against every example in one vectorized pass, on the
+    features projected onto their `projection` principal axes (a projection
+    only shrinks distances, so this is still a lower bound, at a fraction of
+    the cost). Candidates are then taken in order of their bound, `batch` at
+    a time: the full LB_Keogh drops more of them and the rest get exact DTW.
+    The search stops as soon as the next bound is above the best distance
+    found, so most examples never reach DTW. Distances are per frame.
+
+    Each sign has a threshold from its examples: `margin` times the largest
+    distance of an example to its nearest sibling, and at most half the
+    distance to the nearest example of another sign. Signs with a single
+    example use `default_threshold`.
+    """
+
+    def __init__(self, length=16, window=3, batch=32, projection=12, margin=1.5, default_threshold=1.0):
+        self.length = length
+        self.window = window
+        self.batch = batch
+        self.projection = projection
+        self.margin = margin
+        self.default_threshold = default_threshold
+        self.labels = []
+        self.templates = np.zeros((0, length, 0), dtype=np.float32)
+        self.upper = self.lower = self.templates
+        self.norms = np.zeros((0, length), dtype=np.float32)
+        self.basis = None
+        self.projected_upper = self.projected_lower = self.templates
+        self.thresholds = {}
+
+    @property
+    def words(self):
+        return sorted(set(self.labels))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def features(self, keypoints):
+        return resample(frame_features(keypoints), self.length)
+
+    def add(self, word, sequences):
+        """Enroll (frames, 258) keypoint sequences as examples of `word`."""
+        examples = np.stack([self.features(sequence) for sequence in sequences])
+        if len(self.labels):
+            examples = np.concatenate((self.templates, examples))
+        self.labels = self.labels + [word] * (len(examples) - len(self.labels))
+        self._set_templates(examples)
+        self._update_threshold(word)
+
+    def remove(self, word):
+        """Drop a sign. The other signs keep their thresholds, which may be a
+        little tighter than needed until they are enrolled again."""
+        keep = [index for index, label in enumerate(self.labels) if label != word]
+        self.labels = [self.labels[index] for index in keep]
+        self.thresholds.pop(word, None)
+        self._set_templates(self.templates[keep])
+
+    def _set_templates(self, templates):
+        self.templates = np.ascontiguousarray(templates, dtype=np.float32)
+        self.upper, self.lower = envelopes(self.templates, self.window)
+        self.norms = np.einsum("nld,nld->nl", self.templates, self.templates)
+        # Principal axes of all enrolled frames
+        frames = self.templates.reshape(-1, self.templates.shape[2])
+        if len(frames):
+            centred = frames - frames.mean(axis=0)
+            _, vectors = np.linalg.eigh(centred.T @ centred)
+            self.basis = np.ascontiguousarray(vectors[:, ::-1][:, :self.projection])
+            self.projected_upper, self.projected_lower = envelopes(self.templates @ self.basis, self.window)
+        ENROLLED_SIGNS.set(len(set(self.labels)))
+
+    def _update_threshold(self, word):
+        """Threshold of a newly enrolled sign; the other signs' thresholds are
+        capped by their distance to it. One DTW pass per new example."""
+        labels = np.array(self.labels)
+        own = np.flatnonzero(labels == word)
+        nearest_own = []
+        to_new = np.full(len(labels), np.inf, dtype=np.float32)
+        for index in own:
+            distances = dtw(self.templates[index], self.templates, self.window, norms=self.norms) / self.length
+            siblings = distances[own[own != index]]
+            if len(siblings):
+                nearest_own.append(siblings.min())
+            to_new = np.minimum(to_new, distances)
+        threshold = self.margin * max(nearest_own) if nearest_own else self.default_threshold
+        for other in self.thresholds:
+            if other != word:
+                nearest = float(to_new[labels == other].min())
+                self.thresholds[other] = min(self.thresholds[other], 0.5 * nearest)
+                threshold = min(threshold, 0.5 * nearest)
+        self.thresholds[word] = float(threshold)
+
+    def search(self, query):
+        """Nearest example of a (length, dims) feature query. Returns (index,
+        distance per frame, examples that reached DTW)."""
+        bounds = lb_keogh(query @ self.basis, self.projected_upper, self.projected_lower)
+        order = np.argsort(bounds)
+        best, best_index, computed = np.inf, -1, 0
+        for start in range(0, len(order), self.batch):
+            candidates = order[start:start + self.batch]
+            if bounds[candidates[0]] >= best:
+                break
+            candidates = candidates[bounds[candidates] < best]
+            candidates = candidates[lb_keogh(query, self.upper[candidates], self.lower[candidates]) < best]
+            if not len(candidates):
+                continue
+            distances = dtw(query, self.templates[candidates], self.window, cutoff=best, norms=self.norms[candidates])
+            computed += len(candidates)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] < best:
+                best, best_index = float(distances[nearest]), int(candidates[nearest])
+        return best_index, best / self.length, computed
+
+    def match(self, keypoints):
+        """Look up a (frames, 258) keypoint window. Returns a Match, or None
+        when nothing is enrolled."""
+        if not self.labels:
+            return None
+        with MATCH_SECONDS.time():
+            index, distance, computed = self.search(self.features(keypoints))
+        word = self.labels[index]
+        threshold = self.thresholds[word]
+        return Match(word, distance, threshold, distance <= threshold, len(self.labels), computed)
+
+    def save(self, path=STORE_PATH):
+        tmp_path = path + ".tmp.npz"
+        words = sorted(self.thresholds)
+        np.savez_compressed(tmp_path, labels=np.array(self.labels), templates=self.templates,
+                            words=np.array(words), thresholds=np.array([self.thresholds[w] for w in words]),
+                            length=self.length, window=self.window)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=STORE_PATH, **settings):
+        """The saved index, or an empty one when there is none yet."""
+        index = cls(**settings)
+        if not os.path.exists(path):
+            return index
+        try:
+            with np.load(path) as data:
+                if int(data["length"]) != index.length or int(data["window"]) != index.window:
+                    print(f"Enrolled signs in {path} use other settings; re-enroll them")
+                    return index
+                index.labels = [str(label) for label in data["labels"]]
+                index.thresholds = {str(word): float(value)
+                                    for word, value in zip(data["words"], data["thresholds"])}
+                index._set_templates(data["templates"])
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Could not load enrolled signs from {path}: {e}")
+            return cls(**settings)
+        print(f"Loaded {len(index.words)} custom signs ({len(index)} examples)")
+        return index
+
+
+class GestureEnrollment:
+    """Records `examples` keypoint windows of a new sign from the ASL loop.
+
+    Each example starts with a `countdown_s` prompt, then the next
+    `sequence_length` frames are recorded. Examples in which no hand is seen
+    in at least `min_hand_coverage` of the frames are recorded again. When
+    all are in, the sign is added to the index and the index saved.
+    """
+
+    def __init__(self, index, word, examples=5, sequence_length=30, countdown_s=2.0, min_hand_coverage=0.6,
+                 path=STORE_PATH):
+        self.index = index
+        self.word = word
+        self.examples = examples
+        self.sequence_length = sequence_length
+        self.countdown_s = countdown_s
+        self.min_hand_coverage = min_hand_coverage
+        self.path = path
+        self.recorded = []
+        self.frames = []
+        self.countdown_until = None
+        self.finished = False
+        self.status = f"Enrolling '{word}'"
+
+    def feed(self, keypoints, now=None):
+        """Feed one frame's keypoints. Returns the prompt to show."""
+        now = time.monotonic() if now is None else now
+        if self.finished:
+            return self.status
+        if self.countdown_until is None:
+            self.countdown_until = now + self.countdown_s
+        if now < self.countdown_until:
+            self.status = (f"Sign '{self.word}' ({len(self.recorded) + 1}/{self.examples}) "
+                           f"in {self.countdown_until - now:.0f} s")
+            return self.status
+        self.frames.append(keypoints)
+        self.status = f"Recording '{self.word}' ({len(self.recorded) + 1}/{self.examples})"
+        if len(self.frames) < self.sequence_length:
+            return self.status
+        example = np.array(self.frames)
+        self.frames = []
+        self.countdown_until = None
+        if hand_coverage(example) < self.min_hand_coverage:
+            print(f"Enrollment of '{self.word}': no hands seen, recording the example again")
+            return self.status
+        self.recorded.append(example)
+        if len(self.recorded) == self.examples:
+            self.index.remove(self.word)  # Re-enrolling a sign replaces its examples
+            self.index.add(self.word, self.recorded)
+            self.index.save(self.path)
+            self.finished = True
+            self.status = f"Enrolled '{self.word}' (threshold {self.index.thresholds[self.word]:.2f})"
+            print(self.status)
+        return self.status
+
+
+def _synthetic_signs(count, examples, frames=30, rng=None):
+    """Keypoint sequences of `count` made-up signs: smooth random hand paths
+    and shapes, with tempo changes and noise between examples."""
+    rng = rng if rng is not None else np.random.default_rng(0)
+    signs = []
+    for _ in range(count):
+        base = np.zeros((frames, 258), dtype=np.float32)
+        pose = base[:, POSE].reshape(frames, 33, 4)
+        pose[:, 11, :2], pose[:, 12, :2] = (0.6, 0.5), (0.4, 0.5)
+        pose[:, 13, :2], pose[:, 14, :2] = (0.65, 0.7), (0.35, 0.7)
+        path = np.cumsum(rng.normal(0, 0.01, (frames, 2, 2)), axis=0) + (0.5, 0.6)
+        shape = rng.normal(0, 0.04, (2, 21, 2)) + np.cumsum(rng.normal(0, 0.004, (frames, 2, 21, 2)), axis=0)
+        for hand, part in enumerate((LEFT_HAND, RIGHT_HAND)):
+            points = np.zeros((frames, 21, 3), dtype=np.float32)
+            points[:, :, :2] = path[:, hand, None] + shape[:, hand]
+            points[:, 0, :2] = path[:, hand]
+            base[:, part] = points.reshape(frames, -1)
+        base[:, POSE] = pose.reshape(frames, -1)
+        variants = []
+        for _ in range(examples):
+            warp = np.clip(np.cumsum(rng.uniform(0.7, 1.3, frames)), 0, None)
+            warp = (warp - warp[0]) / (warp[-1] - warp[0]) * (frames - 1)
+            low = np.floor(warp).astype(int)
+            high = np.minimum(low + 1, frames - 1)
+            weight = (warp - low)[:, None]
+            variant = base[low] * (1 - weight) + base[high] * weight
+            variant[:, 132:] += rng.normal(0, 0.003, (frames, 126)) * (variant[:, 132:] != 0)
+            variants.append(variant.astype(np.float32))
+        signs.append(variants)
+    return signs
+
+
+def benchmark(sizes=(10, 50, 100, 200, 500), examples=5, queries=50, unknown=20):
+    """Lookup latency and accuracy against index size on synthetic signs,
+    with LB_Keogh pruning and with exact DTW against every example. Queries
+    of signs that were never enrolled should be rejected."""
+    rng = np.random.default_rng(1)
+    print(f"{'signs':>6}{'examples':>10}{'mean ms':>9}{'p95 ms':>8}{'DTW %':>7}{'brute ms':>10}{'same':>6}"
+          f"{'accepted':>10}{'unknown rejected':>18}")
+    for size in sizes:
+        signs = _synthetic_signs(size + unknown, examples + 1, rng=rng)
+        index = SequenceIndex()
+        for number, variants in enumerate(signs[:size]):
+            index.add(f"sign{number}", variants[:examples])
+        times, brute_times, computed, accepted, same = [], [], 0, 0, 0
+        for pick in rng.integers(0, size, queries):
+            query = index.features(signs[pick][examples])
+            started = time.perf_counter()
+            found, distance, checked = index.search(query)
+            times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            brute = int(np.argmin(dtw(query, index.templates, index.window, norms=index.norms)))
+            brute_times.append(time.perf_counter() - started)
+            computed += checked
+            same += found == brute
+            accepted += index.labels[found] == f"sign{pick}" and distance <= index.thresholds[index.labels[found]]
+        rejected = sum(not index.match(variants[0]).accepted for variants in signs[size:])
+        times.sort()
+        print(f"{size:>6}{len(index):>10}{np.mean(times) * 1000:>9.2f}{times[int(0.95 * len(times))] * 1000:>8.2f}"
+              f"{computed / (queries * len(index)) * 100:>7.1f}{np.mean(brute_times) * 1000:>10.2f}"
+              f"{same / queries:>6.0%}{accepted / queries:>10.0%}{rejected / unknown:>18.0%}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,184 @@
+# governor.py
+
+import collections
+import json
+import os
+import threading
+import time
+
+# Workload levels from full performance (0) to most conservative. Each level
+# sets the camera frame rate, the MediaPipe model complexity, how many frames
+# pass between LSTM inferences and the minimum UI repaint interval.
+DEFAULT_LEVELS = [
+    {"camera_fps": 30, "model_complexity": 1, "inference_stride": 1, "ui_refresh_ms": 30},
+    {"camera_fps": 20, "model_complexity": 1, "inference_stride": 2, "ui_refresh_ms": 50},
+    {"camera_fps": 15, "model_complexity": 0, "inference_stride": 2, "ui_refresh_ms": 66},
+    {"camera_fps": 10, "model_complexity": 0, "inference_stride": 3, "ui_refresh_ms": 100},
+]
+
+# get_throttled bits that mean the SoC is being slowed down right now
+THROTTLE_NOW_MASK = 0x2 | 0x4 | 0x8  # freq capped, throttled, soft temp limit
+
+
+class SysfsReader:
+    """Reads temperature, throttling flags and load. All paths are relative to
+    `root`, so tests can point it at a fake sysfs tree."""
+
+    def __init__(self, root="/",
+                 temp_path="sys/class/thermal/thermal_zone0/temp",
+                 throttled_path="sys/devices/platform/soc/soc:firmware/get_throttled",
+                 loadavg_path="proc/loadavg"):
+        self.root = root
+        self.temp_path = temp_path
+        self.throttled_path = throttled_path
+        self.loadavg_path = loadavg_path
+
+    def _read(self, path):
+        try:
+            with open(os.path.join(self.root, path), "r") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def temperature(self):
+        """CPU temperature in degrees C, or None."""
+        value = self._read(self.temp_path)
+        return int(value) / 1000.0 if value else None
+
+    def throttled(self):
+        """Raw get_throttled flags (hex in sysfs), or 0 when unavailable."""
+        value = self._read(self.throttled_path)
+        if not value:
+            return 0
+        try:
+            return int(value, 16)
+        except ValueError:
+            return 0
+
+    def load(self):
+        """1-minute load average per CPU, or None."""
+        value = self._read(self.loadavg_path)
+        if not value:
+            return None
+        return float(value.split()[0]) / (os.cpu_count() or 1)
+
+
+class WorkloadGovernor:
+    """Moves between workload levels based on temperature, throttling and load.
+
+    Steps down one level as soon as the CPU is hot, throttled or overloaded, and
+    steps back up only after `up_samples` consecutive cool samples (temperature
+    below `cool_temp`), so it does not oscillate around the threshold. Every
+    decision is printed and kept in `decisions`, and optionally appended to a
+    JSON lines log.
+    """
+
+    def __init__(self, reader=None, levels=None, hot_temp=75.0, cool_temp=65.0,
+                 max_load=0.9, up_samples=3, interval=2.0, log_path=None):
+        self.reader = reader or SysfsReader(root=os.environ.get("PLT_SYSFS_ROOT", "/"))
+        self.levels = levels or DEFAULT_LEVELS
+        self.hot_temp = hot_temp
+        self.cool_temp = cool_temp
+        self.max_load = max_load
+        self.up_samples = up_samples
+        self.interval = interval
+        self.log_path = log_path
+
+        self.level = 0
+        self.limits = {}  # Caps from the performance profile, see set_limits()
+        self.cool_count = 0
+        self.decisions = collections.deque(maxlen=200)
+        self.listeners = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def settings(self):
+        settings = dict(self.levels[self.level])
+        # The profile caps every level: lower frame rate and model complexity,
+        # longer inference stride and repaint interval win
+        for key, limit in self.limits.items():
+            if key in ("camera_fps", "model_complexity"):
+                settings[key] = min(settings[key], limit)
+            elif key in ("inference_stride", "ui_refresh_ms"):
+                settings[key] = max(settings[key], limit)
+        return settings
+
+    def set_limits(self, limits):
+        """Cap the level settings (e.g. from the performance profile) and notify listeners."""
+        self.limits = {key: limits[key] for key in ("camera_fps", "model_complexity", "inference_stride",
+                                                    "ui_refresh_ms") if key in limits}
+        self._notify()
+
+    def _notify(self):
+        for callback in list(self.listeners):
+            try:
+                callback(self.settings)
+            except Exception as e:
+                print(f"Error applying governor settings: {e}")
+
+    def add_listener(self, callback):
+        """callback(settings) is called on every level change and once immediately."""
+        self.listeners.append(callback)
+        callback(self.settings)
+
+    def sample(self):
+        """Take one reading and adjust the level. Returns the decision record."""
+        temp = self.reader.temperature()
+        throttled = self.reader.throttled() & THROTTLE_NOW_MASK
+        load = self.reader.load()
+
+        over_temp = temp is not None and temp >= self.hot_temp
+        overloaded = load is not None and load >= self.max_load
+        hot = over_temp or bool(throttled) or overloaded
+        cool = not throttled and (temp is None or temp <= self.cool_temp) and \
+            (load is None or load < self.max_load * 0.7)
+
+        old_level = self.level
+        if hot:
+            self.cool_count = 0
+            self.level = min(self.level + 1, len(self.levels) - 1)
+            reason = "throttled" if throttled else ("hot" if over_temp else "load")
+        elif cool:
+            self.cool_count += 1
+            if self.cool_count >= self.up_samples:
+                self.cool_count = 0
+                self.level = max(self.level - 1, 0)
+            reason = "cool"
+        else:
+            self.cool_count = 0
+            reason = "hold"
+
+        decision = {
+            "time": time.time(), "temp": temp, "throttled": throttled, "load": load,
+            "reason": reason, "from_level": old_level, "level": self.level,
+        }
+        self.decisions.append(decision)
+        if self.level != old_level:
+            print(f"Governor: {reason} (temp={temp}, throttled={throttled:#x}, load={load}) "
+                  f"level {old_level} -> {self.level}: {self.settings}")
+            self._notify()
+        self._log(decision)
+        return decision
+
+    def _log(self, decision):
+        if not self.log_path:
+            return
+        try:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(decision) + "\n")
+        except OSError as e:
+            print(f"Error writing governor log: {e}")
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
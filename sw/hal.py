@@ -0,0 +1,316 @@
+# hal.py
+
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from mixer_service import MixerService
+
+# PLT_HAL=device (default) talks to the real GPIO buttons, camera, microphone,
+# speaker, ALSA mixer and NetworkManager. PLT_HAL=sim swaps in the simulated
+# devices below, so the whole app runs on a desktop or CI machine:
+#   PLT_SIM_VIDEO    video file(s) the camera plays in a loop, separated by
+#                    os.pathsep (e.g. asl_replay.py recordings); moving test
+#                    pattern when unset
+#   PLT_SIM_AUDIO    16-bit mono WAV file(s) the microphone plays in a loop;
+#                    low noise when unset
+#   PLT_SIM_BUTTONS  button presses as JSON or a JSON file, a list of
+#                    {"at": seconds, "pin": 4} and {"every": seconds, "pin": 4}
+# The cloud clients are replaced by local stand-ins (see translator_device.py).
+HAL = os.environ.get("PLT_HAL", "device")
+
+
+def simulated():
+    return HAL == "sim"
+
+
+def _paths(variable):
+    value = os.environ.get(variable, "")
+    return [path for path in value.split(os.pathsep) if path]
+
+
+# ==================== GPIO ====================
+
+class SimButton:
+    """gpiozero.Button stand-in; press() runs when_pressed like a real press."""
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.when_pressed = None
+        self.presses = 0
+
+    def press(self):
+        self.presses += 1
+        if self.when_pressed is not None:
+            self.when_pressed()
+
+    def close(self):
+        self.when_pressed = None
+
+
+SIM_BUTTONS = {}  # pin -> SimButton
+
+
+def button(pin, timed_import=None):
+    """A pull-up push button on a GPIO pin (gpiozero.Button on the device).
+    timed_import(module, name) is StartupProfile.timed_import, if any."""
+    if simulated():
+        SIM_BUTTONS[pin] = SimButton(pin)
+        return SIM_BUTTONS[pin]
+    if timed_import is not None:
+        gpiozero = timed_import("gpiozero", "gpiozero")
+    else:
+        import gpiozero
+    return gpiozero.Button(pin, pull_up=True, bounce_time=0.2)
+
+
+class ButtonScript:
+    """Presses simulated buttons on a schedule from PLT_SIM_BUTTONS."""
+
+    def __init__(self, script):
+        self.events = []
+        for entry in script:
+            if "every" in entry:
+                self.events.append((float(entry.get("at", entry["every"])), float(entry["every"]), entry["pin"]))
+            else:
+                self.events.append((float(entry["at"]), None, entry["pin"]))
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sim_buttons", daemon=True)
+
+    @classmethod
+    def from_environment(cls):
+        value = os.environ.get("PLT_SIM_BUTTONS", "").strip()
+        if not value:
+            return None
+        if not value.startswith("["):
+            with open(value, encoding="utf-8") as f:
+                value = f.read()
+        return cls(json.loads(value))
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        start = time.monotonic()
+        pending = sorted(self.events)
+        while pending and not self.stop_event.is_set():
+            at, every, pin = pending[0]
+            if self.stop_event.wait(max(0.0, start + at - time.monotonic())):
+                return
+            pending.pop(0)
+            if pin in SIM_BUTTONS:
+                print(f"Simulated press of the button on pin {pin}")
+                SIM_BUTTONS[pin].press()
+            if every is not None:
+                pending.append((at + every, every, pin))
+                pending.sort()
+
+
+def start_button_script():
+    """Start the PLT_SIM_BUTTONS script (simulation only). Returns it or None."""
+    if not simulated():
+        return None
+    script = ButtonScript.from_environment()
+    if script is not None:
+        script.start()
+    return script
+
+
+# ==================== CAMERA ====================
+
+class SimCamera:
+    """cv2.VideoCapture stand-in that plays videos in a loop at the frame rate
+    set with CAP_PROP_FPS, blocking in read() like a real camera."""
+
+    def __init__(self, paths=None):
+        import cv2
+        self.cv2 = cv2
+        self.paths = paths if paths is not None else _paths("PLT_SIM_VIDEO")
+        self.props = {cv2.CAP_PROP_FRAME_WIDTH: 640, cv2.CAP_PROP_FRAME_HEIGHT: 400, cv2.CAP_PROP_FPS: 30}
+        self.video = None
+        self.video_index = 0
+        self.next_frame = time.monotonic()
+        self.count = 0
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        self.props[prop] = value
+        return True
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+    def _frame(self):
+        cv2 = self.cv2
+        width = int(self.props[cv2.CAP_PROP_FRAME_WIDTH])
+        height = int(self.props[cv2.CAP_PROP_FRAME_HEIGHT])
+        if not self.paths:
+            # Test pattern: a bright square moving across a grey frame
+            frame = np.full((height, width, 3), 96, dtype=np.uint8)
+            x = (self.count * 8) % max(width - 40, 1)
+            frame[height // 2 - 20:height // 2 + 20, x:x + 40] = 255
+            return frame
+        for _ in range(len(self.paths) + 1):
+            if self.video is None:
+                self.video = cv2.VideoCapture(self.paths[self.video_index % len(self.paths)])
+                self.video_index += 1
+            ret, frame = self.video.read()
+            if ret:
+                if (frame.shape[1], frame.shape[0]) != (width, height):
+                    frame = cv2.resize(frame, (width, height))
+                return frame
+            self.video.release()
+            self.video = None
+        return None
+
+    def grab(self):
+        return self.read()[0]
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        fps = max(float(self.props[self.cv2.CAP_PROP_FPS]), 1.0)
+        now = time.monotonic()
+        if self.next_frame > now:
+            time.sleep(self.next_frame - now)
+        self.next_frame = max(self.next_frame, now) + 1.0 / fps
+        frame = self._frame()
+        self.count += 1
+        return frame is not None, frame
+
+    def release(self):
+        self.opened = False
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+
+
+def video_capture(index=0):
+    """The USB camera (cv2.VideoCapture on the device)."""
+    if simulated():
+        return SimCamera()
+    import cv2
+    return cv2.VideoCapture(index)
+
+
+# ==================== MICROPHONE ====================
+
+class SimInputStream:
+    """sounddevice.InputStream stand-in that plays WAV files in a loop at
+    `samplerate`, blocking in read() like a real microphone."""
+
+    def __init__(self, samplerate=16000, channels=1, paths=None):
+        from endpointing import read_wav
+        self.samplerate = samplerate
+        self.channels = channels
+        clips = []
+        for path in (paths if paths is not None else _paths("PLT_SIM_AUDIO")):
+            pcm, rate = read_wav(path)
+            samples = np.frombuffer(pcm, dtype=np.int16)
+            if rate != samplerate:
+                from resampler import PolyphaseResampler
+                samples = PolyphaseResampler(rate, samplerate).process_int16(samples)
+            clips.append(samples)
+        if clips:
+            self.audio = np.concatenate(clips)
+        else:
+            self.audio = np.random.default_rng(0).normal(0, 30, samplerate * 10).astype(np.int16)
+        self.position = 0
+        self.started = None
+        self.delivered = 0
+        self.active = False
+
+    def start(self):
+        self.active = True
+        self.started = time.monotonic()
+        self.delivered = 0
+
+    def stop(self):
+        self.active = False
+
+    abort = stop
+
+    def close(self):
+        self.active = False
+
+    def read(self, frames):
+        if self.started is None:
+            self.start()
+        self.delivered += frames
+        wait = self.started + self.delivered / self.samplerate - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        indices = (self.position + np.arange(frames)) % len(self.audio)
+        self.position = (self.position + frames) % len(self.audio)
+        return self.audio[indices].reshape(-1, 1), False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        self.close()
+
+
+def input_stream(samplerate=16000, channels=1):
+    """The microphone as 16-bit frames at `samplerate` (see resampler.py on the device)."""
+    if simulated():
+        return SimInputStream(samplerate, channels)
+    import resampler
+    return resampler.open_input_stream(samplerate, channels)
+
+
+# ==================== SPEAKER ====================
+
+def player():
+    """Audio output for the StreamingSpeaker. The simulated speaker discards
+    the audio but takes as long as playing it would."""
+    from tts_streaming import NullPlayer, SoundDevicePlayer
+    return NullPlayer() if simulated() else SoundDevicePlayer()
+
+
+# ==================== MIXER ====================
+
+class SimMixerService(MixerService):
+    """MixerService with an in-memory volume instead of amixer processes;
+    coalescing and listeners work as on the device."""
+
+    def __init__(self, volume=50, **kwargs):
+        super().__init__(**kwargs)
+        self.initial_volume = volume
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        thread = threading.Thread(target=self._write_loop, name="sim_mixer", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        self._update(self.initial_volume)
+
+    def _send(self, command):
+        match = re.match(rf"sset {re.escape(self.control)} (\d+)%", command)
+        if match:
+            self._update(int(match.group(1)))
+
+
+def mixer():
+    """The speaker volume service (amixer on the device)."""
+    return SimMixerService() if simulated() else MixerService()
+
+
+# ==================== NETWORK ====================
+
+def wifi_manager(parent=None):
+    """Wi-Fi scanning and connection (nmcli on the device)."""
+    from wifi_manager import WifiManager, SimWifiManager
+    return SimWifiManager(parent) if simulated() else WifiManager(parent)
@@ -0,0 +1,238 @@
+# local_recognition.py
+
+import collections
+import json
+import os
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+import metrics
+from startup import peak_rss_mb
+
+# One Vosk model directory per language, named by its two-letter code, e.g.
+# vosk/en (vosk-model-small-en-us), vosk/es (vosk-model-small-es), vosk/ko (vosk-model-small-ko)
+VOSK_MODEL_ROOT = os.environ.get(
+    "PLT_VOSK_MODELS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vosk"))
+
+# RecognitionPolicy modes
+CLOUD = "cloud"  # Cloud only
+LOCAL = "local"  # On-device only, no network needed
+AUTO = "auto"  # Cloud while it meets the latency budget, on-device otherwise
+RACE = "race"  # Both at once, first non-empty transcript wins
+MODES = (CLOUD, LOCAL, AUTO, RACE)
+
+# A recognized transcript. language is the detected language when the engine
+# reports one (the on-device engine does, the cloud path leaves it to
+# translation's language detection), engine is "cloud" or "local".
+Recognition = collections.namedtuple("Recognition", "text language engine")
+
+RECOGNITIONS = {engine: metrics.counter("plt_recognitions_total", "Recognitions by engine", labels={"engine": engine})
+                for engine in ("cloud", "local")}
+LOCAL_SECONDS = metrics.histogram("plt_local_recognize_seconds", "On-device recognition latency")
+CLOUD_DEGRADED = metrics.gauge("plt_cloud_recognition_degraded", "1 while the cloud recognizer is over its latency budget")
+
+
+class VoskRecognizer:
+    """On-device recognizer using small Vosk (Kaldi) models on the CPU.
+
+    Models are loaded the first time their language is used. When more than one
+    candidate language is given, every available model transcribes the segment
+    and the result with the highest mean word confidence wins.
+    """
+
+    def __init__(self, root=VOSK_MODEL_ROOT):
+        self.root = root
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def _model(self, language):
+        language = language[:2].lower()
+        with self.lock:
+            if language not in self.models:
+                path = os.path.join(self.root, language)
+                model = None
+                if os.path.isdir(path):
+                    try:
+                        import vosk
+                        vosk.SetLogLevel(-1)
+                        start = time.perf_counter()
+                        model = vosk.Model(path)
+                        print(f"Loaded on-device speech model {language} in {time.perf_counter() - start:.1f} s "
+                              f"(peak RSS {peak_rss_mb():.0f} MB)")
+                    except Exception as e:
+                        print(f"Could not load on-device speech model {language}: {e}")
+                self.models[language] = model
+            return self.models[language]
+
+    def available(self, language):
+        """True if a model is installed for `language` (without loading it)."""
+        return os.path.isdir(os.path.join(self.root, language[:2].lower()))
+
+    def _transcribe(self, model, pcm, sample_rate):
+        import vosk
+        recognizer = vosk.KaldiRecognizer(model, sample_rate)
+        recognizer.SetWords(True)
+        recognizer.AcceptWaveform(bytes(pcm))
+        result = json.loads(recognizer.FinalResult())
+        words = result.get("result", [])
+        confidence = sum(word["conf"] for word in words) / len(words) if words else 0.0
+        return result.get("text", "").strip(), confidence
+
+    def recognize_language(self, pcm, sample_rate, languages):
+        """Transcribe LINEAR16 audio. Returns (transcript, language); the
+        transcript is "" if nothing was recognized."""
+        best = ("", languages[0], -1.0)
+        with LOCAL_SECONDS.time():
+            for language in languages:
+                model = self._model(language)
+                if model is None:
+                    continue
+                text, confidence = self._transcribe(model, pcm, sample_rate)
+                if text and confidence > best[2]:
+                    best = (text, language, confidence)
+        return best[0], best[1]
+
+    def recognize(self, audio_bytes, sample_rate, language_code, alternative_language_codes=(), encoding="LINEAR16"):
+        """Same interface as CloudRecognizer.recognize (LINEAR16 only)."""
+        if encoding != "LINEAR16":
+            raise ValueError("The on-device recognizer needs LINEAR16 audio")
+        return self.recognize_language(audio_bytes, sample_rate, [language_code] + list(alternative_language_codes))[0]
+
+
+class RecognitionPolicy:
+    """Chooses the cloud or the on-device recognizer for every segment.
+
+    In auto mode the cloud is used while it answers within `budget` seconds.
+    When it is slower (or fails) the segment is transcribed on the device
+    instead and the cloud is skipped for `cooldown` seconds, after which it
+    is tried again. Race mode sends every segment to both.
+
+    Streaming (used for speculative translation) always goes to the cloud.
+    """
+
+    def __init__(self, cloud, local=None, mode=AUTO, budget=1.5, cooldown=30.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown recognition mode {mode!r}, expected one of {MODES}")
+        self.cloud = cloud
+        self.local = local or VoskRecognizer()
+        self.mode = mode
+        self.budget = budget
+        self.cooldown = cooldown
+        self.degraded_until = 0.0
+        self.executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="recognize")
+
+    def stream(self, *args, **kwargs):
+        return self.cloud.stream(*args, **kwargs)
+
+    def _cloud(self, upload, sample_rate, language_code, alternatives, encoding):
+        text = self.cloud.recognize(upload, sample_rate, language_code, alternatives, encoding=encoding)
+        RECOGNITIONS["cloud"].inc()
+        return Recognition(text, None, "cloud")
+
+    def _local(self, pcm, sample_rate, language_code, alternatives):
+        text, language = self.local.recognize_language(pcm, sample_rate, [language_code] + list(alternatives))
+        RECOGNITIONS["local"].inc()
+        return Recognition(text, language, "local")
+
+    def _set_degraded(self, degraded):
+        self.degraded_until = time.monotonic() + self.cooldown if degraded else 0.0
+        CLOUD_DEGRADED.set(1 if degraded else 0)
+
+    def recognize(self, pcm, sample_rate, language_code, alternative_language_codes=(), upload=None,
+                  encoding="LINEAR16"):
+        """Transcribe a segment. `pcm` is the LINEAR16 audio for the on-device
+        engine; `upload` is what the cloud receives (e.g. FLAC, see audio_codec.py)
+        and defaults to the PCM. Returns a Recognition."""
+        alternatives = list(alternative_language_codes)
+        if upload is None:
+            upload, encoding = pcm, "LINEAR16"
+        local_ok = self.local.available(language_code)
+
+        if self.mode == CLOUD or (self.mode != LOCAL and not local_ok):
+            return self._cloud(upload, sample_rate, language_code, alternatives, encoding)
+        if self.mode == LOCAL or time.monotonic() < self.degraded_until:
+            return self._local(pcm, sample_rate, language_code, alternatives)
+
+        cloud = self.executor.submit(self._cloud, upload, sample_rate, language_code, alternatives, encoding)
+        if self.mode == RACE:
+            local = self.executor.submit(self._local, pcm, sample_rate, language_code, alternatives)
+            pending = {cloud, local}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None and future.result().text:
+                        return future.result()
+            return local.result() if local.exception() is None else cloud.result()
+
+        try:
+            result = cloud.result(timeout=self.budget)
+            self._set_degraded(False)
+            return result
+        except FutureTimeout:
+            print(f"Cloud recognition over the {self.budget:.1f} s budget; using the on-device recognizer "
+                  f"for the next {self.cooldown:.0f} s.")
+        except Exception as e:
+            print(f"Cloud recognition failed ({e}); using the on-device recognizer for the next {self.cooldown:.0f} s.")
+        self._set_degraded(True)
+        result = self._local(pcm, sample_rate, language_code, alternatives)
+        if not result.text and cloud.done() and cloud.exception() is None:
+            return cloud.result()  # The cloud caught up while the device was transcribing
+        return result
+
+
+def word_error_rate(hypothesis, reference):
+    """Word-level edit distance divided by the reference length."""
+    hyp = hypothesis.lower().split()
+    ref = reference.lower().split()
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref) if ref else float(len(hyp) > 0)
+
+
+def evaluate(test_path, root=VOSK_MODEL_ROOT):
+    """Report word error rate and real-time factor per language.
+
+    The test set is a TSV of WAV path (16-bit mono), language code and reference
+    transcript. Paths are relative to the test file. Runs without a network.
+    """
+    recognizer = VoskRecognizer(root)
+    base = os.path.dirname(os.path.abspath(test_path))
+    results = collections.defaultdict(lambda: {"errors": 0.0, "words": 0, "audio": 0.0, "cpu": 0.0, "count": 0})
+    with open(test_path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or line.count("\t") < 2:
+                continue
+            path, language, reference = line.rstrip("\n").split("\t")[:3]
+            recognizer._model(language)  # Keep model loading out of the timing
+            with wave.open(os.path.join(base, path), "rb") as wav:
+                rate = wav.getframerate()
+                pcm = wav.readframes(wav.getnframes())
+                duration = wav.getnframes() / rate
+            start = time.perf_counter()
+            text, _ = recognizer.recognize_language(pcm, rate, [language])
+            elapsed = time.perf_counter() - start
+            stats = results[language]
+            words = max(len(reference.split()), 1)
+            stats["errors"] += word_error_rate(text, reference) * words
+            stats["words"] += words
+            stats["audio"] += duration
+            stats["cpu"] += elapsed
+            stats["count"] += 1
+    print(f"{'language':<10}{'files':>6}{'WER':>8}{'RTF':>8}")
+    for language, stats in sorted(results.items()):
+        print(f"{language:<10}{stats['count']:>6}{stats['errors'] / stats['words']:>8.1%}"
+              f"{stats['cpu'] / stats['audio']:>8.2f}")
+    print(f"peak RSS {peak_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 3 and sys.argv[1] == "eval":
+        evaluate(sys.argv[2])
+    else:
+        print("usage: local_recognition.py eval <test.tsv>")
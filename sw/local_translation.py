@@ -0,0 +1,304 @@
+# local_translation.py
+
+import mmap
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+import metrics
+from startup import peak_rss_mb
+
+# Where phrase tables and models live:
+#   <root>/<src>-<tgt>.tsv   sorted phrase table (see build_phrase_table)
+#   <root>/<src>-<tgt>/      CTranslate2 model with source.spm and target.spm,
+#                            plus an optional source_prefix.txt (e.g. ">>kor<<")
+LOCAL_TRANSLATION_ROOT = os.environ.get(
+    "PLT_LOCAL_TRANSLATION", os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation"))
+
+# How TranslatorDevice.translate_text uses the local engine
+CLOUD = "cloud"  # Cloud only
+PRIMARY = "primary"  # Local first, cloud when the pair or model is missing
+FALLBACK = "fallback"  # Cloud first, local on error or after the cloud timeout
+RACE = "race"  # Both at once, first result wins
+MODES = (CLOUD, PRIMARY, FALLBACK, RACE)
+
+TRANSLATIONS = {engine: metrics.counter("plt_translations_total", "Translations by engine", labels={"engine": engine})
+                for engine in ("phrase", "model", "cloud")}
+LOCAL_SECONDS = metrics.histogram("plt_local_translate_seconds", "Local translation latency")
+
+
+def normalize(text):
+    """Phrase table key: lower case, no punctuation, single spaces."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def build_phrase_table(pairs, path):
+    """Write (source, target) pairs as a phrase table: normalized source, tab,
+    target, sorted by source so it can be searched in place."""
+    rows = {}
+    for source, target in pairs:
+        key = normalize(source)
+        if key:
+            rows[key] = target.replace("\t", " ").replace("\n", " ").strip()
+    with open(path, "w", encoding="utf-8") as f:
+        for key in sorted(rows, key=lambda k: k.encode("utf-8")):
+            f.write(f"{key}\t{rows[key]}\n")
+    return len(rows)
+
+
+class PhraseTable:
+    """Translation memory kept in a memory-mapped, sorted TSV file.
+
+    Lookups are a binary search over the mapped bytes, so the table costs page
+    cache rather than Python heap however large it gets.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _line_at(self, position):
+        """Start and end of the line containing `position`."""
+        start = self.map.rfind(b"\n", 0, position) + 1
+        end = self.map.find(b"\n", position)
+        return start, len(self.map) if end < 0 else end
+
+    def lookup(self, text):
+        key = normalize(text).encode("utf-8")
+        if not key:
+            return None
+        low, high = 0, len(self.map)
+        while low < high:
+            middle = (low + high) // 2
+            start, end = self._line_at(middle)
+            line_key, _, target = self.map[start:end].partition(b"\t")
+            if line_key == key:
+                return target.decode("utf-8")
+            if line_key < key:
+                low = end + 1
+            else:
+                high = start
+        return None
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class NeuralModel:
+    """CTranslate2 translation model (e.g. a converted Opus-MT model) run on the
+    CPU with int8 weights."""
+
+    def __init__(self, path, threads=2):
+        import ctranslate2
+        import sentencepiece as spm
+        self.translator = ctranslate2.Translator(path, device="cpu", compute_type="int8",
+                                                 inter_threads=1, intra_threads=threads)
+        self.source_sp = spm.SentencePieceProcessor(model_file=os.path.join(path, "source.spm"))
+        self.target_sp = spm.SentencePieceProcessor(model_file=os.path.join(path, "target.spm"))
+        prefix_path = os.path.join(path, "source_prefix.txt")
+        self.prefix = open(prefix_path).read().split() if os.path.exists(prefix_path) else []
+
+    def translate(self, text):
+        tokens = self.prefix + self.source_sp.encode(text, out_type=str) + ["</s>"]
+        result = self.translator.translate_batch([tokens], beam_size=2, max_decoding_length=256)
+        return self.target_sp.decode(result[0].hypotheses[0])
+
+
+class LocalTranslator:
+    """Phrase table first, then the neural model, per language pair.
+
+    Nothing is loaded until a pair is first used. Languages are two-letter codes
+    (en, es, ko). translate() returns None when the pair has neither a phrase
+    match nor a model, so the caller can go to the cloud.
+    """
+
+    def __init__(self, root=LOCAL_TRANSLATION_ROOT, threads=2):
+        self.root = root
+        self.threads = threads
+        self.tables = {}
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def _load(self, source, target):
+        pair = f"{source}-{target}"
+        with self.lock:
+            if pair not in self.tables:
+                path = os.path.join(self.root, pair + ".tsv")
+                self.tables[pair] = PhraseTable(path) if os.path.exists(path) and os.path.getsize(path) else None
+            if pair not in self.models:
+                path = os.path.join(self.root, pair)
+                model = None
+                if os.path.isdir(path):
+                    try:
+                        start = time.perf_counter()
+                        model = NeuralModel(path, self.threads)
+                        print(f"Loaded local translation model {pair} in {time.perf_counter() - start:.1f} s "
+                              f"(peak RSS {peak_rss_mb():.0f} MB)")
+                    except Exception as e:
+                        print(f"Could not load local translation model {pair}: {e}")
+                self.models[pair] = model
+            return self.tables[pair], self.models[pair]
+
+    def has_pair(self, source, target):
+        table, model = self._load(source, target)
+        return table is not None or model is not None
+
+    def translate(self, text, source, target):
+        """Returns (translation, engine) with engine "phrase" or "model", or None."""
+        table, model = self._load(source[:2], target[:2])
+        with LOCAL_SECONDS.time():
+            if table is not None:
+                translation = table.lookup(text)
+                if translation is not None:
+                    return translation, "phrase"
+            if model is not None:
+                return model.translate(text), "model"
+        return None
+
+
+class TranslationRouter:
+    """Chooses between the cloud and the local engine according to `mode`.
+
+    cloud_translate(text, target) is the cloud call; cloud_timeout bounds how
+    long fallback mode waits for it before using the local result.
+    """
+
+    def __init__(self, cloud_translate, local=None, mode=CLOUD, cloud_timeout=1.5):
+        if mode not in MODES:
+            raise ValueError(f"Unknown translation mode {mode!r}, expected one of {MODES}")
+        self.cloud_translate = cloud_translate
+        self.local = local or LocalTranslator()
+        self.mode = mode
+        self.cloud_timeout = cloud_timeout
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="translate")
+
+    def _cloud(self, text, target):
+        translation = self.cloud_translate(text, target)
+        TRANSLATIONS["cloud"].inc()
+        return translation
+
+    def _local(self, text, source, target):
+        if source is None:
+            return None
+        result = self.local.translate(text, source, target)
+        if result is None:
+            return None
+        translation, engine = result
+        TRANSLATIONS[engine].inc()
+        return translation
+
+    def translate(self, text, target, source=None):
+        """Translate text into `target`; `source` is needed for the local engine."""
+        if self.mode == CLOUD or source is None:
+            return self._cloud(text, target)
+        if self.mode == PRIMARY:
+            try:
+                translation = self._local(text, source, target)
+            except Exception as e:
+                print(f"Local translation failed: {e}")
+                translation = None
+            return translation if translation is not None else self._cloud(text, target)
+        if self.mode == FALLBACK:
+            cloud = self.executor.submit(self._cloud, text, target)
+            try:
+                return cloud.result(timeout=self.cloud_timeout)
+            except Exception as e:
+                print(f"Cloud translation {'timed out' if isinstance(e, FutureTimeout) else f'failed: {e}'}; "
+                      f"using the local engine.")
+            translation = self._local(text, source, target)
+            return translation if translation is not None else cloud.result()
+        # Race: whichever finishes first with a result
+        futures = [self.executor.submit(self._local, text, source, target),
+                   self.executor.submit(self._cloud, text, target)]
+        errors = []
+        for future in as_completed(futures):
+            try:
+                translation = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if translation is not None:
+                return translation
+        raise errors[-1] if errors else RuntimeError("No translation engine produced a result")
+
+
+def chrf(hypothesis, reference, n=4):
+    """Character n-gram F-score (0..1) between two strings, ignoring case and spaces."""
+    hypothesis = normalize(hypothesis).replace(" ", "")
+    reference = normalize(reference).replace(" ", "")
+    scores = []
+    for order in range(1, n + 1):
+        hyp = [hypothesis[i:i + order] for i in range(len(hypothesis) - order + 1)]
+        ref = [reference[i:i + order] for i in range(len(reference) - order + 1)]
+        if not hyp or not ref:
+            continue
+        remaining = list(ref)
+        matches = 0
+        for gram in hyp:
+            if gram in remaining:
+                remaining.remove(gram)
+                matches += 1
+        precision, recall = matches / len(hyp), matches / len(ref)
+        scores.append(0.0 if matches == 0 else 2 * precision * recall / (precision + recall))
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+def evaluate(test_path, cloud_translate=None, root=LOCAL_TRANSLATION_ROOT):
+    """Report local latency, memory and agreement with the cloud on a test set.
+
+    The test set is a TSV of source language, target language, text and
+    optionally the expected (cloud) translation; without it the cloud is asked
+    through cloud_translate(text, target).
+    """
+    local = LocalTranslator(root)
+    rss_before = peak_rss_mb()
+    rows = []
+    with open(test_path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 3 and not line.startswith("#"):
+                rows.append(fields)
+    latencies, exact, scores, missing = [], 0, [], 0
+    for fields in rows:
+        source, target, text = fields[:3]
+        reference = fields[3] if len(fields) > 3 else cloud_translate(text, target)
+        start = time.perf_counter()
+        result = local.translate(text, source, target)
+        latencies.append(time.perf_counter() - start)
+        if result is None:
+            missing += 1
+            continue
+        translation, engine = result
+        exact += normalize(translation) == normalize(reference)
+        scores.append(chrf(translation, reference))
+    latencies.sort()
+    translated = len(rows) - missing
+    print(f"{len(rows)} phrases, {translated} translated locally, {missing} without a local engine")
+    if latencies:
+        print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    print(f"peak RSS {rss_before:.0f} MB before loading, {peak_rss_mb():.0f} MB after")
+    if translated:
+        print(f"agreement with cloud: {exact / translated:.0%} exact, mean chrF {sum(scores) / translated:.2f}")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        # build <pairs.tsv> <table.tsv>: turn "source<TAB>target" lines into a phrase table
+        with open(sys.argv[2], encoding="utf-8") as f:
+            pairs = [line.rstrip("\n").split("\t")[:2] for line in f if "\t" in line]
+        print(f"Wrote {build_phrase_table(pairs, sys.argv[3])} phrases to {sys.argv[3]}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "eval":
+        cloud = None
+        if len(sys.argv) > 3 and sys.argv[3] == "--cloud":
+            import html
+            from google.cloud import translate_v2 as translate
+            client = translate.Client()
+            cloud = lambda text, target: html.unescape(client.translate(text, target_language=target)["translatedText"])
+        evaluate(sys.argv[2], cloud)
+    else:
+        print("usage: local_translation.py build <pairs.tsv> <table.tsv> | eval <test.tsv> [--cloud]")
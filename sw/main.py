@@ -1,383 +1,500 @@
 # everything.py
 import sys
-import cv2
-import mediapipe as mp
-import numpy as np
-import tensorflow as tf
-import shared
 import time
 import threading
 import queue
 import os
-import sounddevice as sd
-# from flask import Flask, request, jsonify
-# from flask_cors import CORS
-from gpiozero import Button
-from TabularUI import MainWindow
-from PyQt5.QtWidgets import QApplication, QMessageBox
-from translator_device import TranslatorDevice  # Adjust the import path as needed
-from shared import latest_frame
+from startup import StartupProfile, StagedStartup
+
+# Everything the window needs is imported up front; the speech path, GPIO and
+# the ASL models are initialised afterwards (see start_subsystems)
+profile = StartupProfile()
+with profile.measure("cv2/numpy", "import"):
+    import cv2
+    import numpy as np
+with profile.measure("ui", "import"):
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    from TabularUI import MainWindow
+from mixer_service import get_mixer
+import hal
+from transcript_bus import get_bus, CLEAR, TRANSLATION
+from shared import state
+from asl_engine import AslEngine, SentenceBuilder, actions, extract_keypoints
+from mode_controller import CameraManager, ModeController, ASL
+from gesture_enrollment import SequenceIndex, GestureEnrollment
+from asl_reply import ReplyCycle
+from governor import WorkloadGovernor
+from profiles import ProfileManager
+import metrics
+import tracing
 
 
 # ==================== ASL & SPEECH SETUP ====================
-actions = np.array(["hello", "thank you", "nothing", "help", "yes", "bathroom"])
-
-# Load the TFLite model
-model_path = "/home/plt/plt_project/Portable-Language-Translator/model.tflite"
-interpreter = tf.lite.Interpreter(model_path=model_path)
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
-
-def tflite_predict(sequence):
-    """Run TFLite inference on a given input sequence."""
-    sequence = np.expand_dims(sequence, axis=0).astype(np.float32)
-    interpreter.set_tensor(input_details[0]['index'], sequence)
-    interpreter.invoke()
-    return interpreter.get_tensor(output_details[0]['index'])[0]
-
-# Mediapipe setup
-mp_holistic = mp.solutions.holistic
-mp_drawing = mp.solutions.drawing_utils
-holistic = mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-
-def mediapipe_detection(image, model):
-    """Runs MediaPipe Holistic on a frame and returns the drawn image and results."""
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image_rgb.flags.writeable = False
-    results = model.process(image_rgb)
-    image_rgb.flags.writeable = True
-    drawn_frame = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
-    return drawn_frame, results
-
-def extract_keypoints(results):
-    """Extract keypoints from MediaPipe Holistic results."""
-    # Extract pose landmarks (33 landmarks * 4 values (x,y,z,visibility))
-    pose = np.array([[res.x, res.y, res.z, res.visibility] for res in results.pose_landmarks.landmark]).flatten() if results.pose_landmarks else np.zeros(132)
-    
-    # Extract left hand landmarks (21 landmarks * 3 values (x,y,z))
-    lh = np.array([[res.x, res.y, res.z] for res in results.left_hand_landmarks.landmark]).flatten() if results.left_hand_landmarks else np.zeros(63)
-    
-    # Extract right hand landmarks (21 landmarks * 3 values (x,y,z))
-    rh = np.array([[res.x, res.y, res.z] for res in results.right_hand_landmarks.landmark]).flatten() if results.right_hand_landmarks else np.zeros(63)
-    
-    return np.concatenate([pose, lh, rh])
-
-def draw_styled_landmarks(image, results):
-    """Draw landmarks and connections for pose and hands."""
-    # Draw pose connections
-    mp_drawing.draw_landmarks(
-        image, results.pose_landmarks, mp_holistic.POSE_CONNECTIONS,
-        mp_drawing.DrawingSpec(color=(80,22,10), thickness=2, circle_radius=4),
-        mp_drawing.DrawingSpec(color=(80,44,121), thickness=2, circle_radius=2)
-    )
-    # Draw left hand connections
-    mp_drawing.draw_landmarks(
-        image, results.left_hand_landmarks, mp_holistic.HAND_CONNECTIONS,
-        mp_drawing.DrawingSpec(color=(121,22,76), thickness=2, circle_radius=4),
-        mp_drawing.DrawingSpec(color=(121,44,250), thickness=2, circle_radius=2)
-    )
-    # Draw right hand connections
-    mp_drawing.draw_landmarks(
-        image, results.right_hand_landmarks, mp_holistic.HAND_CONNECTIONS,
-        mp_drawing.DrawingSpec(color=(245,117,66), thickness=2, circle_radius=4),
-        mp_drawing.DrawingSpec(color=(245,66,230), thickness=2, circle_radius=2)
-    )
+
+# TFLite model and MediaPipe are loaded the first time ASL mode is entered
+asl_engine = AslEngine(profile=profile)
 
 # Queues and threading for asynchronous inference
 sequence_queue = queue.Queue(maxsize=5)
 result_queue = queue.Queue(maxsize=5)
 stop_thread = False
 
+# ASL pipeline metrics (served with the speech metrics, see start_metrics)
+MEDIAPIPE_SECONDS = metrics.histogram("plt_mediapipe_seconds", "MediaPipe Holistic time per frame")
+TFLITE_SECONDS = metrics.histogram("plt_tflite_seconds", "LSTM inference time per sequence")
+SEQUENCE_WAIT_SECONDS = metrics.histogram("plt_sequence_queue_wait_seconds", "Time a sequence waits for the inference worker")
+SEQUENCE_QUEUE_DEPTH = metrics.gauge("plt_sequence_queue_depth", "Sequences waiting for inference")
+RESULT_QUEUE_DEPTH = metrics.gauge("plt_result_queue_depth", "Predictions waiting for the ASL loop")
+ASL_FPS = metrics.gauge("plt_asl_fps", "Processed camera frames per second")
+ASL_FRAMES = metrics.counter("plt_asl_frames_total", "Processed camera frames")
+
 def inference_worker():
     """Processes sequences asynchronously in a separate thread."""
     while not stop_thread:
+        if not asl_engine.loaded.wait(timeout=1):
+            continue
         try:
-            sequence = sequence_queue.get(timeout=1)
-            res = tflite_predict(sequence)
+            queued_at, window_id, sequence = sequence_queue.get(timeout=1)
+            SEQUENCE_WAIT_SECONDS.observe(time.perf_counter() - queued_at)
+            with TFLITE_SECONDS.time(), tracing.span("tflite", "asl", window_id):
+                res = asl_engine.predict(sequence)
             predicted_action = np.argmax(res)
-            result_queue.put((predicted_action, res[predicted_action]))
+            action_name, confidence = str(actions[predicted_action]), res[predicted_action]
+            if len(custom_signs):
+                with tracing.span("gesture_match", "asl", window_id):
+                    match = custom_signs.match(sequence)
+                # An accepted custom sign wins unless the LSTM is sure of one of its own signs;
+                # it counts as confident, the SentenceBuilder still wants agreeing windows
+                if match.accepted and (action_name == "nothing" or confidence <= sentence_builder.threshold):
+                    action_name, confidence = match.word, 1.0
+            result_queue.put((window_id, action_name, confidence))
         except queue.Empty:
             continue
 
-asl_thread = threading.Thread(target=inference_worker, daemon=True)
-asl_thread.start()
+asl_thread = threading.Thread(target=inference_worker, name="asl_inference", daemon=True)
+
+# Signs enrolled on the device (gesture_enrollment.py), matched next to the LSTM;
+# loaded by main() before enrollment is enabled
+custom_signs = SequenceIndex()
+enrollment = None  # GestureEnrollment in progress, fed by the ASL loop
+ENROLL_EXAMPLES = int(os.environ.get("PLT_ENROLL_EXAMPLES", "5"))
+
+def load_custom_signs():
+    """Load the saved signs. Must run before enroll_sign() can be called, or a
+    new sign would be enrolled into (and saved over the file with) an empty index."""
+    global custom_signs
+    custom_signs = SequenceIndex.load()
+
+def enroll_sign(word, examples=ENROLL_EXAMPLES):
+    """Record `examples` windows of a new sign from the camera (Settings tab).
+    Switches to ASL mode; the prompts are drawn on the camera feed."""
+    global enrollment
+    word = word.strip().lower()
+    if not word:
+        return False
+    enrollment = GestureEnrollment(custom_signs, word, examples, sequence_length=30)
+    mode_controller.submit(ASL)
+    print(f"Enrolling custom sign '{word}' ({examples} examples)")
+    return True
 
 # ==================== FLASK & TRANSLATOR SETUP ====================
 
-translator_device = TranslatorDevice()
+transcript_bus = get_bus()
+translator_device = None  # Created by the speech startup stage
+translator_thread = None
+reply_cycle = None  # Speaks ASL sentences and captures replies in the background (asl_reply.py)
 
 def speech_mode_logic():
     """Activate speech mode."""
     print("Switched to Speech Mode. Translator device is active and listening.")
-    translator_device.vad_active = True
-    translator_device.vad_active = False
-    time.sleep(1)
-    translator_device.vad_active = True
-    translator_device.active = True
+    # Stop any running VAD collector and wait for it to exit before restarting it
+    state.set("vad_active", False)
+    if not state.wait_for("listening", False, timeout=1.0):
+        print("VAD collector did not stop in time.")
+    state.update(vad_active=True, translator_active=True)
     
 
 def asl_mode_logic():
     """Initialize ASL mode."""
     print("Switched to ASL Mode. Camera activated for gesture detection.")
-    translator_device.active = False
-    translator_device.vad_active = False
-    shared.ui_mode = "CAMERA"
-
-translator_thread = threading.Thread(target=translator_device.start, daemon=True)
-translator_thread.start()
-translator_device.translator_thread = translator_thread
+    state.update(translator_active=False, vad_active=False, ui_mode="CAMERA")
+
+def init_speech(on_ready=None):
+    """Startup stage: cloud clients, audio stream and the translator thread."""
+    global translator_device, translator_thread, reply_cycle
+    module = profile.timed_import("translator_device", "translator_device")
+    with profile.measure("translator_device", "init"):
+        translator_device = module.TranslatorDevice(bus=transcript_bus)
+    reply_cycle = ReplyCycle(translator_device, transcript_bus)
+    translator_device.apply_profile(performance_profiles.settings)
+    if os.environ.get("PLT_SPECULATIVE") == "1":
+        # Translate stable interim transcripts ahead of the final one
+        translator_device.enable_speculation(
+            stability=float(os.environ.get("PLT_SPECULATIVE_STABILITY", "0.8")),
+            synthesize=os.environ.get("PLT_SPECULATIVE_TTS") == "1")
+    translator_thread = threading.Thread(target=translator_device.start, name="translator", daemon=True)
+    translator_thread.start()
+    translator_device.translator_thread = translator_thread
+    translator_device.first_audio_callback = lambda: mode_controller.mark_ready("SPEECH")
+    if on_ready is not None:
+        on_ready(translator_device)
 
 
 # ==================== PHYSICAL BUTTON & VOLUME SETUP ====================
-    
-def set_volume(level):
-    # Ensure level doesn't exceed 90%
-    capped_level = min(90, max(0, level))
-    os.system(f"amixer -D pulse sset Master {capped_level}%")
-
-def increase_volume(step=5):
-    current = get_volume()
-    # Calculate new volume but don't exceed 90%
-    new_volume = min(90, current + step)
-    set_volume(new_volume)
-
-def decrease_volume(step=5):
-    current = get_volume()
-    # Ensure volume doesn't go below 0
-    new_volume = max(0, current - step)
-    set_volume(new_volume)
-
-def get_volume():
-    result = os.popen("amixer -D pulse get Master").read()
-    volume = int(result.split('[')[1].split('%')[0])
-    return volume
+
+# Volume is owned by the mixer service (caps at 90% and coalesces presses)
+mixer = None
 
 # Adjust these pin numbers as needed
 PIN_MODE = 4
 PIN_UP = 17
 PIN_DOWN = 27
 
-# Global mode variable and camera handle (for ASL mode)
-mode = "SPEECH"  # Initial mode
-cap = None
-
-def flush_audio_stream():
-    # Open a temporary stream to read and discard frames
-    with sd.InputStream(samplerate=translator_device.SAMPLE_RATE, 
-                        channels=translator_device.NUM_CHANNELS, dtype='int16') as flush_stream:
-        # Read and discard frames for 2 seconds
-        flush_end = time.time() + 2
-        while time.time() < flush_end:
-            try:
-                _ = flush_stream.read(int(translator_device.SAMPLE_RATE * (translator_device.FRAME_DURATION / 1000.0)))
-            except Exception as e:
-                pass
+button_mode = button_up = button_down = None
 
-def change_mode():
-    global mode, cap, sequence, predictions, sentence
-    # Flush ASL buffers/queues
+# The camera is owned by the camera manager. With warm standby (default, set
+# PLT_WARM_CAMERA=0 to disable) it stays open at a low frame rate in speech mode
+# and the ASL models are pre-armed, so switching to ASL does not reopen the device.
+WARM_CAMERA_STANDBY = os.environ.get("PLT_WARM_CAMERA", "1") != "0"
+camera = CameraManager(width=640, height=400, warm_standby=WARM_CAMERA_STANDBY)
+
+def flush_asl_buffers():
+    """Drop queued sequences and predictions from the previous ASL session."""
     while not sequence_queue.empty():
         sequence_queue.get_nowait()
     while not result_queue.empty():
         result_queue.get_nowait()
-    sequence.clear()
-    predictions.clear()
-    sentence.clear()
-    
-    cv2.destroyAllWindows()
-    if mode == "ASL":
-        mode = "SPEECH"
-        speech_mode_logic()
-        if cap is not None:
-            cap.release()
-            cap = None      
-        print("Mode changed to SPEECH")
+
+def enter_speech_mode():
+    """Mode controller handler: ASL -> SPEECH."""
+    flush_asl_buffers()
+    if reply_cycle is not None:
+        # Speech mode takes over the microphone once the reply capture has let go
+        reply_cycle.cancel("mode", wait=True)
+    camera.standby()
+    speech_mode_logic()
+    if translator_device is not None:
         translator_device.reset()
-        translator_device.active = True
-        shared.ui_mode = "TEXT"
-    else:
-        mode = "ASL"
-        with open(file_path, 'w') as file:
-            pass  # clear the file contents
-        asl_mode_logic()
-        if cap is None:
-            cap = cv2.VideoCapture(0)
-        print("Mode changed to ASL")
-        shared.ui_mode = "CAMERA"
+    state.update(mode="SPEECH", ui_mode="TEXT")
+
+def enter_asl_mode():
+    """Mode controller handler: SPEECH -> ASL."""
+    flush_asl_buffers()
+    if translator_device is not None:
+        translator_device.cancel_inflight("mode")
+    transcript_bus.publish(CLEAR)
+    asl_mode_logic()
+    camera.activate()
+    state.update(mode="ASL", ui_mode="CAMERA")
+
+# ==================== WORKLOAD GOVERNOR ====================
+
+# Temperature/throttling/load aware limits for the ASL pipeline and UI
+governor = WorkloadGovernor(log_path=os.environ.get("PLT_GOVERNOR_LOG"))
+workload = governor.settings  # Current limits, replaced on every governor change
+
+def apply_workload(settings):
+    global workload
+    workload = settings
+    camera.set_fps(settings["camera_fps"])
+    asl_engine.set_model_complexity(settings["model_complexity"])
+
+governor.add_listener(apply_workload)
+
+# ==================== PERFORMANCE PROFILES ====================
+
+# Named profiles (low-power, balanced, low-latency and user profiles from
+# profiles.json) set the camera, Holistic, gesture, VAD and mixer settings
+# and cap the governor. Selected from the Settings tab or with PLT_PROFILE.
+# (`profile` above is the startup profile.)
+performance_profiles = ProfileManager()
+
+def apply_profile(settings):
+    sentence_builder.threshold = settings["threshold"]
+    sentence_builder.history_length = settings["history_length"]
+    camera.set_resolution(settings["camera_width"], settings["camera_height"])
+    asl_engine.set_confidence(settings["detection_confidence"], settings["tracking_confidence"])
+    governor.set_limits(settings)
+    if mixer is not None:
+        mixer.coalesce_ms = settings["mixer_coalesce_ms"]
+    if translator_device is not None:
+        translator_device.apply_profile(settings)
+    if metrics_writer is not None:
+        metrics_writer.extra["profile"] = performance_profiles.active
+
+# Button presses are queued; the controller thread performs the switches
+mode_controller = ModeController(state, enter_speech_mode, enter_asl_mode)
 
-    shared.mode = mode
+def change_mode():
+    mode_controller.toggle()
 
 def volume_up():
     print("Increased Volume")
-    increase_volume()
+    mixer.increase_volume()
 
 def volume_down():
     print("Decreased Volume")
-    decrease_volume()
-
-button_mode = Button(PIN_MODE, pull_up=True, bounce_time=0.2)
-button_up = Button(PIN_UP, pull_up=True, bounce_time=0.2)
-button_down = Button(PIN_DOWN, pull_up=True, bounce_time=0.2)
-
-button_mode.when_pressed = change_mode
-button_up.when_pressed = volume_up
-button_down.when_pressed = volume_down
+    mixer.decrease_volume()
+
+def init_buttons():
+    """Startup stage: mixer service and GPIO buttons."""
+    global mixer, button_mode, button_up, button_down
+    mixer = get_mixer()
+    mixer.coalesce_ms = performance_profiles.settings["mixer_coalesce_ms"]
+    button_mode = hal.button(PIN_MODE, profile.timed_import)
+    button_up = hal.button(PIN_UP, profile.timed_import)
+    button_down = hal.button(PIN_DOWN, profile.timed_import)
+
+    button_mode.when_pressed = change_mode
+    button_up.when_pressed = volume_up
+    button_down.when_pressed = volume_down
+    # PLT_HAL=sim: scripted presses from PLT_SIM_BUTTONS (see hal.py)
+    hal.start_button_script()
 
 # ==================== ASL PROCESSING (Non-UI) ====================
 
 # Variables used in ASL processing
 sequence = []
 predictions = []
-sentence = []
-threshold = 0.9
 last_detection_time = time.time()
 frame_count = 0
 start_time = time.time()
-latest_frame = None
-last_prediction_time = 0
-min_prediction_interval = 0
-HISTORY_LENGTH = 4  # Number of predictions to consider
-MIN_CONSISTENT_PREDICTIONS = 3  # Minimum number of same predictions needed
-prediction_history = []  # Store recent predictions
+# Frame rate cap while a sentence is spoken and the reply captured (0: no cap)
+REPLY_FPS = int(os.environ.get("PLT_REPLY_FPS", "0"))
+# Commit logic (threshold and history length are set by the performance profile);
+# asl_replay.py drives the same class from recorded sessions
+sentence_builder = SentenceBuilder(threshold=0.9, history_length=4, min_consistent=3, min_interval=0)
 
 # hands_instance = mp_hands.Hands(min_detection_confidence=0.5, min_tracking_confidence=0.8)
 
 def asl_processing_loop():
-    nothing_count = 0
     current_prediction = ""
-    global cap, sequence, predictions, sentence, last_detection_time, frame_count
-    global start_time, latest_frame, last_prediction_time, prediction_history
-
-    while True:
-        if mode == "ASL":
-            if cap is None:
-                cap = cv2.VideoCapture(0)
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)  # Set a fixed width
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 400) # Set a fixed height
-            ret, frame = cap.read()
+    session = None
+    global sequence, predictions, last_detection_time, frame_count, start_time, enrollment
+
+    while not stop_thread:
+        if state.get("mode") == "ASL":
+            asl_engine.load()  # No-op after the first ASL session
+            if session != mode_controller.asl_session:
+                # New ASL session: start from empty buffers
+                session = mode_controller.asl_session
+                sequence.clear()
+                predictions.clear()
+                sentence_builder.reset()
+            frame_start = time.monotonic()
+            with tracing.span("capture", "asl"):
+                ret, frame = camera.read()
             if not ret:
+                time.sleep(0.01)
                 continue
             
             image = cv2.resize(frame, (640, 400)) # Resize the frame
             
-            image, results = mediapipe_detection(frame, holistic)
-            draw_styled_landmarks(image, results)
+            with MEDIAPIPE_SECONDS.time(), tracing.span("mediapipe", "asl"):
+                image, results = asl_engine.detect(frame)
+            asl_engine.draw_styled_landmarks(image, results)
 
             # Draw current sentence at the top
-            sentence_text = ' '.join(sentence)
+            sentence_text = sentence_builder.text
             cv2.putText(image, f"Sentence: {sentence_text}", (10, 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+            if enrollment is not None:
+                cv2.putText(image, enrollment.status, (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+            # The spoken sentence's progress and the reply, at the bottom
+            if reply_cycle is not None and (reply_cycle.status or reply_cycle.reply):
+                reply_text = reply_cycle.status or f"Reply: {reply_cycle.reply}"
+                cv2.putText(image, reply_text, (10, image.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                            (255, 255, 0), 2)
             
 
-            shared.latest_frame = image.copy()  # Update this line to use the annotated image
+            state.set("latest_frame", image.copy())  # Pushes the annotated image to the UI
             frame_count += 1
+            ASL_FRAMES.inc()
+            mode_controller.mark_ready("ASL")
             
             keypoints = extract_keypoints(results)
+            if enrollment is not None:
+                # Recording a custom sign: its prompt is shown instead of recognizing
+                enrollment.feed(keypoints)
+                if enrollment.finished:
+                    enrollment = None
+                    sequence.clear()
+                    sentence_builder.reset()
+                    flush_asl_buffers()
+                remaining = 1.0 / workload["camera_fps"] - (time.monotonic() - frame_start)
+                if remaining > 0:
+                    time.sleep(remaining)
+                continue
             sequence.append(keypoints)
             sequence = sequence[-30:]
 
-            # if len(sequence) >= 30 and frame_count % 2 == 0 and not sequence_queue.full():
-            if len(sequence) >= 30 and not sequence_queue.full():
-                sequence_queue.put_nowait(np.array(sequence[-30:]))
+            # Run the LSTM every inference_stride frames (raised by the governor when hot)
+            if (len(sequence) >= 30 and frame_count % workload["inference_stride"] == 0
+                    and not sequence_queue.full()):
+                # One gesture window: traced from this frame's capture to its commit
+                window_id = tracing.new_id()
+                tracing.async_begin("window", window_id, "asl", {"frame": frame_count})
+                sequence_queue.put_nowait((time.perf_counter(), window_id, np.array(sequence[-30:])))
+            SEQUENCE_QUEUE_DEPTH.set(sequence_queue.qsize())
+            RESULT_QUEUE_DEPTH.set(result_queue.qsize())
 
             if not result_queue.empty():
-                predicted_action, confidence = result_queue.get_nowait()
-                action_name = actions[predicted_action]
-                current_time = time.time()
-                time_since_last_prediction = current_time - last_prediction_time
+                window_id, action_name, confidence = result_queue.get_nowait()
 
                 # Update current prediction display with more info
                 current_prediction = f"{action_name} ({confidence:.2f})"
 
-                prediction_history.append(action_name)
-                prediction_history = prediction_history[-HISTORY_LENGTH:]
-
-                if confidence > threshold:
-                    prediction_counts = prediction_history.count(action_name)
-
-                    if sentence and sentence[-1] == "thank you" and action_name == "yes":
-                        # Skip this prediction, do not update last_prediction_time or clear history.
-                        pass
-                    elif action_name == "nothing":
-                        nothing_count += 1
-                        last_prediction_time = current_time
-                    elif (time_since_last_prediction >= min_prediction_interval and 
-                        prediction_counts >= MIN_CONSISTENT_PREDICTIONS):  # Removed length check
-                        nothing_count = 0
-                        if not sentence or action_name != sentence[-1]:
-                            sentence.append(action_name)
-                            last_prediction_time = current_time
-                            prediction_history.clear()  
-
-                # Trigger synthesis on consecutive "nothing" gestures
-                if nothing_count >= 2 and any(word != "nothing" for word in sentence):
-                    text_out = ' '.join(sentence)
-                    translator_device.synthesize_speech(text_out, translator_device.base_language)
-                    shared.ui_mode = "TEXT"
+                outcome = sentence_builder.add(action_name, confidence)
+                tracing.async_end("window", window_id, "asl",
+                                  {"action": action_name, "confidence": float(confidence), "outcome": outcome})
+
+                # Speak the sentence on consecutive "nothing" gestures. Speech, reply capture and
+                # recognition run in the background while this loop keeps the camera live; a new
+                # sentence cuts the previous reply cycle short
+                if sentence_builder.ready() and reply_cycle is not None:
+                    reply_cycle.start(sentence_builder.text, committed_at=time.perf_counter(), trace_id=window_id)
 
                     # Reset all tracking variables
-                    sentence.clear()
+                    sentence_builder.reset()
                     sequence.clear()
                     predictions.clear()
-                    prediction_history.clear()
-                    nothing_count = 0
-                    
-                    with open(file_path, 'w') as file:
-                        pass  # Clear file contents
-
-                    # Handle audio transcription
-                    translator_device.vad_active = True
-                    transcript = translator_device.listen_and_save_transcription(
-                        file_path="als_speech_audio_transcription.txt")
-                    translator_device.vad_active = False
-
-                    time.sleep(3)
-                    with open(file_path, 'w') as file:
-                        pass
-                    shared.ui_mode = "CAMERA"
-
-            time.sleep(0.03)
-        else:
-            # Speech mode handling
-            if cap is not None:
-                cap.release()
-                cap = None
-            shared.ui_mode = "TEXT"
-            time.sleep(0.1)
 
-asl_proc_thread = threading.Thread(target=asl_processing_loop, daemon=True)
-asl_proc_thread.start()
+            # Pace the loop to the governor's frame rate instead of a fixed sleep
+            # (PLT_REPLY_FPS caps it while a reply cycle runs)
+            fps = workload["camera_fps"]
+            if REPLY_FPS and reply_cycle is not None and reply_cycle.busy:
+                fps = min(fps, REPLY_FPS)
+            remaining = 1.0 / fps - (time.monotonic() - frame_start)
+            if remaining > 0:
+                time.sleep(remaining)
+            ASL_FPS.set(1.0 / max(time.monotonic() - frame_start, 1e-6))
+        else:
+            # Speech mode: the camera is in standby, wait for the next switch
+            state.wait_for("mode", "ASL", timeout=1.0)
+
+asl_proc_thread = threading.Thread(target=asl_processing_loop, name="asl_loop", daemon=True)
+
+# ==================== METRICS ====================
+
+# Prometheus text on http://127.0.0.1:PLT_METRICS_PORT/metrics (0 disables it)
+# and a rolling JSON summary rewritten every minute
+METRICS_PORT = int(os.environ.get("PLT_METRICS_PORT", "9101"))
+METRICS_SUMMARY = os.environ.get("PLT_METRICS_SUMMARY", "metrics_summary.json")
+metrics_server = None
+metrics_writer = None
+
+def start_metrics():
+    """Startup stage: scrape endpoint and on-disk summary."""
+    global metrics_server, metrics_writer
+    if METRICS_PORT:
+        metrics_server = metrics.start_http_server(METRICS_PORT)
+    if METRICS_SUMMARY:
+        metrics_writer = metrics.SummaryWriter(METRICS_SUMMARY)
+        metrics_writer.extra["profile"] = performance_profiles.active
+        metrics_writer.start()
+
+performance_profiles.add_listener(apply_profile)
+
+# ==================== TRACING ====================
+
+# PLT_TRACE=1 enables tracing from startup; SIGUSR1 toggles it at runtime and
+# writes the buffer to PLT_TRACE_FILE when it is switched off
+TRACE_FILE = os.environ.get("PLT_TRACE_FILE", "trace.json")
+
+def toggle_tracing(*_):
+    if tracing.enabled():
+        tracing.disable()
+        tracing.export(TRACE_FILE)
+    else:
+        tracing.enable()
+        print("Tracing enabled.")
+
+# ==================== STAGED STARTUP ====================
+
+def start_subsystems(on_translator_ready=None):
+    """Start everything behind the window in priority order: speech first,
+    then buttons, then the (idle) ASL threads. ASL models load lazily."""
+    stages = [
+        ("speech", lambda: init_speech(on_translator_ready)),
+        ("buttons", lambda: (mode_controller.start(), init_buttons())),
+        ("governor", governor.start),
+        ("metrics", start_metrics),
+        ("asl_threads", lambda: (asl_thread.start(), asl_proc_thread.start())),
+    ]
+    if WARM_CAMERA_STANDBY:
+        # Pre-arm the ASL pipeline so the first switch is as fast as later ones
+        stages.append(("asl_prearm", lambda: (asl_engine.load(), camera.prepare())))
+    startup = StagedStartup(profile, stages, on_done=profile.report)
+    startup.start()
+    return startup
+
+def on_first_translation(event):
+    """Record cold boot to first translation once, then stop listening."""
+    if event.kind == TRANSLATION:
+        transcript_bus.unsubscribe(on_first_translation)
+        profile.mark("first_translation")
+        profile.report()
 
 # ==================== THREAD CLEANUP FUNCTION ====================
 def cleanup():
-    global stop_thread, cap
+    global stop_thread
     print("Initiating cleanup...")
     stop_thread = True  # Signal all loops to exit
+    mode_controller.stop()
+    if reply_cycle is not None:
+        reply_cycle.cancel("shutdown")
+    governor.stop()
+    if metrics_writer is not None:
+        metrics_writer.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
     # Release the camera if in use
-    if cap is not None:
-        cap.release()
-    # Join threads
-    asl_proc_thread.join()
-    asl_thread.join()
-    translator_thread.join()
+    camera.release()
+    if mixer is not None:
+        mixer.stop()
+    # Join threads (the processing loops are daemons and may be blocked on I/O)
+    for thread in (asl_proc_thread, asl_thread, translator_thread):
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=2)
+    transcript_bus.close()
+    if translator_device is not None and translator_device.speculator is not None:
+        print(f"Speculation: {translator_device.speculation_stats()}")
+    if tracing.enabled():
+        tracing.export(TRACE_FILE)
     # flask_thread.join()
     print("Cleanup complete.")
 
 # ==================== APPLICATION ENTRY POINT ====================
 
-if __name__ == "__main__":
-    file_path = "als_speech_audio_transcription.txt"  # This file is updated by the ASL processing thread
-    with open(file_path, 'w') as file:
-        pass  # clear the file contents
+def main(duration_s=None):
+    """Run the app until the window is closed, or for `duration_s` seconds
+    (soak.py). Returns the exit code."""
+    import signal
+    signal.signal(signal.SIGUSR1, toggle_tracing)
+    if os.environ.get("PLT_TRANSCRIPT_LOG"):
+        transcript_bus.enable_log(os.environ["PLT_TRANSCRIPT_LOG"])
 
     app_qt = QApplication(sys.argv)
-    window = MainWindow(file_path, translator_device)
+    window = MainWindow(None, transcript_bus)
     window.show()
+    profile.mark("window_shown")
+    transcript_bus.subscribe(on_first_translation)
+    governor.add_listener(lambda settings: window.set_frame_interval(settings["ui_refresh_ms"]))
+    window.attach_profiles(performance_profiles)
+    load_custom_signs()
+    window.attach_enrollment(enroll_sign)
+    start_subsystems(on_translator_ready=window.attach_translator_device)
+    if duration_s is not None:
+        QTimer.singleShot(int(duration_s * 1000), app_qt.quit)
     try:
         exit_code = app_qt.exec_()
     except KeyboardInterrupt:
         exit_code = 0
     finally:
         cleanup()
-    sys.exit(exit_code)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
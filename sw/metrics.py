@@ -0,0 +1,279 @@
+# metrics.py
+
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from 1 ms to 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text="", labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help_text="", labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Histogram:
+    """Fixed-bucket histogram. observe() is a bisect and two additions under a lock."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", buckets=LATENCY_BUCKETS, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextlib.contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q, counts=None):
+        """Estimate a quantile by linear interpolation inside the matching bucket."""
+        counts = counts if counts is not None else list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                if index >= len(self.bounds):
+                    return lower  # Beyond the last bound
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.bounds[-1]
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total_sum = self.sum
+            total = self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = dict(self.labels, le="+Inf" if bound == float("inf") else repr(bound))
+            samples.append((self.name + "_bucket", labels, cumulative))
+        samples.append((self.name + "_sum", self.labels, total_sum))
+        samples.append((self.name + "_count", self.labels, total))
+        return samples
+
+    def snapshot(self):
+        with self.lock:
+            return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = cls(name, help_text, labels=labels, **kwargs)
+                self.metrics[key] = metric
+            return metric
+
+    def counter(self, name, help_text="", labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", labels=None):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS, labels=None):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        described = set()
+        for metric in sorted(metrics, key=lambda m: m.name):
+            if metric.name not in described:
+                described.add(metric.name)
+                if metric.help:
+                    lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self.lock:
+            metrics = list(self.metrics.items())
+        return {key: (metric, metric.snapshot()) for key, metric in metrics}
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, help_text="", labels=None):
+    return REGISTRY.counter(name, help_text, labels)
+
+
+def gauge(name, help_text="", labels=None):
+    return REGISTRY.gauge(name, help_text, labels)
+
+
+def histogram(name, help_text="", buckets=LATENCY_BUCKETS, labels=None):
+    return REGISTRY.histogram(name, help_text, buckets, labels)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the console
+
+
+def start_http_server(port=9101, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics on localhost from a daemon thread."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return server
+
+
+class SummaryWriter:
+    """Periodically writes a JSON summary of all metrics to disk.
+
+    Each summary has the totals since startup and the values for the last
+    interval (histogram quantiles are estimated from the bucket deltas). The file
+    is replaced atomically so readers never see a partial write.
+    """
+
+    def __init__(self, path, interval=60.0, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.previous = {}
+        self.extra = {}  # Additional top-level fields, e.g. the active profile
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.write()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def summarize(self):
+        summary = {"time": time.time(), "interval_s": self.interval}
+        summary.update(self.extra)
+        metrics = {}
+        current = self.registry.snapshot()
+        for key, (metric, snap) in current.items():
+            name = metric.name + _format_labels(metric.labels)
+            if metric.kind == "histogram":
+                previous = self.previous.get(key, {"counts": [0] * len(snap["counts"]), "count": 0})
+                window = [now - before for now, before in zip(snap["counts"], previous["counts"])]
+                metrics[name] = {
+                    "count": snap["count"],
+                    "mean": snap["sum"] / snap["count"] if snap["count"] else None,
+                    "p50": metric.quantile(0.5, snap["counts"]),
+                    "p95": metric.quantile(0.95, snap["counts"]),
+                    "p99": metric.quantile(0.99, snap["counts"]),
+                    "window_count": snap["count"] - previous["count"],
+                    "window_p50": metric.quantile(0.5, window),
+                    "window_p95": metric.quantile(0.95, window),
+                }
+            else:
+                metrics[name] = snap["value"]
+        self.previous = {key: snap for key, (metric, snap) in current.items()}
+        summary["metrics"] = metrics
+        return summary
+
+    def write(self):
+        summary = self.summarize()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(summary, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error writing metrics summary: {e}")
@@ -0,0 +1,192 @@
+# mixer_service.py
+
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+MAX_VOLUME = 90  # Hard cap for the speaker volume (%)
+VOLUME_PATTERN = re.compile(r'\[(\d+)%\]')
+
+
+class MixerService:
+    """Single owner of the Master volume.
+
+    Keeps one long-lived `amixer -s` process for reads/writes and one
+    `amixer events` monitor so the current volume is pushed to listeners
+    instead of being polled.
+    """
+
+    def __init__(self, device="pulse", control="Master", step=5, coalesce_ms=50):
+        self.device = device
+        self.control = control
+        self.step = step
+        self.coalesce_ms = coalesce_ms
+
+        self.volume = None
+        self.listeners = []
+
+        self._lock = threading.Lock()
+        self._write_cond = threading.Condition(self._lock)
+        self._pending = None
+        self._last_written = None
+        self._running = False
+
+        self._control_proc = None
+        self._monitor_proc = None
+        self._threads = []
+
+    def start(self):
+        """Open the control connection and the change monitor."""
+        if self._running:
+            return
+        self._running = True
+        try:
+            self._control_proc = subprocess.Popen(
+                line_buffered(["amixer", "-D", self.device, "-s"]),
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, bufsize=1)
+            self._monitor_proc = subprocess.Popen(
+                line_buffered(["amixer", "-D", self.device, "events"]),
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, bufsize=1)
+        except (OSError, ValueError) as e:
+            print(f"Mixer service unavailable: {e}")
+            self._running = False
+            return
+
+        for target in (self._read_control, self._read_monitor, self._write_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._send(f"sget {self.control}")
+
+    def stop(self):
+        """Shut down the helper processes."""
+        with self._lock:
+            self._running = False
+            self._write_cond.notify_all()
+        for proc in (self._control_proc, self._monitor_proc):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+        self._control_proc = None
+        self._monitor_proc = None
+
+    def add_listener(self, callback):
+        """Register callback(volume) for volume changes. Called from a mixer thread."""
+        self.listeners.append(callback)
+        if self.volume is not None:
+            callback(self.volume)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def get_volume(self):
+        """Return the cached volume, waiting briefly for the first reading."""
+        deadline = time.time() + 1.0
+        while self.volume is None and self._running and time.time() < deadline:
+            time.sleep(0.01)
+        return self.volume if self.volume is not None else 0
+
+    def set_volume(self, level):
+        """Request an absolute volume. Writes are coalesced."""
+        with self._lock:
+            self._pending = clamp_volume(level)
+            self._write_cond.notify()
+
+    def change_volume(self, delta):
+        """Adjust relative to the latest requested (or known) volume."""
+        with self._lock:
+            base = self._pending
+            if base is None:
+                base = self._last_written if self._last_written is not None else self.volume
+            self._pending = clamp_volume((base or 0) + delta)
+            self._write_cond.notify()
+
+    def increase_volume(self, step=None):
+        self.change_volume(step if step is not None else self.step)
+
+    def decrease_volume(self, step=None):
+        self.change_volume(-(step if step is not None else self.step))
+
+    def _send(self, command):
+        proc = self._control_proc
+        if proc is None or proc.stdin is None:
+            return
+        try:
+            proc.stdin.write(command + "\n")
+            proc.stdin.flush()
+        except (BrokenPipeError, ValueError) as e:
+            print(f"Mixer control connection lost: {e}")
+
+    def _write_loop(self):
+        """Merge bursts of requests into a single sset."""
+        while True:
+            with self._lock:
+                while self._running and self._pending is None:
+                    self._write_cond.wait()
+                if not self._running:
+                    return
+            time.sleep(self.coalesce_ms / 1000.0)
+            with self._lock:
+                level, self._pending = self._pending, None
+                if level is None or level == self.volume:
+                    continue
+                self._last_written = level
+            self._send(f"sset {self.control} {level}%")
+
+    def _read_control(self):
+        """Parse sget/sset replies from the control process."""
+        proc = self._control_proc
+        for line in proc.stdout:
+            match = VOLUME_PATTERN.search(line)
+            if match:
+                self._update(int(match.group(1)))
+
+    def _read_monitor(self):
+        """Re-read the control whenever the mixer reports a change."""
+        proc = self._monitor_proc
+        for line in proc.stdout:
+            if "event value" in line or "event info" in line:
+                self._send(f"sget {self.control}")
+
+    def _update(self, volume):
+        with self._lock:
+            self._last_written = None
+        if volume == self.volume:
+            return
+        self.volume = volume
+        for callback in list(self.listeners):
+            try:
+                callback(volume)
+            except Exception as e:
+                print(f"Error in volume listener: {e}")
+
+
+def line_buffered(cmd):
+    """amixer block-buffers stdout on a pipe; force line buffering when possible."""
+    if shutil.which("stdbuf"):
+        return ["stdbuf", "-oL"] + cmd
+    return cmd
+
+
+def clamp_volume(level):
+    """Apply the 0..MAX_VOLUME cap."""
+    return min(MAX_VOLUME, max(0, int(level)))
+
+
+_mixer = None
+_mixer_lock = threading.Lock()
+
+
+def get_mixer():
+    """Return the process-wide mixer service, starting it on first use."""
+    global _mixer
+    with _mixer_lock:
+        if _mixer is None:
+            import hal  # The simulated mixer when PLT_HAL=sim
+            _mixer = hal.mixer()
+            _mixer.start()
+        return _mixer
@@ -0,0 +1,192 @@
+# mode_controller.py
+
+import collections
+import queue
+import threading
+import time
+import cv2
+import hal
+import tracing
+
+# Commands accepted by ModeController.submit()
+TOGGLE = "TOGGLE"
+SPEECH = "SPEECH"
+ASL = "ASL"
+STOP = "STOP"
+
+
+class CameraManager:
+    """Sole owner of the USB camera.
+
+    activate() opens the camera (or wakes it from standby), standby() either keeps
+    it open at a low frame rate (warm standby) or releases it. Only the ASL loop
+    reads frames; everything else goes through activate()/standby().
+    """
+
+    def __init__(self, index=0, width=640, height=400, fps=30, standby_fps=5, warm_standby=True):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.standby_fps = standby_fps
+        self.warm_standby = warm_standby
+        self.cap = None
+        self.active = False
+        self.lock = threading.Lock()
+
+    def _open(self):
+        cap = hal.video_capture(self.index)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def prepare(self):
+        """Open the camera in standby ahead of the first switch to ASL mode."""
+        with self.lock:
+            if self.warm_standby and self.cap is None:
+                self.cap = self._open()
+                self.cap.set(cv2.CAP_PROP_FPS, self.standby_fps)
+
+    def activate(self):
+        with self.lock:
+            if self.cap is None:
+                self.cap = self._open()
+            else:
+                # Drop the frame that has been sitting in the driver buffer during standby
+                self.cap.grab()
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+            self.active = True
+
+    def standby(self):
+        with self.lock:
+            self.active = False
+            if self.cap is None:
+                return
+            if self.warm_standby:
+                self.cap.set(cv2.CAP_PROP_FPS, self.standby_fps)
+            else:
+                self.cap.release()
+                self.cap = None
+
+    def set_fps(self, fps):
+        """Change the capture rate; applied immediately when the camera is active."""
+        with self.lock:
+            self.fps = fps
+            if self.active and self.cap is not None:
+                self.cap.set(cv2.CAP_PROP_FPS, fps)
+
+    def set_resolution(self, width, height):
+        """Change the capture size; an open camera is reconfigured in place."""
+        with self.lock:
+            if (width, height) == (self.width, self.height):
+                return
+            self.width = width
+            self.height = height
+            if self.cap is not None:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def read(self):
+        with self.lock:
+            if not self.active or self.cap is None:
+                return False, None
+            return self.cap.read()
+
+    def release(self):
+        with self.lock:
+            self.active = False
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+
+
+class ModeController:
+    """Explicit SPEECH/ASL state machine fed by a command queue.
+
+    Button callbacks only enqueue commands, so a GPIO thread never blocks on a
+    switch and presses made during a switch are applied afterwards in order.
+    Pending toggles are merged (an even number cancels out).
+
+    enter_speech/enter_asl do the actual work and run on the controller thread.
+    The switch latency is measured from the button press to the first processed
+    camera frame (ASL) or the first audio frame read (SPEECH), reported through
+    mark_ready().
+    """
+
+    def __init__(self, state, enter_speech, enter_asl):
+        self.state = state
+        self.handlers = {SPEECH: enter_speech, ASL: enter_asl}
+        self.commands = queue.Queue()
+        self.phase = state.get("mode")  # SPEECH, ASL, TO_SPEECH or TO_ASL
+        self.asl_session = 0  # Incremented on every entry into ASL mode
+        self.pending_switch = None  # (target, press time)
+        self.latencies = {SPEECH: collections.deque(maxlen=100), ASL: collections.deque(maxlen=100)}
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.commands.put((STOP, time.monotonic()))
+
+    def submit(self, command=TOGGLE):
+        """Queue a command. Safe to call from any thread, returns immediately."""
+        self.commands.put((command, time.monotonic()))
+
+    def toggle(self):
+        self.submit(TOGGLE)
+
+    def mark_ready(self, mode):
+        """Called by the pipeline of `mode` when it produced its first result."""
+        with self.lock:
+            if self.pending_switch is None or self.pending_switch[0] != mode:
+                return
+            target, press_time = self.pending_switch
+            self.pending_switch = None
+        latency = time.monotonic() - press_time
+        self.latencies[target].append(latency)
+        print(f"Mode switch to {target}: {latency * 1000:.1f} ms from button press to first {'frame' if target == ASL else 'audio frame'}")
+
+    def _next_target(self, first_command, first_time):
+        """Collapse everything queued into a single target mode."""
+        current = self.state.get("mode")
+        target = current
+        press_time = first_time
+        pending = [(first_command, first_time)]
+        while True:
+            try:
+                pending.append(self.commands.get_nowait())
+            except queue.Empty:
+                break
+        for command, timestamp in pending:
+            if command == STOP:
+                return STOP, timestamp
+            if command == TOGGLE:
+                target = ASL if target == SPEECH else SPEECH
+            else:
+                target = command
+            press_time = timestamp
+        return target, press_time
+
+    def _run(self):
+        while True:
+            command, timestamp = self.commands.get()
+            target, press_time = self._next_target(command, timestamp)
+            if target == STOP:
+                return
+            if target == self.state.get("mode"):
+                continue
+            with self.lock:
+                self.pending_switch = (target, press_time)
+            self.phase = "TO_" + target
+            if target == ASL:
+                self.asl_session += 1
+            try:
+                with tracing.span("enter_" + target.lower(), "mode"):
+                    self.handlers[target]()
+            except Exception as e:
+                print(f"Error switching to {target}: {e}")
+            self.phase = self.state.get("mode")
+            print(f"Mode changed to {self.phase} ({(time.monotonic() - press_time) * 1000:.1f} ms to switch)")
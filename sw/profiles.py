@@ -0,0 +1,145 @@
+# profiles.py
+
+import json
+import os
+import threading
+import metrics
+import tracing
+
+# User profiles live in a JSON file next to the code (PLT_PROFILES overrides the path):
+# {"active": "field", "profiles": {"field": {"base": "balanced", "threshold": 0.85}}}
+# A profile lists only what differs from its base (balanced by default).
+PROFILE_PATH = os.environ.get(
+    "PLT_PROFILES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles.json"))
+
+DEFAULT_PROFILE = "balanced"
+
+# Every performance setting, as the balanced profile sets it
+BALANCED = {
+    # Camera capture size and the highest frame rate the governor may use
+    "camera_width": 640,
+    "camera_height": 400,
+    "camera_fps": 30,
+    # MediaPipe Holistic
+    "detection_confidence": 0.5,
+    "tracking_confidence": 0.5,
+    "model_complexity": 1,
+    # Gesture commits: LSTM confidence needed and predictions that must agree
+    "threshold": 0.9,
+    "history_length": 4,
+    "inference_stride": 1,  # Frames between LSTM runs (the governor may raise it)
+    # UI camera repaint interval (the governor may raise it)
+    "ui_refresh_ms": 30,
+    # Speech endpointing (see endpointing.py)
+    "vad_mode": 3,
+    "vad_hangover_ms": 300,
+    "max_segment_ms": 10000,
+    # Volume button presses coalesced into one mixer write
+    "mixer_coalesce_ms": 50,
+}
+
+BUILTIN_PROFILES = {
+    # Cooler and lighter on the battery: smaller, slower camera, lighter
+    # Holistic model with fewer re-detections, LSTM on every third frame
+    "low-power": dict(BALANCED, camera_width=480, camera_height=300, camera_fps=15, tracking_confidence=0.3,
+                      model_complexity=0, inference_stride=3, ui_refresh_ms=66, max_segment_ms=15000,
+                      mixer_coalesce_ms=100),
+    "balanced": dict(BALANCED),
+    # Quicker commits and endpoints at a higher CPU and request cost
+    "low-latency": dict(BALANCED, threshold=0.85, history_length=3, vad_hangover_ms=240, max_segment_ms=6000,
+                        mixer_coalesce_ms=20),
+}
+
+ACTIVE = {}  # profile name -> gauge, 1 for the active profile
+
+
+class ProfileManager:
+    """Built-in and user-defined performance profiles, switchable at runtime.
+
+    Listeners registered with add_listener(callback) get the full settings dict
+    of the active profile immediately and again on every switch. The active
+    profile is exported as the plt_profile_active gauge and can be written
+    into the metrics summary (see main.start_metrics).
+    """
+
+    def __init__(self, path=PROFILE_PATH, active=None):
+        self.path = path
+        self.profiles = dict(BUILTIN_PROFILES)
+        self.listeners = []
+        self.lock = threading.Lock()
+        saved = self._load_user_profiles()
+        name = active or os.environ.get("PLT_PROFILE") or saved or DEFAULT_PROFILE
+        if name not in self.profiles:
+            print(f"Unknown profile {name!r}; using {DEFAULT_PROFILE}.")
+            name = DEFAULT_PROFILE
+        self.active = name
+        self._export()
+
+    def _load_user_profiles(self):
+        """Merge profiles from the config file. Returns its saved active profile name."""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read profiles from {self.path}: {e}")
+            return None
+        for name, overrides in config.get("profiles", {}).items():
+            base = self.profiles.get(overrides.get("base", DEFAULT_PROFILE), BALANCED)
+            unknown = set(overrides) - set(BALANCED) - {"base"}
+            if unknown:
+                print(f"Profile {name}: ignoring unknown settings {', '.join(sorted(unknown))}")
+            self.profiles[name] = dict(base, **{key: value for key, value in overrides.items() if key in BALANCED})
+        return config.get("active")
+
+    def _save_active(self):
+        """Remember the selection in the config file so it survives a restart."""
+        try:
+            config = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    config = json.load(f)
+            config["active"] = self.active
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(config, f, indent=2)
+        except (OSError, ValueError) as e:
+            print(f"Could not save the active profile to {self.path}: {e}")
+
+    def _export(self):
+        for name in self.profiles:
+            if name not in ACTIVE:
+                ACTIVE[name] = metrics.gauge("plt_profile_active", "1 for the active performance profile",
+                                             labels={"profile": name})
+            ACTIVE[name].set(1 if name == self.active else 0)
+
+    def names(self):
+        return list(self.profiles)
+
+    @property
+    def settings(self):
+        return dict(self.profiles[self.active])
+
+    def add_listener(self, callback):
+        """callback(settings) is called on every switch and once immediately."""
+        self.listeners.append(callback)
+        callback(self.settings)
+
+    def select(self, name):
+        """Switch to profile `name` and apply it everywhere."""
+        if name not in self.profiles:
+            raise ValueError(f"Unknown profile {name!r}, expected one of {self.names()}")
+        with self.lock:
+            if name == self.active:
+                return
+            self.active = name
+            self._export()
+            settings = self.settings
+        print(f"Performance profile: {name}")
+        tracing.instant("profile", "app", args={"profile": name})
+        self._save_active()
+        for callback in self.listeners:
+            try:
+                callback(settings)
+            except Exception as e:
+                print(f"Applying profile {name} failed: {e}")
@@ -0,0 +1,174 @@
+# quality_gate.py
+
+import collections
+import numpy as np
+import metrics
+from endpointing import frame_energy_db
+
+# Why a segment was gated
+TOO_SHORT = "too_short"
+LOW_VOICED = "low_voiced"
+LOW_ENERGY = "low_energy"
+NOISE_LIKE = "noise_like"
+REASONS = (TOO_SHORT, LOW_VOICED, LOW_ENERGY, NOISE_LIKE)
+
+GATED = {reason: metrics.counter("plt_gated_segments_total", "Segments not sent for recognition, by reason",
+                                 labels={"reason": reason})
+         for reason in REASONS}
+PASSED = metrics.counter("plt_gate_passed_segments_total", "Segments that passed the quality gate")
+
+# Scores of one segment; reason is None when it passed
+GateResult = collections.namedtuple("GateResult", "passed reason speech_s voiced_ratio snr_db flatness")
+
+
+class SpectralSubtractor:
+    """Lightweight noise suppression for the VAD input.
+
+    Frames are processed with 50% overlapping square-root Hann windows (one
+    FFT of two frames per frame, output delayed by half a frame). The noise
+    spectrum follows each bin's power, falling quickly and rising slowly so
+    speech barely lifts it, and `over_subtraction` times the noise power is
+    taken off each bin, keeping at least `floor` of the amplitude against
+    musical noise.
+    """
+
+    def __init__(self, frame_samples=480, over_subtraction=2.0, floor=0.1, rise=0.005, fall=0.2):
+        self.hop = frame_samples
+        self.window = np.sqrt(np.hanning(2 * frame_samples + 1)[:-1]).astype(np.float32)
+        self.over_subtraction = over_subtraction
+        self.floor = floor * floor
+        self.rise = rise
+        self.fall = fall
+        self.previous = np.zeros(frame_samples, dtype=np.float32)
+        self.overlap = np.zeros(frame_samples, dtype=np.float32)
+        self.noise = None
+
+    def process(self, frame):
+        """Denoise one frame of 16-bit PCM (bytes). Returns bytes."""
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        spectrum = np.fft.rfft(np.concatenate((self.previous, samples)) * self.window)
+        self.previous = samples
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        if self.noise is None:
+            self.noise = power.copy()
+        else:
+            self.noise += np.where(power < self.noise, self.fall, self.rise) * (power - self.noise)
+        gain = np.sqrt(np.maximum(1.0 - self.over_subtraction * self.noise / np.maximum(power, 1e-9), self.floor))
+        out = np.fft.irfft(spectrum * gain) * self.window
+        result = self.overlap + out[:self.hop]
+        self.overlap = out[self.hop:]
+        return np.clip(result, -32768, 32767).astype(np.int16).tobytes()
+
+
+def spectral_flatness(pcm, sample_rate, frame_samples=512, low_hz=300.0, high_hz=4000.0):
+    """Mean spectral flatness (geometric over arithmetic mean of the power
+    spectrum, 0 for a pure tone, about 0.56 for white noise) of the loudest
+    half of the frames, in the speech band. Voiced speech is harmonic and
+    scores low; fans, hiss, clicks and most coughs score high."""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    count = len(samples) // frame_samples
+    if count == 0:
+        return 1.0
+    frames = samples[:count * frame_samples].reshape(count, frame_samples)
+    energies = np.einsum("ij,ij->i", frames, frames)
+    loud = frames[energies >= np.median(energies)] * np.hanning(frame_samples)
+    power = np.abs(np.fft.rfft(loud, axis=1)) ** 2 + 1e-3
+    freqs = np.fft.rfftfreq(frame_samples, 1.0 / sample_rate)
+    band = power[:, (freqs >= low_hz) & (freqs <= high_hz)]
+    flatness = np.exp(np.mean(np.log(band), axis=1)) / np.mean(band, axis=1)
+    return float(np.mean(flatness))
+
+
+class UtteranceGate:
+    """Cheap check of a finished segment before it is sent for recognition.
+
+    A segment is gated when it has less than `min_speech_s` of voiced audio,
+    when voiced frames are less than `min_voiced_ratio` of it, when its loud
+    frames are less than `min_snr_db` above the endpointer's running noise
+    floor, or when its spectrum is flatter than `max_flatness` (noise rather
+    than voice). Costs one FFT per 32 ms of audio.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, min_speech_s=0.25, min_voiced_ratio=0.3, min_snr_db=10.0,
+                 max_flatness=0.4):
+        self.sample_rate = sample_rate
+        self.frame_bytes = int(sample_rate * frame_ms / 1000) * 2
+        self.min_speech_s = min_speech_s
+        self.min_voiced_ratio = min_voiced_ratio
+        self.min_snr_db = min_snr_db
+        self.max_flatness = max_flatness
+
+    def snr_db(self, pcm, noise_floor_db):
+        """Level of the loudest 10% of frames over the noise floor."""
+        energies = sorted(frame_energy_db(pcm[i:i + self.frame_bytes])
+                          for i in range(0, len(pcm) - self.frame_bytes + 1, self.frame_bytes))
+        if not energies:
+            return 0.0
+        return energies[min(int(0.9 * len(energies)), len(energies) - 1)] - (noise_floor_db or 0.0)
+
+    def check(self, segment, noise_floor_db):
+        """Score an endpointing.Segment. Returns a GateResult and counts it."""
+        voiced_ratio = segment.speech_s / segment.duration_s if segment.duration_s else 0.0
+        snr = self.snr_db(segment.pcm, noise_floor_db)
+        flatness = spectral_flatness(segment.pcm, self.sample_rate)
+        reason = None
+        if segment.speech_s < self.min_speech_s:
+            reason = TOO_SHORT
+        elif voiced_ratio < self.min_voiced_ratio:
+            reason = LOW_VOICED
+        elif snr < self.min_snr_db:
+            reason = LOW_ENERGY
+        elif flatness > self.max_flatness:
+            reason = NOISE_LIKE
+        if reason is None:
+            PASSED.inc()
+        else:
+            GATED[reason].inc()
+        return GateResult(reason is None, reason, segment.speech_s, round(voiced_ratio, 2), round(snr, 1),
+                          round(flatness, 3))
+
+
+def evaluate(sessions, frame_ms=30, **gate_settings):
+    """Recognition requests with and without the gate (and with the spectral
+    subtractor in front of the VAD) on recorded sessions. Sessions with a
+    label file (see endpointing.read_labels) also report the segments that
+    held speech but were gated."""
+    import os
+    import endpointing
+    print(f"{'setup':<16}{'requests':>9}{'gated':>7}{'speech lost':>13}{'noise sent':>12}")
+    for name, gate, denoise in (("no gate", False, False), ("gate", True, False), ("gate + denoise", True, True)):
+        requests = gated = lost = noise = 0
+        labelled = False
+        for path in sessions:
+            pcm, rate = endpointing.read_wav(path)
+            label_path = os.path.splitext(path)[0] + ".txt"
+            labels = endpointing.read_labels(label_path) if os.path.exists(label_path) else None
+            labelled = labelled or labels is not None
+            quality = UtteranceGate(rate, frame_ms, **gate_settings)
+            endpointer = endpointing.Endpointer(
+                rate, frame_ms, preprocess=SpectralSubtractor(int(rate * frame_ms / 1000)).process if denoise else None)
+            frame_bytes = int(rate * frame_ms / 1000) * 2
+            for index in range(len(pcm) // frame_bytes):
+                for event, data in endpointer.process(pcm[index * frame_bytes:(index + 1) * frame_bytes]):
+                    if event != endpointing.SEGMENT:
+                        continue
+                    end = (index + 1) * frame_ms / 1000.0 - data.trailing_s
+                    start = end - data.duration_s
+                    speech = labels is not None and any(s < end and e > start for s, e in labels)
+                    if gate and not quality.check(data, endpointer.noise_floor).passed:
+                        gated += 1
+                        lost += speech
+                        continue
+                    requests += 1
+                    noise += labels is not None and not speech
+        lost_text = str(lost) if labelled else "-"
+        noise_text = str(noise) if labelled else "-"
+        print(f"{name:<16}{requests:>9}{gated:>7}{lost_text:>13}{noise_text:>12}")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 3 and sys.argv[1] == "eval":
+        evaluate(sys.argv[2:])
+    else:
+        print("usage: quality_gate.py eval <session.wav> [...]")
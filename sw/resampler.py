@@ -0,0 +1,247 @@
+# resampler.py
+
+import math
+import os
+import time
+import numpy as np
+
+# PLT_CAPTURE_RATE=native (default) captures at the microphone's own rate and
+# resamples here; a number (e.g. 16000) opens the device at that rate and
+# leaves any conversion to the ALSA/Pulse plug layer as before
+CAPTURE_RATE = os.environ.get("PLT_CAPTURE_RATE", "native")
+
+
+class PolyphaseResampler:
+    """Streaming rational resampler (e.g. 48000 -> 16000 or 44100 -> 16000).
+
+    A Kaiser-windowed sinc low-pass is split into `up` phases of `taps`
+    coefficients each. Every output sample is one dot product of `taps` input
+    samples with the phase it falls on, so a whole block is a single gather
+    and einsum. The last taps - 1 input samples and the output position are
+    kept between calls, so blocks of any size give the same output as one
+    long call. Latency is taps / 2 input samples.
+    """
+
+    def __init__(self, in_rate, out_rate=16000, taps=64, rolloff=0.95, beta=7.0):
+        g = math.gcd(int(in_rate), int(out_rate))
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        self.taps = taps
+        # Cutoff at `rolloff` of the lower Nyquist frequency, in cycles per upsampled sample
+        cutoff = 0.5 * rolloff / max(self.up, self.down)
+        length = taps * self.up
+        t = np.arange(length) - (length - 1) / 2.0
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(length, beta) * self.up
+        # bank[phase, k] multiplies the input sample k steps back
+        self.bank = h.reshape(taps, self.up).T.astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.offset = -(self.taps - 1)  # Input index of history[0]
+        self.position = 0  # Upsampled index of the next output sample
+        self.back = np.arange(self.taps)
+
+    def process(self, samples):
+        """Resample a block of mono samples (int16 or float). Returns float32."""
+        buffer = np.concatenate((self.history, np.asarray(samples, dtype=np.float32).ravel()))
+        last = self.offset + len(buffer) - 1
+        count = (last * self.up + self.up - 1 - self.position) // self.down + 1
+        if count > 0:
+            positions = self.position + self.down * np.arange(count)
+            base = positions // self.up - self.offset
+            window = buffer[base[:, None] - self.back]
+            out = np.einsum("ij,ij->i", window, self.bank[positions % self.up])
+            self.position += self.down * count
+        else:
+            out = np.zeros(0, dtype=np.float32)
+        keep = len(buffer) - (self.taps - 1)
+        self.history = buffer[keep:]
+        self.offset += keep
+        return out
+
+    def process_int16(self, samples):
+        """Resample 16-bit PCM samples and return 16-bit samples."""
+        return np.clip(np.rint(self.process(samples)), -32768, 32767).astype(np.int16)
+
+
+def resampler_delay(in_rate, out_rate=16000, **settings):
+    """Group delay of PolyphaseResampler in seconds."""
+    resampler = PolyphaseResampler(in_rate, out_rate, **settings)
+    return (resampler.taps * resampler.up - 1) / 2.0 / (in_rate * resampler.up)
+
+
+def linear_resample(samples, in_rate, out_rate):
+    """Linear interpolation, like ALSA's default plug rate converter."""
+    positions = np.arange(int(len(samples) * out_rate / in_rate)) * (in_rate / out_rate)
+    return np.interp(positions, np.arange(len(samples)), np.asarray(samples, dtype=np.float64))
+
+
+def native_input_settings(device=None, dtype="int16"):
+    """(rate, channels) the input device runs at natively. Mono is used when
+    the device offers it, otherwise its channels are mixed down."""
+    import sounddevice as sd
+    info = sd.query_devices(device, "input")
+    rate = int(info["default_samplerate"])
+    try:
+        sd.check_input_settings(device=device, samplerate=rate, channels=1, dtype=dtype)
+        channels = 1
+    except Exception:
+        channels = int(info["max_input_channels"])
+    return rate, channels
+
+
+class ResamplingInputStream:
+    """sounddevice.InputStream look-alike that captures at the device's native
+    rate and delivers 16-bit mono at `samplerate`. The device is read in
+    fixed-size blocks of `block_ms`; read(frames) returns ((frames, 1) int16,
+    overflowed) like sd.InputStream.read, so the VAD and recognition code
+    does not change."""
+
+    def __init__(self, samplerate=16000, device=None, block_ms=30, native_rate=None, native_channels=None):
+        import sounddevice as sd
+        rate, channels = native_input_settings(device)
+        self.native_rate = native_rate or rate
+        self.native_channels = native_channels or channels
+        self.samplerate = samplerate
+        self.block = int(self.native_rate * block_ms / 1000)
+        self.resampler = PolyphaseResampler(self.native_rate, samplerate)
+        self.pending = np.zeros(0, dtype=np.int16)
+        self.stream = sd.InputStream(samplerate=self.native_rate, channels=self.native_channels, dtype="int16",
+                                     device=device)
+        print(f"Capturing at {self.native_rate} Hz x{self.native_channels}, resampled to {samplerate} Hz")
+
+    def read(self, frames):
+        overflowed = False
+        while len(self.pending) < frames:
+            audio, overflow = self.stream.read(self.block)
+            overflowed = overflowed or overflow
+            if self.native_channels > 1:
+                audio = audio.mean(axis=1)
+            self.pending = np.concatenate((self.pending, self.resampler.process_int16(audio)))
+        out, self.pending = self.pending[:frames], self.pending[frames:]
+        return out.reshape(-1, 1), overflowed
+
+    def start(self):
+        self.stream.start()
+
+    def stop(self):
+        self.stream.stop()
+
+    def abort(self):
+        self.stream.abort()
+
+    def close(self):
+        self.stream.close()
+        self.pending = np.zeros(0, dtype=np.int16)
+        self.resampler.reset()
+
+    @property
+    def active(self):
+        return self.stream.active
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        self.close()
+
+
+def open_input_stream(samplerate=16000, channels=1, device=None, capture_rate=CAPTURE_RATE):
+    """The microphone stream for capture: at the native rate with in-process
+    resampling when the device does not run at `samplerate`, otherwise a
+    plain sd.InputStream."""
+    import sounddevice as sd
+    rate = samplerate
+    if capture_rate == "native":
+        try:
+            rate, _ = native_input_settings(device)
+        except Exception as e:
+            print(f"Could not query the input device ({e}); capturing at {samplerate} Hz")
+    else:
+        rate = int(capture_rate)
+    if rate != samplerate:
+        return ResamplingInputStream(samplerate, device, native_rate=rate)
+    return sd.InputStream(samplerate=samplerate, channels=channels, dtype="int16", device=device)
+
+
+def _tones(rate, seconds, frequencies, amplitude=6000.0):
+    t = np.arange(int(rate * seconds)) / rate
+    return sum(amplitude * np.sin(2 * np.pi * f * t) for f in frequencies)
+
+
+def _band_db(signal, rate, low, high):
+    spectrum = np.abs(np.fft.rfft(signal * np.hanning(len(signal)))) ** 2
+    freqs = np.fft.rfftfreq(len(signal), 1.0 / rate)
+    return 10 * np.log10(spectrum[(freqs >= low) & (freqs < high)].sum() + 1e-12)
+
+
+def benchmark(in_rates=(48000, 44100), out_rate=16000, seconds=30.0, block_ms=30):
+    """CPU per audio second and quality of the polyphase resampler against
+    linear interpolation (the plug layer's default converter).
+
+    Quality: in-band tones (300 Hz-6 kHz) against the error to the exact
+    tones at the output rate, and how much of a 12 kHz tone (above the new
+    Nyquist frequency) aliases into the output."""
+    in_band = (300.0, 1000.0, 3100.0, 6000.0)
+    print(f"{'input':>7}  {'method':<10}{'cpu ms/s':>9}{'x realtime':>12}{'SNR dB':>8}{'alias dB':>10}")
+    for rate in in_rates:
+        signal = _tones(rate, seconds, in_band)
+        alias_tone = _tones(rate, 2.0, (12000.0,))
+        block = int(rate * block_ms / 1000)
+
+        def polyphase(x):
+            resampler = PolyphaseResampler(rate, out_rate)
+            return np.concatenate([resampler.process(x[i:i + block]) for i in range(0, len(x), block)])
+
+        def linear(x):
+            return linear_resample(x, rate, out_rate)
+
+        for name, method in (("polyphase", polyphase), ("linear", linear)):
+            started = time.process_time()
+            out = method(signal)
+            cpu = time.process_time() - started
+            delay = resampler_delay(rate, out_rate) if name == "polyphase" else 0.0
+            t = np.arange(len(out)) / out_rate - delay
+            reference = sum(6000.0 * np.sin(2 * np.pi * f * t) for f in in_band)
+            core = slice(out_rate // 10, len(out) - out_rate // 10)  # Skip the edges
+            error = out[core] - reference[core]
+            snr = 10 * np.log10(np.sum(reference[core] ** 2) / max(np.sum(error ** 2), 1e-12))
+            aliased = method(alias_tone)[out_rate // 10:]
+            alias = _band_db(aliased, out_rate, 0, out_rate / 2) - _band_db(alias_tone, rate, 11500, 12500)
+            print(f"{rate:>7}  {name:<10}{cpu / seconds * 1000:>9.2f}{seconds / max(cpu, 1e-9):>12.0f}"
+                  f"{snr:>8.1f}{alias:>10.1f}")
+
+
+def benchmark_capture(seconds=10.0, samplerate=16000, device=None):
+    """On the device: process CPU time while capturing through the plug
+    layer at `samplerate` against native-rate capture with in-process
+    resampling (alsa-lib's converter runs in our process, so both show up)."""
+    import sounddevice as sd
+    frames = int(samplerate * 0.03)
+    for name, open_stream in (("plug", lambda: sd.InputStream(samplerate=samplerate, channels=1, dtype="int16",
+                                                              device=device)),
+                              ("native", lambda: ResamplingInputStream(samplerate, device))):
+        try:
+            stream = open_stream()
+        except Exception as e:
+            print(f"{name:<7} could not open the stream: {e}")
+            continue
+        with stream:
+            started, cpu_started = time.monotonic(), time.process_time()
+            while time.monotonic() - started < seconds:
+                stream.read(frames)
+            cpu = time.process_time() - cpu_started
+        print(f"{name:<7} {cpu / seconds * 1000:.1f} ms CPU per second of audio")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "capture":
+        benchmark_capture(float(sys.argv[2]) if len(sys.argv) > 2 else 10.0)
+    else:
+        benchmark()
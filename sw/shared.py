@@ -1,3 +1,13 @@
-latest_frame = None
-mode = "SPEECH"
-ui_mode = "CAMERA"
+# shared.py
+# Shared device state. Values are pushed to subscribers instead of being polled.
+
+from state_store import StateStore, Field
+
+state = StateStore([
+    Field("latest_frame", object, None),                            # Annotated camera frame for the UI
+    Field("mode", str, "SPEECH", choices=("SPEECH", "ASL")),        # Operating mode
+    Field("ui_mode", str, "TEXT", choices=("CAMERA", "TEXT")),      # What the translation tab shows (TEXT in SPEECH mode)
+    Field("translator_active", bool, True),                         # Speech translation loop enabled
+    Field("vad_active", bool, True),                                # VAD collector allowed to run
+    Field("listening", bool, False),                                # A VAD collector is currently running
+])
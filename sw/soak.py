@@ -0,0 +1,189 @@
+# soak.py
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+
+# Latency histograms whose windowed p95 is tracked for drift
+LATENCIES = ("plt_mediapipe_seconds", "plt_tflite_seconds", "plt_ui_frame_seconds", "plt_recognize_seconds",
+             "plt_translate_seconds", "plt_tts_first_audio_seconds")
+
+# Drift that is reported as a likely leak or degradation
+LIMITS = {
+    "rss_mb": 10.0,       # MB per hour
+    "threads": 0.5,       # Threads per hour
+    "fds": 1.0,           # Open descriptors per hour
+    "fps": -0.10,         # Relative change, last quarter against first quarter
+    "latency": 0.25,      # Relative change of a p95, last quarter against first quarter
+}
+
+
+def _proc_status(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb():
+    kb = _proc_status("VmRSS")
+    return round(kb / 1024.0, 2) if kb is not None else None
+
+
+def open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def _slope(times, values):
+    """Least-squares slope of values over times."""
+    points = [(t, v) for t, v in zip(times, values) if v is not None]
+    if len(points) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(v for _, v in points) / len(points)
+    spread = sum((t - mean_t) ** 2 for t, _ in points)
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / spread if spread else 0.0
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+class SoakMonitor:
+    """Samples the process every `interval` seconds while the app runs:
+    resident memory, Python and OS thread counts, open file descriptors,
+    the ASL frame rate and the p95 of the latency histograms over the last
+    interval. Rows are appended to a CSV as they are taken, so a crashed run
+    still leaves its data."""
+
+    def __init__(self, output="soak.csv", interval=60.0, latencies=LATENCIES):
+        import metrics
+        self.output = output
+        self.interval = interval
+        self.latencies = latencies
+        self.columns = (["elapsed_s", "rss_mb", "threads", "os_threads", "fds", "fps"]
+                        + [name[len("plt_"):-len("_seconds")] + "_p95_ms" for name in latencies])
+        self.summary = metrics.SummaryWriter(os.devnull, interval)
+        self.rows = []
+        self.started = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="soak_monitor", daemon=True)
+
+    def start(self):
+        self.started = time.monotonic()
+        with open(self.output, "w", newline="") as f:
+            csv.writer(f).writerow(self.columns)
+        self.summary.summarize()  # Baseline for the first window
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        values = self.summary.summarize()["metrics"]
+        row = [round(time.monotonic() - self.started, 1), rss_mb(), threading.active_count(),
+               _proc_status("Threads"), open_fds(), values.get("plt_asl_fps")]
+        for name in self.latencies:
+            p95 = values.get(name, {}).get("window_p95") if values.get(name, {}).get("window_count") else None
+            row.append(round(p95 * 1000, 1) if p95 is not None else None)
+        self.rows.append(row)
+        with open(self.output, "a", newline="") as f:
+            csv.writer(f).writerow(row)
+        print(f"soak {row[0] / 3600:.2f} h: RSS {row[1]} MB, {row[2]} threads ({row[3]} OS), {row[4]} fds, "
+              f"{row[5]} fps")
+        return row
+
+    def report(self):
+        """Drift over the run: per-hour slopes of memory, threads and
+        descriptors, and the change of fps and latencies between the first and
+        last quarter of the samples. Returns the report with the exceeded
+        LIMITS under "flags"."""
+        report = {"samples": len(self.rows), "hours": 0.0, "slopes_per_hour": {}, "quarters": {}, "flags": []}
+        if len(self.rows) < 4:
+            print(f"soak: {len(self.rows)} samples, too few to measure drift")
+            return report
+        hours = [row[0] / 3600.0 for row in self.rows]
+        report["hours"] = round(hours[-1], 2)
+        quarter = len(self.rows) // 4
+        for index, column in enumerate(self.columns[1:], 1):
+            values = [row[index] for row in self.rows]
+            if column in ("rss_mb", "threads", "os_threads", "fds"):
+                slope = _slope(hours, values)
+                report["slopes_per_hour"][column] = round(slope, 3)
+                limit = LIMITS[column if column != "os_threads" else "threads"]
+                if slope > limit:
+                    report["flags"].append(f"{column} grows {slope:.2f}/h (limit {limit})")
+                continue
+            first, last = _mean(values[:quarter]), _mean(values[-quarter:])
+            if not first or last is None:
+                continue
+            change = (last - first) / first
+            report["quarters"][column] = {"first": round(first, 2), "last": round(last, 2),
+                                          "change": round(change, 3)}
+            if column == "fps" and change < LIMITS["fps"]:
+                report["flags"].append(f"fps fell {first:.1f} -> {last:.1f}")
+            elif column != "fps" and change > LIMITS["latency"]:
+                report["flags"].append(f"{column} rose {first:.1f} -> {last:.1f} ms")
+        print(f"soak: {report['samples']} samples over {report['hours']} h")
+        for column, slope in report["slopes_per_hour"].items():
+            print(f"  {column:<22}{slope:>+10.3f} /h")
+        for column, change in report["quarters"].items():
+            print(f"  {column:<22}{change['first']:>10} -> {change['last']:<10}{change['change']:>+8.1%}")
+        for flag in report["flags"]:
+            print(f"  DRIFT: {flag}")
+        if not report["flags"]:
+            print("  no drift above the limits")
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the full app headless for hours and track resource and "
+                                                 "latency drift.")
+    parser.add_argument("--hours", type=float, default=4.0)
+    parser.add_argument("--interval", type=float, default=60.0, help="Seconds between samples")
+    parser.add_argument("--output", default="soak.csv", help="Samples; the drift report goes next to it as .json")
+    parser.add_argument("--toggle-every", type=float, default=120.0,
+                        help="Seconds between simulated mode button presses (0 stays in speech mode)")
+    parser.add_argument("--device", action="store_true", help="Use the real hardware instead of the simulation")
+    args = parser.parse_args(argv)
+
+    # Must be set before main.py (and with it hal.py and Qt) is imported
+    if not args.device:
+        os.environ["PLT_HAL"] = "sim"
+        if "PLT_SIM_BUTTONS" not in os.environ and args.toggle_every > 0:
+            os.environ["PLT_SIM_BUTTONS"] = json.dumps([{"every": args.toggle_every, "pin": 4}])
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import main as app
+
+    monitor = SoakMonitor(args.output, args.interval)
+    monitor.start()
+    try:
+        exit_code = app.main(duration_s=args.hours * 3600.0)
+    finally:
+        monitor.stop()
+        monitor.sample()
+        report = monitor.report()
+        with open(os.path.splitext(args.output)[0] + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["flags"] else exit_code
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,291 @@
+# speculative.py
+
+import collections
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import metrics
+import tracing
+from backends import stable_text
+from deadlines import Deadline
+
+SPECULATIONS = {outcome: metrics.counter("plt_speculation_total", "Utterances by speculation outcome",
+                                         labels={"outcome": outcome})
+                for outcome in ("hit", "miss")}
+SPECULATIVE_REQUESTS = metrics.counter("plt_speculative_requests_total", "Speculative translation requests sent")
+WASTED_REQUESTS = metrics.counter("plt_speculative_wasted_requests_total", "Speculative requests whose result was discarded")
+SAVED_SECONDS = metrics.histogram("plt_speculation_saved_seconds", "Latency saved by a speculation hit")
+
+# Result of one speculative translation (and synthesis when enabled)
+SpeculationResult = collections.namedtuple("SpeculationResult", "text target translation audio duration")
+
+
+def normalize(text):
+    """Comparison key: lower case, no punctuation, single spaces."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+class Utterance:
+    """Speculation state of one utterance: its requests in flight, keyed by
+    (normalized text, target), and how many it has sent. Owned by the
+    StreamingSession of the segment, so the next segment can start
+    speculating while this one is still being resolved."""
+
+    def __init__(self):
+        self.pending = {}  # (normalized text, target) -> Future
+        self.requests = 0
+        self.last_key = None
+
+
+class SpeculativeTranslator:
+    """Translates (and optionally synthesizes) the stable prefix of interim
+    transcripts before the speaker has finished.
+
+    consider() is fed the stable text of every interim result. Once it has at
+    least `min_words` words and has grown since the last speculation, a
+    translation is started in the background; a speculation that has not
+    started yet when a longer prefix arrives is cancelled for free. When the
+    final transcript is known, resolve() returns the speculation that matches
+    it exactly (same text and target language) or None, in which case the
+    caller translates as usual. Each utterance keeps its own speculations (see
+    Utterance), so overlapping segments do not discard each other's.
+
+    Cost is capped with `max_requests` speculative requests per utterance and
+    `max_chars_per_minute` characters sent speculatively.
+    """
+
+    def __init__(self, translate, target_for, synthesize=None, stability=0.8, min_words=2,
+                 max_requests=3, max_chars_per_minute=2000, workers=2):
+        self.translate = translate  # translate(text, target, source) -> translated text
+        self.target_for = target_for  # target_for(language) -> target language or None
+        self.synthesize = synthesize  # synthesize(translation, target) -> (pcm, rate)
+        self.stability = stability
+        self.min_words = min_words
+        self.max_requests = max_requests
+        self.max_chars_per_minute = max_chars_per_minute
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculative")
+
+        self.lock = threading.Lock()
+        self.sent_chars = collections.deque()  # (time, chars) over the last minute
+
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self.saved = 0.0
+
+    def begin(self):
+        """Start a new utterance. Returns its Utterance state."""
+        return Utterance()
+
+    def discard(self, utterance):
+        """Drop the speculations of an utterance that will not be resolved."""
+        with self.lock:
+            self._discard(utterance)
+
+    def _discard(self, utterance, keep=None):
+        for key, future in utterance.pending.items():
+            if key == keep:
+                continue
+            if future.cancel():
+                utterance.requests -= 1  # Never sent
+            else:
+                self.wasted += 1
+                WASTED_REQUESTS.inc()
+        utterance.pending = {}
+
+    def _chars_in_last_minute(self, now):
+        while self.sent_chars and now - self.sent_chars[0][0] > 60.0:
+            self.sent_chars.popleft()
+        return sum(chars for _, chars in self.sent_chars)
+
+    def consider(self, text, language, utterance):
+        """Feed the stable text of an interim result of `utterance`."""
+        key = normalize(text)
+        if len(key.split()) < self.min_words:
+            return
+        target = self.target_for(language)
+        if target is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if (key, target) == utterance.last_key or utterance.requests >= self.max_requests:
+                return
+            if self._chars_in_last_minute(now) + len(text) > self.max_chars_per_minute:
+                return
+            # A longer prefix supersedes the previous speculation if it has not started
+            for old_key, future in list(utterance.pending.items()):
+                if future.cancel():
+                    del utterance.pending[old_key]
+                    utterance.requests -= 1
+            utterance.requests += 1
+            utterance.last_key = (key, target)
+            self.sent_chars.append((now, len(text)))
+            utterance.pending[(key, target)] = self.executor.submit(self._run, text, target, language)
+        SPECULATIVE_REQUESTS.inc()
+
+    def consider_partial(self, prefix, partial, utterance):
+        """Feed an interim Partial; `prefix` is the text already finalized in this stream."""
+        stable = stable_text(partial, self.stability)
+        text = (prefix + " " + stable).strip()
+        if stable:
+            self.consider(text, partial.language, utterance)
+
+    def _run(self, text, target, source):
+        start = time.perf_counter()
+        with tracing.span("speculative_translate", "speech", args={"chars": len(text)}):
+            translation = self.translate(text, target, source)
+            audio = self.synthesize(translation, target) if self.synthesize is not None else None
+        return SpeculationResult(text, target, translation, audio, time.perf_counter() - start)
+
+    def resolve(self, final_text, target, utterance, deadline=None, token=None):
+        """Return the SpeculationResult of `utterance` matching the final transcript,
+        or None. Waits for it until `deadline` (a deadlines.Deadline, 10 s without
+        one); raises Cancelled when `token` is cancelled meanwhile."""
+        deadline = deadline or Deadline(10.0)
+        key = (normalize(final_text), target)
+        with self.lock:
+            future = utterance.pending.get(key)
+            self._discard(utterance, keep=key)
+        result = None
+        if future is not None:
+            wait_start = time.perf_counter()
+            while not future.done() and not deadline.expired():
+                if token is not None:
+                    token.check()
+                wait([future], timeout=min(0.05, deadline.remaining()))
+            if future.done():
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Speculative translation failed: {e}")
+            else:
+                future.cancel()
+                print("Speculative translation timed out")
+            waited = time.perf_counter() - wait_start
+        if result is None:
+            self.misses += 1
+            SPECULATIONS["miss"].inc()
+            return None
+        # Without speculation the whole request would have started now
+        saved = max(result.duration - waited, 0.0)
+        self.hits += 1
+        self.saved += saved
+        SPECULATIONS["hit"].inc()
+        SAVED_SECONDS.observe(saved)
+        return result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "wasted_requests": self.wasted,
+            "saved_s": self.saved,
+            "mean_saved_s": self.saved / self.hits if self.hits else None,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class StreamingSession:
+    """Streams one speech segment to a recognizer while it is being captured and
+    feeds interim results to a SpeculativeTranslator.
+
+    feed() takes audio as it is captured; finish() ends the audio and returns
+    the final transcript and the language reported by the recognizer.
+    """
+
+    def __init__(self, recognizer, speculator, sample_rate, language_code, alternative_language_codes=()):
+        self.recognizer = recognizer
+        self.speculator = speculator
+        self.args = (sample_rate, language_code, alternative_language_codes)
+        self.audio = queue.Queue()
+        self.finals = []
+        self.language = None
+        self.error = None
+        self.utterance = None  # Speculation state of this segment, see resolve()
+        self.thread = threading.Thread(target=self._run, name="streaming_recognize", daemon=True)
+
+    def start(self):
+        self.utterance = self.speculator.begin()
+        self.thread.start()
+
+    def feed(self, chunk):
+        self.audio.put(chunk)
+
+    def _chunks(self):
+        while True:
+            chunk = self.audio.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    def _run(self):
+        try:
+            for partial in self.recognizer.stream(self._chunks(), *self.args):
+                self.language = partial.language or self.language
+                if partial.is_final:
+                    self.finals.append(partial.segments[0][0].strip())
+                else:
+                    self.speculator.consider_partial(" ".join(self.finals), partial, self.utterance)
+        except Exception as e:
+            self.error = e
+
+    def finish(self, deadline=None, token=None):
+        """End the audio and wait for the final transcript until `deadline` (a
+        deadlines.Deadline, 10 s without one). Returns (transcript, language); the
+        transcript is None if streaming failed or timed out. Raises Cancelled when
+        `token` is cancelled meanwhile."""
+        deadline = deadline or Deadline(10.0)
+        self.audio.put(None)
+        while self.thread.is_alive() and not deadline.expired():
+            if token is not None:
+                token.check()
+            self.thread.join(min(0.05, deadline.remaining()))
+        if self.thread.is_alive() or self.error is not None:
+            print(f"Streaming recognition failed: {self.error or 'timed out'}")
+            return None, self.language
+        return " ".join(self.finals).strip(), self.language
+
+    def resolve(self, final_text, target, deadline=None, token=None):
+        """The speculation of this segment matching its final transcript, or None."""
+        return self.speculator.resolve(final_text, target, self.utterance, deadline, token)
+
+    def abort(self):
+        self.audio.put(None)
+        if self.utterance is not None:
+            self.speculator.discard(self.utterance)
+
+
+def simulate(script_path, translate_delay=0.4, chunk_interval=0.03, **kwargs):
+    """Replay a ScriptedRecognizer script against a fake translator with a fixed
+    delay and print the hit rate and latency saved."""
+    from backends import ScriptedRecognizer
+
+    recognizer = ScriptedRecognizer.from_file(script_path, chunks_per_partial=10)
+
+    def fake_translate(text, target, source):
+        time.sleep(translate_delay)
+        return f"[{target}] {text}"
+
+    speculator = SpeculativeTranslator(fake_translate, lambda language: "es", **kwargs)
+    for _ in range(len(recognizer.utterances)):
+        session = StreamingSession(recognizer, speculator, 16000, "en-US")
+        session.start()
+        for _ in range(60):  # 1.8 s of 30 ms frames
+            session.feed(b"\0" * 960)
+            time.sleep(chunk_interval)
+        transcript, _ = session.finish()
+        result = session.resolve(transcript, "es")
+        print(f"{'hit ' if result else 'miss'} {transcript}")
+    print(speculator.stats())
+    speculator.shutdown()
+
+
+if __name__ == "__main__":
+    import sys
+    simulate(sys.argv[1])
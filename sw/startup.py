@@ -0,0 +1,114 @@
+# startup.py
+
+import contextlib
+import importlib
+import resource
+import sys
+import threading
+import time
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StartupProfile:
+    """Records import and init time for each subsystem plus peak RSS."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.entries = []  # (subsystem, phase, seconds, peak_rss_mb, offset_s)
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(self, subsystem, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.entries.append((subsystem, phase, end - start, peak_rss_mb(), end - self.t0))
+
+    def timed_import(self, subsystem, module_name):
+        """Import a module and record how long it took."""
+        with self.measure(subsystem, "import"):
+            return importlib.import_module(module_name)
+
+    def mark(self, name):
+        """Record a milestone (e.g. window shown, first translation)."""
+        with self.lock:
+            self.entries.append((name, "mark", 0.0, peak_rss_mb(), time.perf_counter() - self.t0))
+
+    def report(self):
+        with self.lock:
+            entries = list(self.entries)
+        lines = ["Startup profile:",
+                 f"  {'subsystem':<22}{'phase':<8}{'time (ms)':>10}{'at (ms)':>10}{'peak RSS (MB)':>15}"]
+        for subsystem, phase, seconds, rss, offset in entries:
+            lines.append(f"  {subsystem:<22}{phase:<8}{seconds * 1000:>10.1f}{offset * 1000:>10.1f}{rss:>15.1f}")
+        lines.append(f"  peak RSS: {peak_rss_mb():.1f} MB")
+        text = "\n".join(lines)
+        print(text)
+        return text
+
+
+class StagedStartup:
+    """Runs initialisation stages one after another on a background thread.
+
+    Stages are (name, function) pairs run in the order given, so the most
+    important subsystem should come first. Each stage is recorded in the profile
+    with its total time; imports inside it can be recorded separately with
+    timed_import(). A failing stage is reported and the remaining stages still run.
+    """
+
+    def __init__(self, profile, stages, on_done=None):
+        self.profile = profile
+        self.stages = stages
+        self.on_done = on_done
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.done = threading.Event()
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        for name, function in self.stages:
+            try:
+                with self.profile.measure(name, "stage"):
+                    function()
+            except Exception as e:
+                print(f"Startup stage '{name}' failed: {e}")
+        self.done.set()
+        if self.on_done is not None:
+            self.on_done()
+
+
+def load_tflite_interpreter(model_path, num_threads=None, profile=None):
+    """Create a TFLite interpreter, preferring the lightweight tflite_runtime package
+    over full TensorFlow.
+
+    Models converted with SELECT_TF_OPS (see convert.py) need the Flex delegate,
+    which only ships with TensorFlow, so a model tflite_runtime cannot allocate
+    falls back to tf.lite.
+    """
+    profile = profile or StartupProfile()
+    try:
+        with profile.measure("tflite_runtime", "import"):
+            from tflite_runtime.interpreter import Interpreter
+        interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        interpreter.allocate_tensors()
+        return interpreter
+    except ImportError:
+        pass
+    except (RuntimeError, ValueError) as e:
+        print(f"tflite_runtime could not load the model ({e}); falling back to TensorFlow.")
+
+    with profile.measure("tensorflow", "import"):
+        import tensorflow as tf
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    return interpreter
@@ -0,0 +1,141 @@
+# state_store.py
+
+import queue
+import threading
+import time
+
+
+class Field:
+    """Declaration of one typed value held by the StateStore."""
+
+    def __init__(self, name, kind, default, choices=None):
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.choices = choices
+
+    def validate(self, value):
+        if self.kind is not object and value is not None and not isinstance(value, self.kind):
+            raise TypeError(f"{self.name} must be {self.kind.__name__}, got {type(value).__name__}")
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"{self.name} must be one of {self.choices}, got {value!r}")
+        return value
+
+
+class StateStore:
+    """Small thread-safe state container with atomic updates and change subscriptions.
+
+    Subscribers are called as callback(changes, timestamp) on the thread that made
+    the change, where changes maps field name -> new value and timestamp is the
+    time.monotonic() of the change. Worker threads can block on wait_for() or read
+    changes from a queue returned by subscribe_queue().
+    """
+
+    def __init__(self, fields):
+        self.fields = {field.name: field for field in fields}
+        self.values = {field.name: field.default for field in fields}
+        self.changed_at = {field.name: None for field in fields}
+        self.subscribers = []
+        self.cond = threading.Condition()
+
+    def get(self, name):
+        with self.cond:
+            return self.values[name]
+
+    def snapshot(self):
+        with self.cond:
+            return dict(self.values)
+
+    def set(self, name, value):
+        self.update(**{name: value})
+
+    def update(self, **values):
+        """Set several fields atomically. Only fields whose value changed are notified."""
+        with self.cond:
+            changes = self._apply(values)
+            timestamp = time.monotonic()
+            for name in changes:
+                self.changed_at[name] = timestamp
+            if changes:
+                self.cond.notify_all()
+            subscribers = list(self.subscribers)
+        if changes:
+            self._notify(subscribers, changes, timestamp)
+        return changes
+
+    def transition(self, name, expected, new, **also):
+        """Compare-and-set: change `name` from `expected` to `new` (plus any extra
+        fields) only if it currently equals `expected`. Returns True on success."""
+        with self.cond:
+            if self.values[name] != expected:
+                return False
+            values = dict(also)
+            values[name] = new
+            changes = self._apply(values)
+            timestamp = time.monotonic()
+            for field in changes:
+                self.changed_at[field] = timestamp
+            self.cond.notify_all()
+            subscribers = list(self.subscribers)
+        if changes:
+            self._notify(subscribers, changes, timestamp)
+        return True
+
+    def wait_for(self, name, value, timeout=None):
+        """Block until `name` equals `value`. Returns False on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.values[name] == value, timeout)
+
+    def subscribe(self, callback, fields=None):
+        """Call callback(changes, timestamp) whenever one of `fields` (default: all) changes."""
+        entry = (callback, set(fields) if fields else None)
+        with self.cond:
+            self.subscribers.append(entry)
+        return entry
+
+    def subscribe_queue(self, fields=None, maxsize=0):
+        """Deliver (changes, timestamp) tuples to a queue for a worker thread to consume."""
+        changes_queue = queue.Queue(maxsize=maxsize)
+
+        def enqueue(changes, timestamp):
+            try:
+                changes_queue.put_nowait((changes, timestamp))
+            except queue.Full:
+                pass
+        self.subscribe(enqueue, fields)
+        return changes_queue
+
+    def unsubscribe(self, entry):
+        with self.cond:
+            if entry in self.subscribers:
+                self.subscribers.remove(entry)
+
+    def _apply(self, values):
+        changes = {}
+        for name, value in values.items():
+            if name not in self.fields:
+                raise KeyError(f"Unknown state field: {name}")
+            field = self.fields[name]
+            value = field.validate(value)
+            # Opaque values (e.g. frames) are compared by identity
+            if field.kind is object:
+                changed = self.values[name] is not value
+            else:
+                changed = self.values[name] != value
+            if changed:
+                self.values[name] = value
+                changes[name] = value
+        return changes
+
+    def _notify(self, subscribers, changes, timestamp):
+        for callback, fields in subscribers:
+            if fields is None:
+                selected = changes
+            else:
+                selected = {name: value for name, value in changes.items() if name in fields}
+            if not selected:
+                continue
+            try:
+                callback(selected, timestamp)
+            except Exception as e:
+                print(f"Error in state subscriber: {e}")
@@ -0,0 +1,186 @@
+# tracing.py
+
+import itertools
+import json
+import os
+import threading
+import time
+
+# Event phases (Chrome trace event format)
+BEGIN = "B"
+END = "E"
+INSTANT = "i"
+ASYNC_BEGIN = "b"
+ASYNC_END = "e"
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, cat, trace_id, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.trace_id = trace_id
+        self.args = args
+
+    def __enter__(self):
+        self.tracer.record(BEGIN, self.name, self.cat, self.trace_id, self.args)
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(END, self.name, self.cat, self.trace_id, None)
+        return False
+
+
+class Tracer:
+    """Records spans and instant events into a preallocated ring buffer.
+
+    Every call returns immediately while tracing is disabled, so instrumentation
+    can stay on hot paths. When the buffer is full the oldest events are
+    overwritten. Events carry an optional correlation ID (see new_id()) that
+    ties together the spans of one utterance or one gesture window across
+    threads; export() writes Chrome trace JSON that Perfetto and
+    chrome://tracing can open.
+    """
+
+    def __init__(self, capacity=65536, enabled=False):
+        self.capacity = capacity
+        self.events = [None] * capacity
+        self.counter = itertools.count()  # next() is atomic under the GIL
+        self.written = 0
+        self.ids = itertools.count(1)
+        self.thread_names = {}
+        self.enabled = enabled
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events = [None] * self.capacity
+        self.counter = itertools.count()
+        self.written = 0
+
+    def new_id(self):
+        return next(self.ids)
+
+    def record(self, phase, name, cat="", trace_id=None, args=None):
+        if not self.enabled:
+            return
+        tid = threading.get_ident()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        index = next(self.counter)
+        self.events[index % self.capacity] = (phase, name, cat, time.perf_counter_ns() // 1000, tid, trace_id, args)
+        self.written = index + 1
+
+    def span(self, name, cat="", trace_id=None, args=None):
+        """Context manager recording a begin/end pair on the calling thread."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, cat, trace_id, args)
+
+    def snapshot(self):
+        """Recorded events, oldest first."""
+        written = self.written
+        if written <= self.capacity:
+            events = self.events[:written]
+        else:
+            start = written % self.capacity
+            events = self.events[start:] + self.events[:start]
+        return [event for event in events if event is not None]
+
+    def to_chrome(self):
+        pid = os.getpid()
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in self.thread_names.items()]
+        for phase, name, cat, ts, tid, trace_id, args in self.snapshot():
+            event = {"name": name, "cat": cat or "plt", "ph": phase, "ts": ts, "pid": pid, "tid": tid}
+            if trace_id is not None:
+                if phase in (ASYNC_BEGIN, ASYNC_END):
+                    event["id"] = trace_id
+                args = dict(args or {}, id=trace_id)
+            if phase == INSTANT:
+                event["s"] = "t"
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        """Write the buffer as Chrome trace / Perfetto JSON. Returns the number of events."""
+        trace = self.to_chrome()
+        with open(path, "w") as f:
+            json.dump(trace, f)
+        count = len(trace["traceEvents"])
+        print(f"Wrote {count} trace events to {path}")
+        return count
+
+
+# Process-wide tracer; PLT_TRACE=1 enables it from startup
+TRACER = Tracer(capacity=int(os.environ.get("PLT_TRACE_CAPACITY", "65536")),
+                enabled=os.environ.get("PLT_TRACE", "0") == "1")
+
+
+def enabled():
+    return TRACER.enabled
+
+
+def enable():
+    TRACER.enable()
+
+
+def disable():
+    TRACER.disable()
+
+
+def new_id():
+    return TRACER.new_id()
+
+
+def span(name, cat="", trace_id=None, args=None):
+    if not TRACER.enabled:
+        return NULL_SPAN
+    return _Span(TRACER, name, cat, trace_id, args)
+
+
+def begin(name, cat="", trace_id=None, args=None):
+    if TRACER.enabled:
+        TRACER.record(BEGIN, name, cat, trace_id, args)
+
+
+def end(name, cat="", trace_id=None, args=None):
+    if TRACER.enabled:
+        TRACER.record(END, name, cat, trace_id, args)
+
+
+def instant(name, cat="", trace_id=None, args=None):
+    if TRACER.enabled:
+        TRACER.record(INSTANT, name, cat, trace_id, args)
+
+
+def async_begin(name, trace_id, cat="", args=None):
+    """Start a lifecycle (e.g. an utterance) that may end on another thread."""
+    if TRACER.enabled:
+        TRACER.record(ASYNC_BEGIN, name, cat, trace_id, args)
+
+
+def async_end(name, trace_id, cat="", args=None):
+    if TRACER.enabled:
+        TRACER.record(ASYNC_END, name, cat, trace_id, args)
+
+
+def export(path):
+    return TRACER.export(path)
@@ -0,0 +1,119 @@
+# transcript_bus.py
+
+import collections
+import json
+import queue
+import threading
+import time
+
+# Event kinds
+TRANSCRIPT = "transcript"    # Recognized speech (source language)
+TRANSLATION = "translation"  # Translated text shown as the caption
+STATUS = "status"            # Device status messages
+CLEAR = "clear"              # Clear the caption area
+
+TranscriptEvent = collections.namedtuple(
+    "TranscriptEvent", ["kind", "text", "language", "timestamp"])
+
+
+class TranscriptBus:
+    """Thread-safe in-process bus for transcript, translation and status events.
+
+    Producers call publish() from any thread. Subscribers are called on the
+    publishing thread, so UI code should hop to its own thread (see
+    TabularUI.MainWindow, which uses a queued Qt signal).
+    """
+
+    def __init__(self, history_size=50, log_path=None):
+        self.history = collections.deque(maxlen=history_size)
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.log = TranscriptLog(log_path) if log_path else None
+
+    def publish(self, kind, text="", language=None):
+        event = TranscriptEvent(kind, text, language, time.monotonic())
+        with self.lock:
+            if kind in (TRANSCRIPT, TRANSLATION):
+                self.history.append(event)
+            subscribers = list(self.subscribers)
+        if self.log is not None:
+            self.log.append(event)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Error in transcript subscriber: {e}")
+        return event
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def recent(self, count=None):
+        """Return the bounded conversation history, oldest first."""
+        with self.lock:
+            events = list(self.history)
+        return events if count is None else events[-count:]
+
+    def enable_log(self, log_path):
+        if self.log is None:
+            self.log = TranscriptLog(log_path)
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+
+class TranscriptLog:
+    """Append-only JSON lines log written from a background thread."""
+
+    def __init__(self, path, max_pending=1000):
+        self.path = path
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def append(self, event):
+        try:
+            self.pending.put_nowait(event)
+        except queue.Full:
+            print("Transcript log is falling behind, dropping event.")
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join(timeout=2)
+
+    def _writer(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                event = self.pending.get()
+                if event is None:
+                    break
+                record = {
+                    "time": time.time(),
+                    "kind": event.kind,
+                    "language": event.language,
+                    "text": event.text,
+                }
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if self.pending.empty():
+                    f.flush()
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """Return the process-wide transcript bus."""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = TranscriptBus()
+        return _bus
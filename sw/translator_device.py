@@ -4,33 +4,80 @@ import os
 import io
 import sys
 import threading
+import queue
 import collections
 import numpy as np
-import sounddevice as sd
 from google.cloud import speech
 from google.cloud import texttospeech
-from google.cloud import translate_v2 as translate
 import webrtcvad  # Voice Activity Detection library
 from pydub import AudioSegment
 import time
 from pydub.playback import _play_with_simpleaudio as play
-import pygame
 import html
+from transcript_bus import get_bus, TRANSCRIPT, TRANSLATION
+import shared
+import metrics
+import tracing
+import audio_codec
+import endpointing
+import hal
+from quality_gate import UtteranceGate, SpectralSubtractor
+from echo_gate import EchoGate, BARGE_INS
+from deadlines import stage_policies, CancellationToken, Cancelled, Deadline
+from backends import CloudRecognizer, PlaceholderRecognizer, StandInTranslateClient, translate_client
+from speculative import SpeculativeTranslator, StreamingSession
+from tts_streaming import CloudSynthesizer, ToneSynthesizer, StreamingSpeaker
+from local_translation import TranslationRouter
+from local_recognition import RecognitionPolicy
 
 # Set your environment variable for Google Cloud credentials
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'add/path/to/your/credentials.json'
 
+# Per-stage latency metrics (see metrics.py)
+VAD_ENDPOINT_SECONDS = metrics.histogram("plt_vad_endpoint_seconds", "Trailing silence waited for before a segment is released")
+SEGMENT_AUDIO_SECONDS = metrics.histogram("plt_vad_segment_audio_seconds", "Length of speech segments",
+                                          buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0))
+SEGMENTS = {reason: metrics.counter("plt_vad_segments_total", "Speech segments produced by the VAD, by how they ended",
+                                    labels={"reason": reason})
+            for reason in (endpointing.PAUSE, endpointing.MAX_LENGTH, endpointing.DROP)}
+RECOGNIZE_SECONDS = metrics.histogram("plt_recognize_seconds", "Speech recognition request latency")
+DETECT_SECONDS = metrics.histogram("plt_detect_language_seconds", "Language detection latency")
+TRANSLATE_SECONDS = metrics.histogram("plt_translate_seconds", "Translation request latency")
+PLAYBACK_START_SECONDS = metrics.histogram("plt_playback_start_seconds", "Time from end of speech segment to playback start")
+PLAYBACK_SECONDS = metrics.histogram("plt_playback_seconds", "Duration of translated audio playback",
+                                     buckets=(0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0))
+# A segment handed from the capture loop to the processing thread, with the
+# streaming/encoding sessions that were fed while it was captured
+# and the cancellation token of the mode and language it was captured under
+CapturedSegment = collections.namedtuple("CapturedSegment", "audio uid session encoding_session token")
+
+ERRORS = {stage: metrics.counter("plt_stage_errors_total", "Failed pipeline stages", labels={"stage": stage})
+          for stage in ("recognize", "translate", "synthesize")}
+
 
 class TranslatorDevice:
-    def __init__(self):
+    def __init__(self, bus=None):
         # Audio recording parameters
         self.SAMPLE_RATE = 16000  # Recommended sample rate for Google Speech-to-Text
         self.FRAME_DURATION = 30  # Frame duration in milliseconds (10, 20, or 30 ms)
         self.NUM_CHANNELS = 1
+        # VAD settings below are replaced by the performance profile (see apply_profile)
         self.VAD_MODE = 3  # Aggressiveness mode (0-3)
+        self.VAD_PADDING_MS = 300  # Starting hangover; the endpointer adapts it to the speaker
 
-        # Initialize VAD
+        # Initialize VAD. The endpointer adds an adaptive noise floor and hangover,
+        # a pre-roll and a maximum segment length on top of it. PLT_DENOISE=1
+        # puts spectral subtraction in front of the VAD (segment audio is untouched).
         self.vad = webrtcvad.Vad(self.VAD_MODE)
+        denoiser = None
+        if os.environ.get("PLT_DENOISE") == "1":
+            denoiser = SpectralSubtractor(int(self.SAMPLE_RATE * self.FRAME_DURATION / 1000)).process
+        self.endpointer = endpointing.Endpointer(self.SAMPLE_RATE, self.FRAME_DURATION, vad=self.vad,
+                                                 preprocess=denoiser)
+        # Coughs, clicks and noise bursts are not sent for recognition (PLT_QUALITY_GATE=0 disables it)
+        self.quality_gate = None
+        if os.environ.get("PLT_QUALITY_GATE", "1") != "0":
+            self.quality_gate = UtteranceGate(self.SAMPLE_RATE, self.FRAME_DURATION)
 
         # Language settings
         self.base_language = 'en-US'  # Default base language
@@ -49,25 +96,112 @@ class TranslatorDevice:
         # Lock for thread-safe operations
         self.language_lock = threading.Lock()
 
-        # Initialize Google Cloud clients
-        self.speech_client = speech.SpeechClient()
-        self.translate_client = translate.Client()
-        self.tts_client = texttospeech.TextToSpeechClient()
+        # Initialize Google Cloud clients (local stand-ins with PLT_HAL=sim, see hal.py)
+        self.create_clients()
+        # PLT_RECOGNITION_MODE: auto (cloud within PLT_RECOGNITION_BUDGET seconds, on-device
+        # otherwise), cloud, local or race; on-device models load on first use
+        self.recognizer = RecognitionPolicy(self.cloud_recognizer(),
+                                            mode=os.environ.get("PLT_RECOGNITION_MODE", "auto"),
+                                            budget=float(os.environ.get("PLT_RECOGNITION_BUDGET", "1.5")))
+
+        # PLT_TRANSLATION_MODE: cloud, primary (on-device first), fallback (on-device
+        # when the cloud fails or is slow) or race; the local engine loads on first use
+        self.router = TranslationRouter(self.cloud_translate, mode=os.environ.get("PLT_TRANSLATION_MODE", "cloud"))
+
+        # Segments are compressed on a worker thread while they are captured and TTS
+        # audio is downloaded compressed, when soundfile supports the codecs (audio_codec.py)
+        self.upload_codec = audio_codec.choose_codec(os.environ.get("PLT_UPLOAD_CODEC", "FLAC"))
+        self.tts_encoding = audio_codec.choose_codec(os.environ.get("PLT_TTS_ENCODING", "OGG_OPUS"))
+        self.encoding_session = None
+
+        # The microphone stays open during playback: the echo gate suppresses our own
+        # output, and new speech cuts playback off (barge-in, PLT_BARGE_IN=0 to disable)
+        self.echo_gate = EchoGate(self.SAMPLE_RATE, self.FRAME_DURATION)
+        self.barge_in_enabled = os.environ.get("PLT_BARGE_IN", "1") != "0"
+
+        # Cloud calls get a per-stage time budget (PLT_BUDGET_<STAGE>), jittered retries
+        # while the budget lasts and a hedged second request when they exceed their p95
+        self.stages = stage_policies()
+
+        # Translations are synthesized in chunks and played while later chunks are synthesized
+        self.speaker = StreamingSpeaker(self.cloud_synthesizer(), player=hal.player(),
+                                        on_write=self.echo_gate.played, call=self.stages["synthesize"].call)
+
+        # Cancelled, and replaced, when the mode or the language settings change so
+        # in-flight work for utterances captured before the change is dropped
+        self.cancel_token = self.new_cancel_token()
+
+        # Speculative translation of interim transcripts (see enable_speculation)
+        self.speculator = None
+        self.session = None  # StreamingSession of the segment being captured
 
-        # Active flag to control processing. When False, the device is "paused".
-        self.active = True
-        self.vad_active = True
-        self.reset_time = None
+        # Active/VAD flags live in the shared state store (see the active and vad_active properties)
+
+        # Segments wait here for the processing thread while capture carries on
+        self.segments = queue.Queue()
+        self.worker = None
+
+        # Called once by each VAD collector after its first audio frame (mode switch timing)
+        self.first_audio_callback = None
+
+        # Trace correlation ID of the utterance being collected/processed
+        self.utterance_id = None
+        # When the last segment's speech ended (time.monotonic())
+        self.last_speech_end = None
 
         # Persistent audio stream (for speech mode)
         self.stream = None
+        self.restart_lock = threading.Lock()
+        self.vad_writes = 0  # Counts vad_active writes, so restart() can tell whether anyone else changed it
+
+        # Transcripts and translations are delivered to the UI through the bus
+        self.bus = bus if bus is not None else get_bus()
+
+    def create_clients(self):
+        """Create the cloud clients; PLT_HAL=sim uses local stand-ins and needs no credentials."""
+        if hal.simulated():
+            self.speech_client = self.tts_client = None
+            self.translate_client = StandInTranslateClient()
+            return
+        self.speech_client = speech.SpeechClient()
+        self.translate_client = translate_client()
+        self.tts_client = texttospeech.TextToSpeechClient()
+
+    def cloud_recognizer(self):
+        if self.speech_client is None:
+            return PlaceholderRecognizer()
+        return CloudRecognizer(self.speech_client)
+
+    def cloud_synthesizer(self):
+        if self.tts_client is None:
+            return ToneSynthesizer()
+        return CloudSynthesizer(self.tts_client, self.voice_name, self.tts_encoding)
+
+    @property
+    def active(self):
+        """When False, the device is "paused"."""
+        return shared.state.get("translator_active")
+
+    @active.setter
+    def active(self, value):
+        shared.state.set("translator_active", value)
+
+    @property
+    def vad_active(self):
+        """When False, any running vad_collector stops."""
+        return shared.state.get("vad_active")
+
+    @vad_active.setter
+    def vad_active(self, value):
+        self.vad_writes += 1
+        shared.state.set("vad_active", value)
 
     def start_stream(self):
-        """Initialize and start the persistent audio input stream."""
+        """Initialize and start the persistent audio input stream. The microphone
+        runs at its native rate and is resampled to SAMPLE_RATE in-process
+        (see resampler.py)."""
         if self.stream is None:
-            self.stream = sd.InputStream(samplerate=self.SAMPLE_RATE,
-                                         channels=self.NUM_CHANNELS,
-                                         dtype='int16')
+            self.stream = hal.input_stream(self.SAMPLE_RATE, self.NUM_CHANNELS)
             self.stream.start()
             print("Audio input stream started.")
 
@@ -77,12 +211,6 @@ class TranslatorDevice:
             self.stream.stop()
             print("Audio input stream stopped.")
 
-    def resume_stream(self):
-        """Resume the persistent audio input stream."""
-        if self.stream is not None:
-            self.stream.start()
-            print("Audio input stream resumed.")
-
     def read_audio_chunk(self, stream, frame_duration, sample_rate):
         """Read a chunk of audio from the stream."""
         n_frames = int(sample_rate * (frame_duration / 1000.0))
@@ -91,113 +219,270 @@ class TranslatorDevice:
             return audio
         except Exception as e:
             print(f"Error reading audio: {e}")
+            time.sleep(frame_duration / 1000.0)  # Do not spin on a broken stream
             return None
 
-    def vad_collector(self, sample_rate, frame_duration_ms, padding_duration_ms, stream):
-        """Yield segments of audio where speech is detected."""
-        num_padding_frames = int(padding_duration_ms / frame_duration_ms)
-        ring_buffer = collections.deque(maxlen=num_padding_frames)
-        triggered = False
-        voiced_frames = []
+    def vad_collector(self, sample_rate, frame_duration_ms, padding_duration_ms, stream, on_voiced=None, stop=None):
+        """Yield segments of audio where speech is detected (see endpointing.py).
+
+        padding_duration_ms is the starting hangover; it adapts to the speaker.
+        on_voiced(audio) is called with every frame added to the current segment.
+        Capture ends when vad_active is cleared or stop() returns True."""
+        endpointer = self.endpointer
+        endpointer.reset()
+        endpointer.initial_hangover_ms = padding_duration_ms
+        first_frame = True
 
         while True:
             # If the device is paused, break out of this generator.
-            if not self.vad_active:
+            if not self.vad_active or (stop is not None and stop()):
                 break
 
             audio = self.read_audio_chunk(stream, frame_duration_ms, sample_rate)
             if audio is None:
                 continue
-
-            # Convert audio to bytes before passing to VAD
-            is_speech = self.vad.is_speech(audio.tobytes(), sample_rate)
-
-            if is_speech:
-                if not triggered:
-                    triggered = True
-                    voiced_frames.append(audio)
+            captured = time.monotonic() - frame_duration_ms / 1000.0
+            if first_frame:
+                first_frame = False
+                if self.first_audio_callback is not None:
+                    self.first_audio_callback()
+
+            echo = self.echo_gate.is_echo(audio, captured)
+            for event, data in endpointer.process(audio, suppress=echo):
+                if event == endpointing.START:
+                    self.utterance_id = tracing.new_id()
+                    tracing.async_begin("utterance", self.utterance_id, "speech")
+                    if self.barge_in_enabled and self.echo_gate.playing():
+                        self.barge_in()
+                elif event == endpointing.AUDIO:
+                    if on_voiced is not None:
+                        on_voiced(np.frombuffer(data, dtype=np.int16))
+                elif event == endpointing.DROP:
+                    # Too short to be speech: never sent for recognition
+                    SEGMENTS[event].inc()
+                    self.abort_session()
+                    tracing.async_end("utterance", self.utterance_id, "speech", {"outcome": "too_short"})
                 else:
-                    voiced_frames.append(audio)
-                ring_buffer.clear()
-            else:
-                if triggered:
-                    ring_buffer.append(audio)
-                    if len(ring_buffer) >= ring_buffer.maxlen:
-                        yield b''.join([f.tobytes() for f in voiced_frames])
-                        triggered = False
-                        voiced_frames = []
-                        ring_buffer.clear()
-                else:
-                    continue  # Remain in silence until voice is detected
-
-    def translate_text(self, text, target_language):
+                    VAD_ENDPOINT_SECONDS.observe(data.trailing_s)
+                    SEGMENT_AUDIO_SECONDS.observe(data.duration_s)
+                    SEGMENTS[data.reason].inc()
+                    if self.quality_gate is not None:
+                        result = self.quality_gate.check(data, endpointer.noise_floor)
+                        if not result.passed:
+                            print(f"Segment gated ({result.reason}): {data.duration_s:.2f} s, "
+                                  f"voiced {result.voiced_ratio:.0%}, {result.snr_db:.0f} dB over noise, "
+                                  f"flatness {result.flatness:.2f}")
+                            self.abort_session()
+                            tracing.async_end("utterance", self.utterance_id, "speech",
+                                              {"outcome": "gated", "reason": result.reason})
+                            continue
+                    tracing.instant("vad_endpoint", "speech", self.utterance_id,
+                                    {"audio_s": data.duration_s, "reason": data.reason,
+                                     "hangover_ms": endpointer.hangover_ms,
+                                     "noise_floor_db": round(endpointer.noise_floor, 1)})
+                    # When the speaker stopped talking (monotonic), for reply latencies
+                    self.last_speech_end = captured + frame_duration_ms / 1000.0 - data.trailing_s
+                    yield data.pcm
+
+    def cloud_translate(self, text, target_language):
         """Translate the text to the target language using Google Cloud Translation API."""
         result = self.translate_client.translate(text, target_language=target_language)
-        translated_text = html.unescape(result["translatedText"])
-        return translated_text
+        return html.unescape(result["translatedText"])
+
+    def translate_text(self, text, target_language, source_language=None, token=None, deadline=None):
+        """Translate the text with the cloud, the on-device engine or both, depending
+        on the router mode (see local_translation.py). The local engine needs the
+        source language. `deadline` replaces the stage budget."""
+        with TRANSLATE_SECONDS.time():
+            return self.stages["translate"].call(self.router.translate, text, target_language[:2],
+                                                 source_language[:2] if source_language else None, token=token,
+                                                 deadline=deadline)
     
-    def transcribe_and_translate(self, audio_bytes):
-        start_time = time.time()
-        audio = speech.RecognitionAudio(content=audio_bytes)
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-            language_code=self.base_language,  # Base language
-            sample_rate_hertz=self.SAMPLE_RATE,
-            alternative_language_codes=[lang for lang in self.supported_languages if lang != self.base_language]
-        )
-        
-        try:
-            # Optionally, add a timeout if supported (check API docs for your version)
-            response = self.speech_client.recognize(config=config, audio=audio)  # , timeout=10
-        except Exception as e:
-            print(f"Error during speech recognition: {e}")
+    def enable_speculation(self, stability=0.8, max_requests=3, max_chars_per_minute=2000, synthesize=False):
+        """Stream segments to the recognizer while they are captured and translate
+        stable interim transcripts ahead of the final one (see speculative.py)."""
+        self.speculator = SpeculativeTranslator(
+            self.translate_text,
+            lambda language: self.choose_target(language, update=False),
+            synthesize=self.synthesize_audio if synthesize else None,
+            stability=stability, max_requests=max_requests, max_chars_per_minute=max_chars_per_minute)
+        print(f"Speculative translation enabled (stability {stability}, {max_requests} requests per utterance).")
+
+    def speculation_stats(self):
+        """Hit rate and latency saved by speculation, or None when it is disabled."""
+        return self.speculator.stats() if self.speculator is not None else None
+
+    def stream_audio(self, audio):
+        """vad_collector callback: stream the segment being captured."""
+        if self.session is None:
+            self.session = StreamingSession(
+                self.recognizer, self.speculator, self.SAMPLE_RATE, self.base_language,
+                [lang for lang in self.supported_languages if lang != self.base_language])
+            self.session.start()
+        self.session.feed(audio.tobytes())
+
+    def encode_audio(self, audio):
+        """vad_collector callback: compress the segment being captured."""
+        if self.upload_codec == "LINEAR16":
             return
-
-        if not response.results:
-            return
-
-        full_transcript = ""
-        for result in response.results:
-            alternative = result.alternatives[0]
-            transcript = alternative.transcript
-            full_transcript += transcript + " "
-        full_transcript = full_transcript.strip()
-        print(f"Transcription result: {full_transcript}")
-
-        # Detect language and determine translation direction
-        detection = self.translate_client.detect_language(full_transcript)
-        detected_language = detection['language']
+        if self.encoding_session is None:
+            self.encoding_session = audio_codec.EncodingSession(self.upload_codec, self.SAMPLE_RATE)
+            self.encoding_session.start()
+        self.encoding_session.feed(audio.tobytes())
+
+    def barge_in(self):
+        """The other party started speaking over our playback: stop it at once."""
+        BARGE_INS.inc()
+        tracing.instant("barge_in", "speech", self.utterance_id)
+        self.speaker.interrupt()
+        self.echo_gate.interrupt()
+
+    def new_cancel_token(self):
+        token = CancellationToken()
+        token.on_cancel(self.speaker.interrupt)
+        return token
+
+    def cancel_inflight(self, reason):
+        """Cancel recognition, translation and playback of every utterance captured so far."""
+        token, self.cancel_token = self.cancel_token, self.new_cancel_token()
+        tracing.instant("cancel_inflight", "speech", args={"reason": reason})
+        token.cancel(reason)
+
+    def detach_segment(self, audio_bytes):
+        """Take a finished segment and its sessions from the capture loop, so the
+        next segment can start while this one is processed."""
+        segment = CapturedSegment(audio_bytes, self.utterance_id, self.session, self.encoding_session,
+                                  self.cancel_token)
+        self.session = None
+        self.encoding_session = None
+        return segment
+
+    def take_upload(self, segment):
+        """Finish the encoding of a segment. Returns (audio, encoding) to send,
+        falling back to the raw LINEAR16 segment."""
+        audio_bytes, session = segment.audio, segment.encoding_session
+        if session is not None:
+            encoded = session.finish()
+            if encoded:
+                return encoded, session.codec
+        audio_codec.UPLOAD_BYTES.inc(len(audio_bytes))
+        audio_codec.RAW_BYTES.inc(len(audio_bytes))
+        return audio_bytes, "LINEAR16"
+
+    def abort_session(self):
+        if self.session is not None:
+            self.session.abort()
+            self.session = None
+        if self.encoding_session is not None:
+            self.encoding_session.abort()
+            self.encoding_session = None
+
+    def choose_target(self, detected_language, update=True):
+        """Pick the translation target for a detected language from the current
+        language pair. Returns None if no pair matches. With update=False the
+        current mode is left unchanged."""
+        detected_language = detected_language[:2].lower()
         with self.language_lock:
-            if self.mode is None or (detected_language != self.base_language[:2] and detected_language != self.mode[1][:2]):
+            mode = self.mode
+            if mode is None or (detected_language != self.base_language[:2] and detected_language != mode[1][:2]):
                 found_pair = None
                 for pair in self.lang_combos:
                     if pair[0][:2] == self.base_language[:2] and pair[1][:2] == detected_language:
                         found_pair = pair
                         break
-                if found_pair:
+                if not found_pair:
+                    return None
+                mode = found_pair
+                if update:
                     self.mode = found_pair
-                else:
-                    return
-            if detected_language == self.mode[0][:2]:
-                target_language = self.mode[1]
-            else:
-                target_language = self.mode[0]
+            if detected_language == mode[0][:2]:
+                return mode[1]
+            return mode[0]
 
-        # Translate text and print output
+    def detect_language(self, text, trace_id=None, token=None):
+        """Language of a transcript from Cloud Translation; the base language when
+        the cloud cannot be reached in time."""
         try:
-            translated_text = self.translate_text(full_transcript, target_language[:2])
-            print(f"Translated text: {translated_text}")
+            with DETECT_SECONDS.time(), tracing.span("detect_language", "speech", trace_id):
+                return self.stages["detect_language"].call(self.translate_client.detect_language, text,
+                                                           token=token)['language']
+        except Cancelled:
+            raise
         except Exception as e:
-            print(f"Error during translation: {e}")
+            print(f"Language detection failed ({e}); assuming {self.base_language}.")
+            return self.base_language
+
+    def transcribe_and_translate(self, segment):
+        """Recognize, translate and speak a CapturedSegment. Raises Cancelled if
+        the segment's token is cancelled on the way."""
+        start_time = time.perf_counter()
+        audio_bytes, uid, session, token = segment.audio, segment.uid, segment.session, segment.token
+        token.check()
+
+        full_transcript = None
+        recognized_language = None  # Reported by the on-device recognizer
+        # Streaming and the batch fallback after it share the recognize budget
+        recognize_deadline = Deadline(self.stages["recognize"].budget)
+        if session is not None:
+            with RECOGNIZE_SECONDS.time(), tracing.span("recognize_final", "speech", uid):
+                full_transcript, _ = session.finish(recognize_deadline, token)
+        if full_transcript is None:
+            upload, encoding = self.take_upload(segment)
+            try:
+                with RECOGNIZE_SECONDS.time(), tracing.span("recognize", "speech", uid, {"encoding": encoding}):
+                    recognition = self.stages["recognize"].call(
+                        self.recognizer.recognize,
+                        audio_bytes, self.SAMPLE_RATE, self.base_language,
+                        [lang for lang in self.supported_languages if lang != self.base_language],
+                        upload=upload, encoding=encoding, token=token, deadline=recognize_deadline)
+                full_transcript, recognized_language = recognition.text, recognition.language
+            except Cancelled:
+                raise
+            except Exception as e:
+                ERRORS["recognize"].inc()
+                print(f"Error during speech recognition: {e}")
+                return
+
+        token.check()
+        if not full_transcript:
             return
+        self.bus.publish(TRANSCRIPT, full_transcript, self.base_language)
 
-        with open("als_speech_audio_transcription.txt", "w", encoding="utf-8") as f:
-            f.write(translated_text)
+        # Detect language and determine translation direction
+        detected_language = recognized_language or self.detect_language(full_transcript, uid, token)
+        target_language = self.choose_target(detected_language)
+        if target_language is None:
+            return
+
+        # Use the speculative translation if it matches the final transcript
+        # Waiting for a matching speculation and translating after a miss share the translate budget
+        translate_deadline = Deadline(self.stages["translate"].budget)
+        speculation = None
+        if session is not None:
+            speculation = session.resolve(full_transcript, target_language, translate_deadline, token)
+            tracing.instant("speculation", "speech", uid, {"hit": speculation is not None})
 
-        playback_start_time = time.time()
-        print(f"Total time from sending audio to playback: {playback_start_time - start_time:.2f} seconds")
-        
-        self.synthesize_speech(translated_text, target_language)
+        # Translate text and print output
+        if speculation is not None:
+            translated_text = speculation.translation
+        else:
+            try:
+                with tracing.span("translate", "speech", uid, {"target": target_language}):
+                    translated_text = self.translate_text(full_transcript, target_language, detected_language, token,
+                                                          translate_deadline)
+            except Cancelled:
+                raise
+            except Exception as e:
+                ERRORS["translate"].inc()
+                print(f"Error during translation: {e}")
+                return
+
+        token.check()
+        self.bus.publish(TRANSLATION, translated_text, target_language)
+        if speculation is not None and speculation.audio is not None:
+            self.play_audio(speculation.audio, start_time=start_time, trace_id=uid, token=token)
+        else:
+            self.synthesize_speech(translated_text, target_language, start_time=start_time, trace_id=uid, token=token)
 
     def get_voice_variant(self, language_code, ssml_gender):
         """Get the voice variant letter based on language code and gender."""
@@ -222,51 +507,86 @@ class TranslatorDevice:
             print(f"No variant found for {language_code} with gender {ssml_gender}. Using default variant 'A'.")
             return 'A'
 
-    def synthesize_speech(self, text, target_language_code):
-        """Convert text to speech and play the audio without saving to a file."""
+    def voice_name(self, target_language_code):
+        """Standard voice for a language and the configured gender."""
         gender_map = {
             'MALE': texttospeech.SsmlVoiceGender.MALE,
             'FEMALE': texttospeech.SsmlVoiceGender.FEMALE
         }
         ssml_gender = gender_map.get(self.gender, texttospeech.SsmlVoiceGender.MALE)
         variant = self.get_voice_variant(target_language_code, ssml_gender)
-        voice_name = f"{target_language_code}-Standard-{variant}"
-        input_text = texttospeech.SynthesisInput(text=text)
-        voice = texttospeech.VoiceSelectionParams(
-            language_code=target_language_code,
-            name=voice_name
-        )
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.LINEAR16
-        )
+        return f"{target_language_code}-Standard-{variant}"
 
-        try:
-            response = self.tts_client.synthesize_speech(input=input_text, voice=voice, audio_config=audio_config)
-            audio_content = response.audio_content
+    def synthesize_audio(self, text, target_language_code, trace_id=None):
+        """Convert text to speech in one request. Returns (pcm, sample rate)."""
+        return self.speaker.synthesize(text, target_language_code, trace_id=trace_id)
+
+    def _playback(self, play, start_time):
+        """Run play(on_first_audio). The microphone stays open; the echo gate
+        keeps the playback from being picked up as speech."""
+        playback_start = None
 
-            # Save the audio content to a temp file
-            with open("temp_audio.wav", "wb") as out:
-                out.write(audio_content)
+        def on_first_audio():
+            nonlocal playback_start
+            playback_start = time.perf_counter()
+            if start_time is not None:
+                PLAYBACK_START_SECONDS.observe(playback_start - start_time)
+                print(f"Total time from sending audio to playback: {playback_start - start_time:.2f} seconds")
 
-            # Disable mic temporarily by stopping the persistent stream
-            self.stop_stream()
+        result = play(on_first_audio)
+        if playback_start is not None:
+            PLAYBACK_SECONDS.observe(time.perf_counter() - playback_start)
+        return result
 
-            pygame.mixer.init()
-            pygame.mixer.music.load("temp_audio.wav")
-            pygame.mixer.music.play()
+    def play_audio(self, audio, start_time=None, trace_id=None, token=None):
+        """Play (pcm, sample rate) audio, e.g. a speculative synthesis."""
+        pcm, rate = audio
 
-            while pygame.mixer.music.get_busy():
-                time.sleep(0.1)
+        def play(on_first_audio):
+            on_first_audio()
+            self.speaker.play(pcm, rate, trace_id=trace_id, since=start_time, token=token)
 
-            print("Audio playback finished.")
+        try:
+            self._playback(play, start_time)
+        except Exception as e:
+            print(f"Error during audio playback: {e}")
 
-            # Resume microphone input
-            self.resume_stream()
+    def synthesize_speech(self, text, target_language_code, start_time=None, trace_id=None, token=None):
+        """Convert text to speech and play it, starting with the first sentence
+        while the rest is still being synthesized.
 
+        start_time (time.perf_counter()) is when the speech segment was handed
+        over; it is used to report the time until playback starts. trace_id ties
+        the synthesis and playback spans to an utterance or gesture window.
+        Returns the SpeechTiming, or None when synthesis failed."""
+        try:
+            timing = self._playback(
+                lambda on_first_audio: self.speaker.speak(text, target_language_code, trace_id=trace_id,
+                                                          on_first_audio=on_first_audio, token=token,
+                                                          since=start_time),
+                start_time)
+        except Cancelled:
+            raise
         except Exception as e:
+            ERRORS["synthesize"].inc()
             print(f"Error during speech synthesis: {e}")
+            return None
+        first_audio = f"{timing.first_audio:.2f} s" if timing.first_audio is not None else "never"
+        print(f"Speech: {timing.chunks} chunks, first audio after {first_audio}, "
+              f"{'interrupted' if timing.interrupted else 'done'} after {timing.total:.2f} s")
+        return timing
+
+    def apply_profile(self, settings):
+        """Apply the speech settings of a performance profile (see profiles.py)."""
+        self.VAD_MODE = settings["vad_mode"]
+        self.VAD_PADDING_MS = settings["vad_hangover_ms"]
+        self.vad.set_mode(self.VAD_MODE)
+        self.endpointer.initial_hangover_ms = self.VAD_PADDING_MS
+        self.endpointer.set_max_segment(settings["max_segment_ms"])
 
     def set_settings(self, base_language, gender):
+        # Anything still in flight would be spoken with the old languages or voice
+        self.cancel_inflight("settings")
         with self.language_lock:
             self.base_language = base_language
             self.gender = gender
@@ -277,39 +597,64 @@ class TranslatorDevice:
             print(f"Settings updated: Base Language - {self.base_language}, Gender - {self.gender}")
 
 
+    def process_segments(self):
+        """Processing thread: recognize, translate and speak segments in order."""
+        while True:
+            segment = self.segments.get()
+            outcome = "done"
+            try:
+                self.transcribe_and_translate(segment)
+            except Cancelled as e:
+                outcome = "cancelled"
+                print(f"Utterance dropped: {e or 'cancelled'}.")
+            except Exception as e:
+                outcome = "error"
+                print(f"Error in processing audio data: {e}")
+            finally:
+                tracing.async_end("utterance", segment.uid, "speech", {"outcome": outcome})
+
     def start(self):
         print("Starting automatic translator device.")
         try:
             self.start_stream()
             print("Audio input stream opened.")
+            # Capture runs here and processing on its own thread, so the microphone
+            # is read during playback and new speech can interrupt it
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.process_segments, name="speech_worker", daemon=True)
+                self.worker.start()
             while True:
                 if not self.active:
-                    time.sleep(0.1)
+                    shared.state.wait_for("translator_active", True, timeout=1.0)
+                    continue
+                if not self.vad_active:
+                    shared.state.wait_for("vad_active", True, timeout=1.0)
                     continue
 
                 current_base_language = self.base_language
-                print(f"\nListening for speech in: {current_base_language} (Mode: {self.mode})")
+                tracing.instant("listen", "speech", args={"language": current_base_language, "mode": str(self.mode)})
                 frames_generator = self.vad_collector(
                     self.SAMPLE_RATE,
                     self.FRAME_DURATION,
-                    padding_duration_ms=300,
-                    stream=self.stream
+                    padding_duration_ms=self.VAD_PADDING_MS,
+                    stream=self.stream,
+                    on_voiced=self.stream_audio if self.speculator is not None else self.encode_audio
                 )
 
-                for audio_data in frames_generator:
-                    if self.reset_time and time.time() < self.reset_time + 0.5:
-                        print("Discarding residual audio segment due to recent mode switch...")
-                        continue
-                    if not self.active:
-                        break
-                    try:
-                        print("Processing captured voice data...")
-                        self.transcribe_and_translate(audio_data)
-                    except Exception as e:
-                        print(f"Error in processing audio data: {e}")
-                    if self.base_language != current_base_language:
-                        print("Base language changed during processing. Restarting listening loop.")
-                        break
+                shared.state.set("listening", True)
+                try:
+                    for audio_data in frames_generator:
+                        if not self.active:
+                            self.abort_session()
+                            break
+                        self.segments.put(self.detach_segment(audio_data))
+                        if self.base_language != current_base_language:
+                            print("Base language changed. Restarting listening loop.")
+                            break
+                finally:
+                    # A segment cut off by a mode switch never reaches transcribe_and_translate
+                    self.abort_session()
+                    shared.state.set("listening", False)
         except KeyboardInterrupt:
             print("\nExiting...")
             self.stream.close()
@@ -317,56 +662,83 @@ class TranslatorDevice:
 
 
     # FOR ASL MODE
-    def listen_and_save_transcription(self, file_path):
+    def listen_and_save_transcription(self, timeout_s=None, stop=None):
         """Listen until a complete utterance is detected using VAD,
-        transcribe the audio for the base language, save the transcript to file, and return the transcript."""
+        transcribe the audio for the base language, publish the transcript on the bus, and return the transcript.
+
+        Returns None when nobody started speaking within timeout_s seconds (an
+        utterance already under way is finished) or stop() returned True."""
         print("Listening for a voice utterance...")
-        with sd.InputStream(samplerate=self.SAMPLE_RATE, channels=self.NUM_CHANNELS, dtype='int16') as stream:
+        deadline = time.monotonic() + timeout_s if timeout_s is not None else None
+
+        def stopped():
+            if stop is not None and stop():
+                return True
+            return deadline is not None and time.monotonic() > deadline and not self.endpointer.triggered
+
+        with hal.input_stream(self.SAMPLE_RATE, self.NUM_CHANNELS) as stream:
             for audio_bytes in self.vad_collector(
                     self.SAMPLE_RATE,
                     self.FRAME_DURATION,
-                    padding_duration_ms=300,
-                    stream=stream):
-                print("Processing captured voice data...")
-                if len(audio_bytes) < 1000:
-                    print("Audio segment too short, ignoring...")
-                    continue
-
-                audio = speech.RecognitionAudio(content=audio_bytes)
-                config = speech.RecognitionConfig(
-                    encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-                    language_code=self.base_language,
-                    sample_rate_hertz=self.SAMPLE_RATE
-                )
+                    padding_duration_ms=self.VAD_PADDING_MS,
+                    stream=stream,
+                    on_voiced=self.encode_audio,
+                    stop=stopped):
+                segment = self.detach_segment(audio_bytes)
+                uid = segment.uid
                 try:
-                    response = self.speech_client.recognize(config=config, audio=audio)
-                    transcript = " ".join(
-                        [result.alternatives[0].transcript for result in response.results]
-                    ).strip()
+                    upload, encoding = self.take_upload(segment)
+                    with RECOGNIZE_SECONDS.time(), tracing.span("recognize", "speech", uid, {"encoding": encoding}):
+                        transcript = self.stages["recognize"].call(
+                            self.recognizer.recognize, audio_bytes, self.SAMPLE_RATE, self.base_language,
+                            upload=upload, encoding=encoding, token=segment.token).text
                     if not transcript:
-                        print("No speech detected in this segment, waiting for valid input...")
+                        tracing.async_end("utterance", uid, "speech", {"outcome": "empty"})
                         continue
-                    print(f"Transcription recorded: {transcript}")
                 except Exception as e:
                     transcript = ""
                     print(f"Error transcribing audio: {e}")
+                    tracing.async_end("utterance", uid, "speech", {"outcome": "error"})
                     continue
 
-                try:
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        f.write(transcript)
-                    print(f"Transcription saved to {file_path}")
-                except Exception as e:
-                    print(f"Error writing transcription to file: {e}")
-
+                self.bus.publish(TRANSCRIPT, transcript, self.base_language)
+                tracing.async_end("utterance", uid, "speech")
                 return transcript
+            # Stopped before an utterance was complete: drop the partly encoded segment
+            self.abort_session()
 
     def reset(self):
-        self.reset_time = time.time()
-        print("Translator device reset: Ignoring audio for the next 2 seconds.")
+        """Cancel work in flight and drop segments still waiting to be processed (mode switch)."""
+        self.cancel_inflight("mode")
+        while not self.segments.empty():
+            segment = self.segments.get_nowait()
+            for session in (segment.session, segment.encoding_session):
+                if session is not None:
+                    session.abort()
+            tracing.async_end("utterance", segment.uid, "speech", {"outcome": "discarded"})
+        print("Translator device reset: pending speech segments discarded.")
 
     def restart(self):
+        """Rebuild the cloud clients and the audio stream (after a Wi-Fi change).
+        Runs on its own thread: capture is paused first, so the running VAD
+        collector never reads from a stream that is being replaced."""
         print("Restarting translator device due to Wi‑Fi change.")
+        with self.restart_lock:
+            was_active = self.vad_active
+            self.vad_active = False
+            # Anything that sets the flag from here on (a mode switch, the end of
+            # an ASL reply capture) decides whether capture resumes
+            paused = (self.vad_writes, shared.state.get("mode"), shared.state.get("translator_active"))
+            if not shared.state.wait_for("listening", False, timeout=2.0):
+                print("VAD collector did not stop in time; restarting anyway.")
+            try:
+                self._rebuild()
+            finally:
+                current = (self.vad_writes, shared.state.get("mode"), shared.state.get("translator_active"))
+                if was_active and current == paused and not self.vad_active:
+                    self.vad_active = True
+
+    def _rebuild(self):
         # Stop and close the current audio stream if active
         if self.stream:
             try:
@@ -378,11 +750,9 @@ class TranslatorDevice:
 
         # Reinitialize the Google Cloud clients
         try:
-            from google.cloud import speech, texttospeech
-            from google.cloud import translate_v2 as translate
-            self.speech_client = speech.SpeechClient()
-            self.translate_client = translate.Client()
-            self.tts_client = texttospeech.TextToSpeechClient()
+            self.create_clients()
+            self.recognizer.cloud = self.cloud_recognizer()
+            self.speaker.synthesizer = self.cloud_synthesizer()
             print("Google Cloud clients reinitialized.")
         except Exception as e:
             print(f"Error reinitializing clients: {e}")
@@ -0,0 +1,321 @@
+# tts_streaming.py
+
+import collections
+import io
+import math
+import re
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import tracing
+import audio_codec
+from deadlines import call_timeout
+
+SYNTHESIZE_SECONDS = metrics.histogram("plt_synthesize_seconds", "Text-to-speech request latency")
+FIRST_AUDIO_SECONDS = metrics.histogram("plt_tts_first_audio_seconds", "Time from synthesis start to first audio written")
+TOTAL_SECONDS = metrics.histogram("plt_tts_total_seconds", "Time from synthesis start to end of playback",
+                                  buckets=(0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0))
+CHUNKS = metrics.counter("plt_tts_chunks_total", "Text chunks synthesized")
+
+# Timing of one speak() call, in seconds from the start of synthesis;
+# interrupted is True if playback was cut off (barge-in)
+SpeechTiming = collections.namedtuple("SpeechTiming", "chunks first_audio total interrupted")
+
+SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+CLAUSE_END = re.compile(r"(?<=[,;:，、；：])\s+")
+
+
+def _split_long(text, pattern, max_chars):
+    """Split at `pattern`, packing pieces greedily into chunks of at most max_chars."""
+    chunks = []
+    current = ""
+    for piece in pattern.split(text):
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_text(text, max_chars=180, first_max_chars=80):
+    """Split text for synthesis at sentence boundaries, then at clause
+    boundaries and finally at spaces for anything still longer than max_chars.
+
+    Every sentence becomes its own chunk so the first one comes back quickly;
+    the first chunk is additionally limited to first_max_chars.
+    """
+    chunks = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        if not sentence:
+            continue
+        limit = first_max_chars if not chunks else max_chars
+        if len(sentence) <= limit:
+            chunks.append(sentence)
+            continue
+        for clause in _split_long(sentence, CLAUSE_END, limit):
+            if len(clause) <= max_chars:
+                chunks.append(clause)
+            else:
+                chunks.extend(_split_long(clause, re.compile(r"\s+"), max_chars))
+    return chunks
+
+
+def wav_to_pcm(wav_bytes):
+    """Return (pcm bytes, sample rate) from a mono 16-bit WAV."""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav:
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+class CloudSynthesizer:
+    """Google Cloud Text-to-Speech returning 16-bit PCM.
+
+    voice_name_for(language_code) picks the voice, so gender changes made in
+    the settings apply to the next request. With audio_encoding="OGG_OPUS" the
+    audio is downloaded compressed and decoded in memory (needs soundfile);
+    otherwise it is downloaded as LINEAR16.
+    """
+
+    def __init__(self, client, voice_name_for, audio_encoding="LINEAR16"):
+        self.client = client
+        self.voice_name_for = voice_name_for
+        self.audio_encoding = audio_encoding
+
+    def synthesize(self, text, language_code):
+        from google.cloud import texttospeech
+        response = self.client.synthesize_speech(
+            input=texttospeech.SynthesisInput(text=text),
+            voice=texttospeech.VoiceSelectionParams(language_code=language_code,
+                                                    name=self.voice_name_for(language_code)),
+            audio_config=texttospeech.AudioConfig(
+                audio_encoding=texttospeech.AudioEncoding[self.audio_encoding]),
+            timeout=call_timeout(10.0))
+        if self.audio_encoding == "LINEAR16":
+            return wav_to_pcm(response.audio_content)
+        return audio_codec.decode(response.audio_content)
+
+
+class ToneSynthesizer:
+    """Local stand-in synthesizer: returns a quiet tone as long as the text would
+    take to say, after a simulated request latency."""
+
+    def __init__(self, rate=24000, chars_per_second=15.0, latency=0.3, latency_per_char=0.004):
+        self.rate = rate
+        self.chars_per_second = chars_per_second
+        self.latency = latency
+        self.latency_per_char = latency_per_char
+
+    def synthesize(self, text, language_code):
+        time.sleep(self.latency + self.latency_per_char * len(text))
+        samples = int(self.rate * len(text) / self.chars_per_second)
+        step = 2 * math.pi * 220.0 / self.rate
+        pcm = struct.pack(f"<{samples}h", *(int(2000 * math.sin(step * i)) for i in range(samples)))
+        return pcm, self.rate
+
+
+class SoundDevicePlayer:
+    """Plays 16-bit mono PCM (bytes or an int16 array) on the default output.
+    write() blocks while the device buffer is full, so consecutive writes play
+    back without gaps."""
+
+    def __init__(self):
+        self.stream = None
+        self.rate = None
+
+    def open(self, rate):
+        import sounddevice as sd
+        if self.stream is not None and rate == self.rate:
+            return
+        self.close()
+        self.rate = rate
+        self.stream = sd.RawOutputStream(samplerate=rate, channels=1, dtype="int16")
+        self.stream.start()
+
+    def write(self, pcm):
+        self.stream.write(pcm)
+
+    def close(self):
+        """Wait for the queued audio to finish playing and close the device."""
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def abort(self):
+        """Stop at once, dropping the queued audio, and close the device."""
+        if self.stream is not None:
+            self.stream.abort()
+            self.stream.close()
+            self.stream = None
+
+
+class NullPlayer:
+    """Discards audio but takes as long as playing it would (for benchmarks)."""
+
+    def __init__(self):
+        self.rate = None
+        self.play_until = 0.0
+
+    def open(self, rate):
+        self.rate = rate
+
+    def write(self, pcm):
+        now = time.perf_counter()
+        start = max(now, self.play_until)
+        self.play_until = start + memoryview(pcm).nbytes / 2 / self.rate
+        # Like a device buffer: block only until the previous audio is nearly done
+        time.sleep(max(0.0, start - now - 0.05))
+
+    def close(self):
+        time.sleep(max(0.0, self.play_until - time.perf_counter()))
+
+    def abort(self):
+        self.play_until = 0.0
+
+
+def call_directly(function, *args, token=None):
+    return function(*args)
+
+
+class StreamingSpeaker:
+    """Synthesizes text in chunks with bounded parallelism and plays them in
+    order as soon as each one is ready.
+
+    Chunk 1 starts playing while the later chunks are still being synthesized;
+    the chunks are written back to back to one output stream, so playback is
+    gapless as long as synthesis keeps ahead of playback.
+
+    Audio is written in blocks of `block_s` seconds. on_write(pcm, rate) is
+    called with each block as it is handed to the output (the echo reference,
+    see echo_gate.py), and interrupt() cuts playback off after the current block.
+
+    call(function, *args, token=None) runs each synthesis request; pass a
+    deadlines.StagePolicy's call to give requests a deadline, retries and hedging.
+    """
+
+    def __init__(self, synthesizer, player=None, max_workers=3, max_chars=180, block_s=0.1, on_write=None,
+                 call=call_directly):
+        self.synthesizer = synthesizer
+        self.call = call
+        self.player = player or SoundDevicePlayer()
+        self.max_chars = max_chars
+        self.block_s = block_s
+        self.on_write = on_write
+        self.interrupted = threading.Event()
+        self.interrupted_at = None  # time.perf_counter() of the last interrupt()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+
+    def interrupt(self):
+        """Stop the current playback (barge-in)."""
+        self.interrupted_at = time.perf_counter()
+        self.interrupted.set()
+
+    def _reset_interrupt(self, since, token):
+        """Clear the interrupt left over from an earlier playback. One raised
+        after `since` (time.perf_counter() when this audio's segment was
+        finalized) or by cancelling `token` applies to this playback too."""
+        if token is not None and token.cancelled:
+            self.interrupted.set()
+        elif since is None or self.interrupted_at is None or self.interrupted_at < since:
+            self.interrupted.clear()
+
+    def _write(self, pcm, rate):
+        """Write audio block by block. Returns False if playback was interrupted."""
+        data = memoryview(pcm).cast("B")
+        block = int(rate * self.block_s) * 2
+        for offset in range(0, len(data), block):
+            if self.interrupted.is_set():
+                return False
+            if self.on_write is not None:
+                self.on_write(data[offset:offset + block], rate)
+            self.player.write(data[offset:offset + block])
+        return True
+
+    def _close(self):
+        if self.interrupted.is_set():
+            self.player.abort()
+        else:
+            self.player.close()
+
+    def synthesize(self, text, language_code, trace_id=None, token=None):
+        """Synthesize one piece of text. Returns (pcm, rate)."""
+        with SYNTHESIZE_SECONDS.time(), tracing.span("synthesize", "speech", trace_id, {"chars": len(text)}):
+            return self.call(self.synthesizer.synthesize, text, language_code, token=token)
+
+    def play(self, pcm, rate, trace_id=None, since=None, token=None):
+        """Play already synthesized audio. See speak() for `since` and `token`."""
+        self._reset_interrupt(since, token)
+        if self.interrupted.is_set():
+            return False
+        with tracing.span("playback", "speech", trace_id):
+            self.player.open(rate)
+            try:
+                return self._write(pcm, rate)
+            finally:
+                self._close()
+
+    def speak(self, text, language_code, trace_id=None, on_first_audio=None, token=None, since=None):
+        """Synthesize and play text. on_first_audio() is called when the first
+        chunk is handed to the output; `token` (a deadlines.CancellationToken)
+        abandons the synthesis requests when cancelled. A barge-in after `since`
+        (time.perf_counter() when the text's segment was finalized) stops this
+        playback even if it came before playback started. Returns a SpeechTiming."""
+        start = time.perf_counter()
+        self._reset_interrupt(since, token)
+        if self.interrupted.is_set():
+            return SpeechTiming(0, None, 0.0, True)
+        chunks = split_text(text, self.max_chars)
+        CHUNKS.inc(len(chunks))
+        futures = [self.executor.submit(self.synthesize, chunk, language_code, trace_id, token) for chunk in chunks]
+        first_audio = None
+        try:
+            for future in futures:
+                pcm, rate = future.result()
+                self.player.open(rate)
+                if first_audio is None:
+                    first_audio = time.perf_counter() - start
+                    FIRST_AUDIO_SECONDS.observe(first_audio)
+                    tracing.begin("playback", "speech", trace_id)
+                    if on_first_audio is not None:
+                        on_first_audio()
+                if not self._write(pcm, rate):
+                    break
+        finally:
+            for future in futures:
+                future.cancel()  # Only matters when a chunk failed or playback was interrupted
+            self._close()
+            if first_audio is not None:
+                tracing.end("playback", "speech", trace_id)
+        total = time.perf_counter() - start
+        TOTAL_SECONDS.observe(total)
+        return SpeechTiming(len(chunks), first_audio, total, self.interrupted.is_set())
+
+
+def benchmark(text, workers=3):
+    """Compare whole-text and chunked synthesis with the stand-in synthesizer."""
+    speaker = StreamingSpeaker(ToneSynthesizer(), NullPlayer(), max_workers=workers)
+
+    start = time.perf_counter()
+    pcm, rate = speaker.synthesize(text, "en-US")
+    first_audio = time.perf_counter() - start
+    speaker.play(pcm, rate)
+    whole = SpeechTiming(1, first_audio, time.perf_counter() - start, False)
+
+    chunked = speaker.speak(text, "en-US")
+    for label, timing in (("whole text", whole), ("chunked", chunked)):
+        print(f"{label:<11} chunks={timing.chunks:<3} first audio={timing.first_audio:.2f}s "
+              f"total={timing.total:.2f}s")
+    speaker.executor.shutdown()
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(" ".join(sys.argv[1:]) or
+              "The train to the airport leaves from platform four. It runs every twenty minutes, "
+              "and the trip takes about half an hour. Tickets can be bought at the machines near the "
+              "entrance, or from the driver, although the driver only accepts exact change.")
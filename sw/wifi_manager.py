@@ -0,0 +1,204 @@
+# wifi_manager.py
+
+import sys
+import time
+from PyQt5.QtCore import QObject, QProcess, QTimer, pyqtSignal
+
+SCAN_REFRESH_MS = 60000  # Background rescan interval
+CONNECT_TIMEOUT_S = 30
+
+
+def split_terse(line):
+    """Split one line of `nmcli -t` output. Colons inside fields are escaped as \\:."""
+    fields = []
+    current = []
+    escaped = False
+    for ch in line:
+        if escaped:
+            current.append(ch)
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == ":":
+            fields.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    fields.append("".join(current))
+    return fields
+
+
+def parse_nmcli_networks(output):
+    """Parse `nmcli -t -f SSID,SIGNAL,SECURITY dev wifi list` into a list of dicts,
+    strongest first with one entry per SSID."""
+    networks = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        fields = split_terse(line)
+        if len(fields) < 3 or not fields[0]:
+            continue  # Hidden networks have no SSID
+        ssid, signal, security = fields[0], fields[1], fields[2]
+        try:
+            signal = int(signal)
+        except ValueError:
+            signal = 0
+        if ssid not in networks or networks[ssid]["signal"] < signal:
+            networks[ssid] = {"ssid": ssid, "signal": signal, "security": security}
+    return sorted(networks.values(), key=lambda n: n["signal"], reverse=True)
+
+
+def parse_netsh_networks(output):
+    """Parse `netsh wlan show network` output (Windows)."""
+    networks = []
+    for line in output.split('\n'):
+        if line.strip().startswith("SSID") and ":" in line:
+            ssid = line.split(':', 1)[1].strip()
+            ssid = ssid.replace("?T", "'")  # Fix apostrophe
+            if ssid and ssid not in networks:
+                networks.append(ssid)
+    return [{"ssid": ssid, "signal": 0, "security": ""} for ssid in networks]
+
+
+class WifiManager(QObject):
+    """Scans and connects to Wi-Fi networks with QProcess so the GUI never blocks.
+
+    Scan results are cached with the time they were taken and refreshed in the
+    background every SCAN_REFRESH_MS.
+    """
+
+    scan_finished = pyqtSignal(list)       # list of network dicts
+    scan_failed = pyqtSignal(str)
+    connect_progress = pyqtSignal(str)
+    connected = pyqtSignal(str)            # ssid
+    connect_failed = pyqtSignal(str, str)  # ssid, error
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.networks = []
+        self.last_scan_time = None
+        self.scan_proc = None
+        self.connect_proc = None
+        self.connect_ssid = None
+        self.connect_message = ""
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(lambda: self.scan(rescan=True))
+
+    def start(self, refresh_ms=SCAN_REFRESH_MS):
+        """Publish the access points nmcli already knows about, then keep them fresh."""
+        self.scan(rescan=False)
+        self.refresh_timer.start(refresh_ms)
+
+    def cache_age(self):
+        if self.last_scan_time is None:
+            return None
+        return time.time() - self.last_scan_time
+
+    def scan(self, rescan=True):
+        """Start a scan unless one is already running."""
+        if self.scan_proc is not None:
+            return
+        if sys.platform == "win32":
+            program, args = "netsh", ["wlan", "show", "network"]
+        else:
+            program = "nmcli"
+            args = ["-t", "-f", "SSID,SIGNAL,SECURITY", "dev", "wifi", "list",
+                    "--rescan", "yes" if rescan else "no"]
+        self.scan_proc = QProcess(self)
+        self.scan_proc.finished.connect(self._on_scan_finished)
+        self.scan_proc.errorOccurred.connect(self._on_scan_error)
+        self.scan_proc.start(program, args)
+
+    def _on_scan_finished(self, exit_code, exit_status):
+        proc, self.scan_proc = self.scan_proc, None
+        if proc is None:
+            return
+        output = bytes(proc.readAllStandardOutput()).decode("utf-8", errors="ignore")
+        error = bytes(proc.readAllStandardError()).decode("utf-8", errors="ignore").strip()
+        proc.deleteLater()
+        if exit_code != 0:
+            self.scan_failed.emit(error or f"scan exited with code {exit_code}")
+            return
+        if sys.platform == "win32":
+            self.networks = parse_netsh_networks(output)
+        else:
+            self.networks = parse_nmcli_networks(output)
+        self.last_scan_time = time.time()
+        self.scan_finished.emit(self.networks)
+
+    def _on_scan_error(self, error):
+        if error == QProcess.FailedToStart:
+            proc, self.scan_proc = self.scan_proc, None
+            if proc is not None:
+                proc.deleteLater()
+            self.scan_failed.emit("Wi-Fi scanner could not be started.")
+
+    def connect_to(self, ssid, password=""):
+        """Connect asynchronously. Progress and the result are reported through signals."""
+        if self.connect_proc is not None:
+            self.connect_progress.emit(f"Already connecting to {self.connect_ssid}...")
+            return
+        if sys.platform == "win32":
+            program, args = "netsh", ["wlan", "connect", f"name={ssid}"]
+        else:
+            program = "nmcli"
+            args = ["-w", str(CONNECT_TIMEOUT_S), "dev", "wifi", "connect", ssid]
+            if password:
+                args += ["password", password]
+        self.connect_ssid = ssid
+        self.connect_message = ""
+        self.connect_proc = QProcess(self)
+        self.connect_proc.setProcessChannelMode(QProcess.MergedChannels)
+        self.connect_proc.readyRead.connect(self._on_connect_output)
+        self.connect_proc.finished.connect(self._on_connect_finished)
+        self.connect_proc.errorOccurred.connect(self._on_connect_error)
+        self.connect_progress.emit(f"Connecting to {ssid}...")
+        self.connect_proc.start(program, args)
+
+    def _on_connect_output(self):
+        if self.connect_proc is None:
+            return
+        text = bytes(self.connect_proc.readAll()).decode("utf-8", errors="ignore").strip()
+        if text:
+            self.connect_message = text.splitlines()[-1]
+            self.connect_progress.emit(self.connect_message)
+
+    def _on_connect_finished(self, exit_code, exit_status):
+        proc, self.connect_proc = self.connect_proc, None
+        ssid = self.connect_ssid
+        if proc is None:
+            return
+        proc.deleteLater()
+        if exit_code == 0:
+            self.connected.emit(ssid)
+        else:
+            self.connect_failed.emit(ssid, self.connect_message or f"connect exited with code {exit_code}")
+
+    def _on_connect_error(self, error):
+        if error == QProcess.FailedToStart:
+            proc, self.connect_proc = self.connect_proc, None
+            if proc is not None:
+                proc.deleteLater()
+            self.connect_failed.emit(self.connect_ssid, "Network manager could not be started.")
+
+
+class SimWifiManager(WifiManager):
+    """WifiManager without nmcli (PLT_HAL=sim, see hal.py): a fixed list of
+    networks, and every connection succeeds after a short delay."""
+
+    NETWORKS = [{"ssid": "plt-sim", "signal": 80, "security": "WPA2"},
+                {"ssid": "plt-sim-open", "signal": 45, "security": ""}]
+
+    def scan(self, rescan=True):
+        QTimer.singleShot(200, self._finish_scan)
+
+    def _finish_scan(self):
+        self.networks = [dict(network) for network in self.NETWORKS]
+        self.last_scan_time = time.time()
+        self.scan_finished.emit(self.networks)
+
+    def connect_to(self, ssid, password=""):
+        self.connect_ssid = ssid
+        self.connect_progress.emit(f"Connecting to {ssid}...")
+        QTimer.singleShot(500, lambda: self.connected.emit(ssid))